@@ -0,0 +1,82 @@
+"""Measure the per-callback overhead of the Python audio delivery paths.
+
+Calls :meth:`_PlayerCallbacks.playback_data` with a trivial consumer, once
+registered as a :attr:`PlayerEvent.MUSIC_DELIVERY` listener and once bound
+with :meth:`Player.set_audio_consumer`. The consumer does no work, so the
+numbers are the overhead of the delivery path itself.
+
+Run with ``python benchmarks/audio_callback.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import timeit
+
+import spotifyconnect
+from spotifyconnect import ffi, utils
+from spotifyconnect.player import _PlayerCallbacks
+
+CHANNELS = 2
+BLOCK_FRAMES = 256
+BLOCKS = 50000
+
+
+class _Player(spotifyconnect.Player):
+
+    # A real Player that isn't registered with libspotify.
+
+    zero_copy = True
+
+    def __init__(self):
+        utils.EventEmitter.__init__(self)
+        self.clock = spotifyconnect.PlaybackClock()
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.player = _Player()
+
+
+def consume(audio_format, frames, num_frames, pending, session):
+    return num_frames
+
+
+def measure(setup):
+    session = _Session()
+    spotifyconnect._session_instance = session
+    setup(session.player)
+    samples = ffi.new('int16_t[]', BLOCK_FRAMES * CHANNELS)
+    sp_audioformat = ffi.new('SpSampleFormat *')
+    sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+    sp_audioformat.sample_rate = 44100
+    sp_audioformat.channels = CHANNELS
+    pending = ffi.new('uint32_t *')
+    userdata = ffi.new_handle(session)
+
+    def run():
+        for i in range(BLOCKS):
+            _PlayerCallbacks.playback_data(
+                samples, BLOCK_FRAMES * CHANNELS, sp_audioformat, pending,
+                userdata)
+
+    try:
+        return timeit.timeit(run, number=1)
+    finally:
+        spotifyconnect._session_instance = None
+
+
+def main():
+    paths = [
+        ('listener', lambda player: player.on(
+            spotifyconnect.PlayerEvent.MUSIC_DELIVERY, consume)),
+        ('consumer', lambda player: player.set_audio_consumer(consume)),
+    ]
+    print('%d callbacks of %d frames' % (BLOCKS, BLOCK_FRAMES))
+    for name, setup in paths:
+        seconds = measure(setup)
+        print('%-10s %8.2f us/callback' % (name, seconds / BLOCKS * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""Measure the CPU cost of :class:`Equalizer`.
+
+Filters a minute of stereo audio in blocks with 1, 5 and 10 bands, as int16
+and as float32 audio, and reports the CPU time it takes per minute of audio.
+
+Run with ``python benchmarks/equalizer.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import time
+
+import numpy
+
+import spotifyconnect
+
+CHANNELS = 2
+BLOCK_FRAMES = 1024
+SAMPLE_RATE = 44100
+SECONDS = 60
+
+BANDS = [
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.HIGH_PASS, 30),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.LOW_SHELF, 100, 3),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.PEAKING, 250, -2),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.PEAKING, 500, 1),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.PEAKING, 1000, -1),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.PEAKING, 2000, 2),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.PEAKING, 4000, -3),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.PEAKING, 8000, 1),
+    spotifyconnect.EqualizerBand(
+        spotifyconnect.FilterType.HIGH_SHELF, 10000, 2),
+    spotifyconnect.EqualizerBand(spotifyconnect.FilterType.LOW_PASS, 18000),
+]
+
+
+def measure(num_bands, sample_type, dtype):
+    audio_format = spotifyconnect.SampleFormat(
+        CHANNELS, sample_type, SAMPLE_RATE)
+    equalizer = spotifyconnect.Equalizer(BANDS[:num_bands])
+    equalizer.negotiate(audio_format)
+    frames = (numpy.random.uniform(-0.5, 0.5, (BLOCK_FRAMES, CHANNELS)) *
+              (1 if dtype == 'float32' else 32767)).astype(dtype)
+    blocks = SECONDS * SAMPLE_RATE // BLOCK_FRAMES
+
+    start = time.process_time()
+    for i in range(blocks):
+        equalizer.process(audio_format, frames, None)
+    return time.process_time() - start
+
+
+def main():
+    cases = [
+        ('int16', spotifyconnect.SampleType.S16NativeEndian, 'int16'),
+        ('float32', spotifyconnect.SampleType.Float32NativeEndian, 'float32'),
+    ]
+    print('CPU time per minute of %d Hz stereo audio, %d frame blocks' % (
+        SAMPLE_RATE, BLOCK_FRAMES))
+    for name, sample_type, dtype in cases:
+        for num_bands in [1, 5, 10]:
+            seconds = measure(num_bands, sample_type, dtype)
+            print('%-7s %2d bands %8.2f ms (%.3f%% CPU)' % (
+                name, num_bands, seconds * 1000, seconds / SECONDS * 100))
+
+
+if __name__ == '__main__':
+    main()
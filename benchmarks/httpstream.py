@@ -0,0 +1,115 @@
+"""Measure the cost per listener of :class:`HTTPStreamSink`.
+
+Streams 10 seconds of stereo audio in real time to 1, 10, 50 and 200
+localhost clients, which read the stream in a child process, and reports the
+server's CPU time per second of audio and the memory it uses per client.
+
+Run with ``python benchmarks/httpstream.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import multiprocessing
+import resource
+import socket
+import time
+import tracemalloc
+
+import spotifyconnect
+from spotifyconnect import utils
+
+BLOCK_FRAMES = 1024
+SAMPLE_RATE = 44100
+SECONDS = 10
+
+AUDIO_FORMAT = spotifyconnect.SampleFormat(
+    2, spotifyconnect.SampleType.S16NativeEndian, SAMPLE_RATE)
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.player = utils.EventEmitter()
+
+
+def listen(address, num_clients, ready, results):
+    clients = []
+    for i in range(num_clients):
+        client = socket.create_connection(address)
+        client.sendall(b'GET /stream.pcm HTTP/1.1\r\n\r\n')
+        client.setblocking(False)
+        clients.append(client)
+    ready.set()
+    received = 0
+    deadline = time.time() + SECONDS + 5
+    while clients and time.time() < deadline:
+        time.sleep(0.01)
+        for client in list(clients):
+            try:
+                data = client.recv(0x10000)
+            except socket.error:
+                continue
+            if not data:
+                clients.remove(client)
+                client.close()
+            received += len(data)
+    results.put(received // num_clients)
+
+
+def measure(num_clients):
+    # The sink is fed directly, as a TeeSink would, so the session is only
+    # needed for the playback events it listens to.
+    spotifyconnect._session_instance = _Session()
+    sink = spotifyconnect.HTTPStreamSink(host='127.0.0.1', port=0)
+    sink._open()
+
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    listener = multiprocessing.Process(
+        target=listen, args=(sink.address, num_clients, ready, results))
+    listener.start()
+    ready.wait()
+    while sink.num_clients < num_clients:
+        time.sleep(0.01)
+
+    tracemalloc.start()
+    frames = b'\0' * BLOCK_FRAMES * AUDIO_FORMAT.frame_size
+    start_cpu = time.process_time()
+    start = time.time()
+    total = 0
+    while total < SECONDS * SAMPLE_RATE:
+        accepted = sink._on_music_delivery(
+            AUDIO_FORMAT, frames, BLOCK_FRAMES, None, None)
+        total += accepted
+        if accepted < BLOCK_FRAMES:
+            time.sleep(0.005)
+    cpu = time.process_time() - start_cpu
+    elapsed = time.time() - start
+    memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    skips = sink.skips
+    sink._close()
+    spotifyconnect._session_instance = None
+    received = results.get()
+    listener.join()
+    return cpu / elapsed, memory, received, skips
+
+
+def main():
+    print('Streaming %d s of %d Hz stereo audio to localhost clients' % (
+        SECONDS, SAMPLE_RATE))
+    print('%7s %10s %14s %14s %6s' % (
+        'clients', 'CPU', 'CPU/client', 'memory/client', 'skips'))
+    for num_clients in [1, 10, 50, 200]:
+        cpu, memory, received, skips = measure(num_clients)
+        expected = SECONDS * SAMPLE_RATE * AUDIO_FORMAT.frame_size
+        print('%7d %9.2f%% %13.3f%% %11.1f kB %6d (%d%% received)' % (
+            num_clients, cpu * 100, cpu * 100 / num_clients,
+            memory / 1024 / num_clients, skips, received * 100 // expected))
+    print('Peak RSS %d kB' % resource.getrusage(
+        resource.RUSAGE_SELF).ru_maxrss)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Compare the Python and the native audio delivery paths.
+
+Feeds the same blocks of audio through :meth:`_PlayerCallbacks.playback_data`
+into a :class:`RingBufferSink`, and through the native ``spc_audio_data``
+callback into the :class:`NativeRingBuffer`, draining both rings one period at
+a time like a consumer thread would.
+
+Run with ``python benchmarks/native_audio.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import timeit
+
+import spotifyconnect
+from spotifyconnect import ffi, lib, utils
+from spotifyconnect.player import _PlayerCallbacks
+
+CHANNELS = 2
+BLOCK_FRAMES = 256
+PERIOD_FRAMES = 1024
+BLOCKS = 20000
+
+
+class _Player(utils.EventEmitter):
+    zero_copy = False
+    numpy_frames = False
+    _audio_consumer = None
+
+    def __init__(self):
+        super(_Player, self).__init__()
+        self.clock = spotifyconnect.PlaybackClock()
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.player = _Player()
+
+
+def _sample_format():
+    sp_audioformat = ffi.new('SpSampleFormat *')
+    sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+    sp_audioformat.sample_rate = 44100
+    sp_audioformat.channels = CHANNELS
+    return sp_audioformat
+
+
+def python_path():
+    session = _Session()
+    spotifyconnect._session_instance = session
+    sink = spotifyconnect.RingBufferSink(
+        buffer_size=PERIOD_FRAMES * CHANNELS * 2 * 4,
+        period_size=PERIOD_FRAMES, consumer_thread=False)
+    session.player.zero_copy = sink.zero_copy
+    session.player.on(
+        spotifyconnect.PlayerEvent.MUSIC_DELIVERY, sink._on_music_delivery)
+    samples = ffi.new('int16_t[]', BLOCK_FRAMES * CHANNELS)
+    sp_audioformat = _sample_format()
+    pending = ffi.new('uint32_t *')
+    userdata = ffi.new_handle(session)
+    period = bytearray(PERIOD_FRAMES * CHANNELS * 2)
+
+    def run():
+        for i in range(BLOCKS):
+            _PlayerCallbacks.playback_data(
+                samples, BLOCK_FRAMES * CHANNELS, sp_audioformat, pending,
+                userdata)
+            if sink.frames_buffered >= PERIOD_FRAMES:
+                sink.read_into(period)
+
+    try:
+        return timeit.timeit(run, number=1)
+    finally:
+        spotifyconnect._session_instance = None
+
+
+def native_path():
+    ring = spotifyconnect.NativeRingBuffer(PERIOD_FRAMES * CHANNELS * 2 * 4)
+    samples = ffi.new('int16_t[]', BLOCK_FRAMES * CHANNELS)
+    sp_audioformat = _sample_format()
+    pending = ffi.new('uint32_t *')
+    period = bytearray(PERIOD_FRAMES * CHANNELS * 2)
+
+    def run():
+        for i in range(BLOCKS):
+            lib.spc_audio_data(
+                samples, BLOCK_FRAMES * CHANNELS, sp_audioformat, pending,
+                ffi.NULL)
+            if ring.readable >= len(period):
+                ring.read_into(period)
+
+    return timeit.timeit(run, number=1)
+
+
+def main():
+    print('%d blocks of %d frames, drained in periods of %d frames' % (
+        BLOCKS, BLOCK_FRAMES, PERIOD_FRAMES))
+    for name, path in [('python', python_path), ('native', native_path)]:
+        seconds = path()
+        print('%-8s %8.2f us/callback' % (name, seconds / BLOCKS * 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""Measure the throughput of :class:`Resampler` for each quality preset.
+
+Resamples one minute of stereo 44100 Hz audio to 48000 Hz and 96000 Hz in
+blocks of the size libspotify typically delivers, and reports the
+throughput in input frames per second and as a multiple of real time.
+
+Run with ``python benchmarks/resample.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import timeit
+
+import numpy
+
+import spotifyconnect
+
+CHANNELS = 2
+BLOCK_FRAMES = 1024
+SAMPLE_RATE = 44100
+SECONDS = 60
+RATES = [48000, 96000]
+
+
+def measure(rate, quality):
+    audio_format = spotifyconnect.SampleFormat(
+        CHANNELS, spotifyconnect.SampleType.S16NativeEndian, SAMPLE_RATE)
+    resampler = spotifyconnect.Resampler(rate, quality)
+    resampler.negotiate(audio_format)
+    frames = numpy.random.randint(
+        -32768, 32767, size=(BLOCK_FRAMES, CHANNELS)).astype('int16')
+    out = numpy.empty(
+        (resampler.max_output_frames(BLOCK_FRAMES), CHANNELS), dtype='int16')
+    blocks = SECONDS * SAMPLE_RATE // BLOCK_FRAMES
+
+    def run():
+        for i in range(blocks):
+            resampler.process(audio_format, frames, out)
+
+    return blocks * BLOCK_FRAMES, timeit.timeit(run, number=1)
+
+
+def main():
+    qualities = [
+        spotifyconnect.ResampleQuality.LOW,
+        spotifyconnect.ResampleQuality.MEDIUM,
+        spotifyconnect.ResampleQuality.HIGH,
+    ]
+    print('%d s of %d Hz audio in blocks of %d frames' % (
+        SECONDS, SAMPLE_RATE, BLOCK_FRAMES))
+    for rate in RATES:
+        for quality in qualities:
+            num_frames, seconds = measure(rate, quality)
+            print('%6d Hz %-8s %8.2f Mframes/s %8.1fx real time' % (
+                rate, quality._name, num_frames / seconds / 1e6,
+                num_frames / SAMPLE_RATE / seconds))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Measure how long the audio after a seek takes to reach the audio device.
+
+Fills a :class:`RingBufferSink`, played in real time by a simulated audio
+device, with audio from a simulated libspotify thread, then seeks and
+measures the time until the first period of audio from after the seek is
+played. Sinks that ignore the seek, as all sinks did before they dropped
+their buffers, play out the whole ring first.
+
+Run with ``python benchmarks/seek_latency.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import threading
+import time
+
+import spotifyconnect
+from spotifyconnect import utils
+
+CHANNELS = 2
+SAMPLE_RATE = 44100
+BLOCK_FRAMES = 1024
+PERIOD_FRAMES = 1024
+RUNS = 3
+
+AUDIO_FORMAT = spotifyconnect.SampleFormat(
+    CHANNELS, spotifyconnect.SampleType.S16NativeEndian, SAMPLE_RATE)
+
+
+class _Track(object):
+    track_uri = 'spotify:track:benchmark'
+
+
+class _Session(object):
+
+    def __init__(self):
+        self.player = utils.EventEmitter()
+        self.player.current_track = _Track()
+
+
+class _DeviceSink(spotifyconnect.RingBufferSink):
+
+    # Plays each period in real time, and notes when the first period of
+    # new audio, which is not silence, starts playing.
+
+    def __init__(self, buffer_size):
+        super(_DeviceSink, self).__init__(
+            buffer_size=buffer_size, period_size=PERIOD_FRAMES)
+        self.new_audio_played = threading.Event()
+        self.played_at = None
+
+    def _on_period(self, audio_format, period):
+        if not self.new_audio_played.is_set() and any(period.tobytes()):
+            self.played_at = time.time()
+            self.new_audio_played.set()
+        time.sleep(PERIOD_FRAMES / SAMPLE_RATE)
+
+
+class _IgnoringDeviceSink(_DeviceSink):
+
+    # A sink that keeps its buffered audio on seeks.
+
+    def _on_playback_seek(self, millis, session):
+        pass
+
+
+def _feed(sink, session, state):
+    old = b'\0' * BLOCK_FRAMES * AUDIO_FORMAT.frame_size
+    new = b'\1' * BLOCK_FRAMES * AUDIO_FORMAT.frame_size
+    while state['running']:
+        frames = new if state['seeked'] else old
+        accepted = sink._on_music_delivery(
+            AUDIO_FORMAT, frames, BLOCK_FRAMES, None, session)
+        if accepted < BLOCK_FRAMES:
+            time.sleep(0.005)
+
+
+def measure(sink_class, buffer_ms):
+    # Returns the latency in seconds, or None if the new audio was never
+    # played.
+    session = _Session()
+    spotifyconnect._session_instance = session
+    buffer_size = (
+        SAMPLE_RATE * buffer_ms // 1000 * AUDIO_FORMAT.frame_size)
+    sink = sink_class(buffer_size)
+    sink._open()
+    state = {'running': True, 'seeked': False}
+    feeder = threading.Thread(target=_feed, args=(sink, session, state))
+    feeder.start()
+    try:
+        # Let the ring fill up and playback settle.
+        time.sleep(buffer_ms / 1000 + 0.5)
+        start = time.time()
+        session.player.emit(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, 60000, session)
+        state['seeked'] = True
+        if not sink.new_audio_played.wait(buffer_ms / 1000 + 5):
+            return None
+        return sink.played_at - start
+    finally:
+        state['running'] = False
+        feeder.join()
+        sink._close()
+        spotifyconnect._session_instance = None
+
+
+def main():
+    print('Seek to new audio latency, %d frame periods at %d Hz' % (
+        PERIOD_FRAMES, SAMPLE_RATE))
+    print('%10s %14s %14s' % ('buffer', 'before', 'after'))
+    for buffer_ms in [250, 1000, 4000]:
+        results = []
+        for sink_class in [_IgnoringDeviceSink, _DeviceSink]:
+            latencies = [measure(sink_class, buffer_ms) for i in range(RUNS)]
+            if None in latencies:
+                results.append('timed out')
+            else:
+                results.append('%.1f ms' % (min(latencies) * 1000))
+        print('%7d ms %14s %14s' % tuple([buffer_ms] + results))
+
+
+if __name__ == '__main__':
+    main()
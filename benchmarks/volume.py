@@ -0,0 +1,58 @@
+"""Measure the throughput of :class:`SoftwareVolume`.
+
+Processes blocks of stereo int16 audio at full volume, which takes the unity
+fast path, at a fixed lower volume, and while the gain is constantly ramping
+between two volumes.
+
+Run with ``python benchmarks/volume.py``.
+"""
+
+from __future__ import division, print_function, unicode_literals
+
+import timeit
+
+import numpy
+
+import spotifyconnect
+
+CHANNELS = 2
+BLOCK_FRAMES = 1024
+BLOCKS = 5000
+SAMPLE_RATE = 44100
+
+
+def measure(volume, before_block=None):
+    audio_format = spotifyconnect.SampleFormat(
+        CHANNELS, spotifyconnect.SampleType.S16NativeEndian, SAMPLE_RATE)
+    frames = numpy.random.randint(
+        -32768, 32767, size=(BLOCK_FRAMES, CHANNELS)).astype('int16')
+
+    def run():
+        for i in range(BLOCKS):
+            if before_block is not None:
+                before_block(volume, i)
+            volume.process(audio_format, frames)
+
+    return timeit.timeit(run, number=1)
+
+
+def toggle(volume, i):
+    volume.volume = 40 if i % 2 else 60
+
+
+def main():
+    cases = [
+        ('unity', spotifyconnect.SoftwareVolume(), None),
+        ('gain', spotifyconnect.SoftwareVolume(volume=50), None),
+        ('ramp', spotifyconnect.SoftwareVolume(
+            ramp_ms=1000 * BLOCK_FRAMES // SAMPLE_RATE), toggle),
+    ]
+    print('%d blocks of %d frames' % (BLOCKS, BLOCK_FRAMES))
+    for name, volume, before_block in cases:
+        seconds = measure(volume, before_block)
+        print('%-6s %8.1f Mframes/s' % (
+            name, BLOCKS * BLOCK_FRAMES / seconds / 1e6))
+
+
+if __name__ == '__main__':
+    main()
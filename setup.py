@@ -38,6 +38,8 @@ setup(
     install_requires=[
         'cffi >= 1.0.0',
         'Flask >= 0.10.1'],
+    extras_require={
+        'numpy': ['numpy']},
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Developers',
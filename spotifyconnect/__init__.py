@@ -82,12 +82,29 @@ from spotifyconnect._spotifyconnect import ffi, lib  # noqa
 lib = _SerializedLib(lib)
 
 from spotifyconnect.audio import *  # noqa
+from spotifyconnect.channels import *  # noqa
+from spotifyconnect.clock import *  # noqa
 from spotifyconnect.config import *  # noqa
 from spotifyconnect.connection import *  # noqa
+from spotifyconnect.convert import *  # noqa
+from spotifyconnect.drift import *  # noqa
+from spotifyconnect.dynamics import *  # noqa
+from spotifyconnect.equalizer import *  # noqa
 from spotifyconnect.error import *  # noqa
 from spotifyconnect.eventloop import *  # noqa
+from spotifyconnect.httpstream import *  # noqa
+from spotifyconnect.jitter import *  # noqa
+from spotifyconnect.loudness import *  # noqa
 from spotifyconnect.metadata import *  # noqa
+from spotifyconnect.meter import *  # noqa
+from spotifyconnect.pipeline import *  # noqa
 from spotifyconnect.player import *  # noqa
+from spotifyconnect.resample import *  # noqa
+from spotifyconnect.ringbuffer import *  # noqa
+from spotifyconnect.rtp import *  # noqa
 from spotifyconnect.session import *  # noqa
 from spotifyconnect.sink import *  # noqa
+from spotifyconnect.spectrum import *  # noqa
+from spotifyconnect.tee import *  # noqa
+from spotifyconnect.volume import *  # noqa
 from spotifyconnect.zeroconf import *  # noqa
@@ -0,0 +1,504 @@
+/*
+ * Native helpers compiled into the spotifyconnect._spotifyconnect module.
+ *
+ * This file is appended to the processed libspotify header by
+ * _spotifyconnect_build.py, so all the Sp* types are available here.
+ */
+
+#include <errno.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/socket.h>
+#include <sys/uio.h>
+
+
+/*
+ * Audio ring buffer
+ *
+ * spc_audio_data() is registered as libspotify's audio_data callback and
+ * copies the delivered audio into a ring buffer without ever entering
+ * Python. Python drains the ring with spc_ring_read().
+ *
+ * There is exactly one producer (libspotify's audio thread) and one consumer,
+ * so the ring is lock-free: the producer only moves spc_ring_write_pos and
+ * the consumer only moves spc_ring_read_pos. Both count bytes modulo 2^32.
+ *
+ * The sample format is published with a sequence count, which is 0 until
+ * audio has been delivered, odd while the producer rewrites the format and
+ * even once it is complete, so the consumer never sees a torn format.
+ *
+ * The ring can't be reset while native audio delivery is enabled, as the
+ * producer may be writing to it at any time.
+ */
+
+static uint8_t *spc_ring_data = NULL;
+static uint32_t spc_ring_size = 0;
+static uint32_t spc_ring_write_pos = 0;
+static uint32_t spc_ring_read_pos = 0;
+static uint32_t spc_ring_overruns = 0;
+static uint32_t spc_ring_format_seq = 0;
+static uint32_t spc_ring_format_pending = 0;
+static uint32_t spc_ring_enabled = 0;
+static SpSampleFormat spc_ring_sample_format;
+
+#define SPC_LOAD(ptr) __atomic_load_n(ptr, __ATOMIC_ACQUIRE)
+#define SPC_STORE(ptr, value) __atomic_store_n(ptr, value, __ATOMIC_RELEASE)
+
+static uint32_t spc_ring_readable_bytes(void)
+{
+    return SPC_LOAD(&spc_ring_write_pos) - SPC_LOAD(&spc_ring_read_pos);
+}
+
+static void spc_ring_copy_in(uint32_t pos, const uint8_t *data, uint32_t size)
+{
+    uint32_t start = pos % spc_ring_size;
+    uint32_t first = spc_ring_size - start;
+
+    if (first > size)
+        first = size;
+    memcpy(spc_ring_data + start, data, first);
+    memcpy(spc_ring_data, data + first, size - first);
+}
+
+static void spc_ring_copy_out(uint32_t pos, uint8_t *data, uint32_t size)
+{
+    uint32_t start = pos % spc_ring_size;
+    uint32_t first = spc_ring_size - start;
+
+    if (first > size)
+        first = size;
+    memcpy(data, spc_ring_data + start, first);
+    memcpy(data + first, spc_ring_data, size - first);
+}
+
+int spc_ring_init(uint32_t size)
+{
+    uint8_t *data;
+
+    if (SPC_LOAD(&spc_ring_enabled))
+        return -2;
+    if (size == 0 || size > 0x80000000u)
+        return -1;
+    if (size != spc_ring_size) {
+        data = malloc(size);
+        if (data == NULL)
+            return -1;
+        free(spc_ring_data);
+        spc_ring_data = data;
+        spc_ring_size = size;
+    }
+    spc_ring_write_pos = 0;
+    spc_ring_read_pos = 0;
+    spc_ring_overruns = 0;
+    spc_ring_format_seq = 0;
+    spc_ring_format_pending = 0;
+    __atomic_thread_fence(__ATOMIC_SEQ_CST);
+    return 0;
+}
+
+void spc_ring_set_enabled(int enabled)
+{
+    SPC_STORE(&spc_ring_enabled, enabled ? 1 : 0);
+}
+
+uint32_t spc_audio_data(
+        const void *samples, uint32_t num_samples, SpSampleFormat *format,
+        uint32_t *pending, void *userdata)
+{
+    uint32_t write_pos, readable, size, frame_size, sample_size, seq;
+
+    (void)userdata;
+    if (spc_ring_data == NULL || format->channels == 0 ||
+            format->sample_type != kSpSampleTypeS16NativeEndian)
+        return 0;
+    sample_size = 2;
+    frame_size = sample_size * format->channels;
+
+    write_pos = spc_ring_write_pos;
+    readable = write_pos - SPC_LOAD(&spc_ring_read_pos);
+    seq = spc_ring_format_seq;
+    if (seq == 0 ||
+            spc_ring_sample_format.channels != format->channels ||
+            spc_ring_sample_format.sample_type != format->sample_type ||
+            spc_ring_sample_format.sample_rate != format->sample_rate) {
+        /*
+         * Let the consumer drain the audio in the old format first,
+         * including a last partial period.
+         */
+        if (readable != 0) {
+            SPC_STORE(&spc_ring_format_pending, 1);
+            return 0;
+        }
+        SPC_STORE(&spc_ring_format_pending, 0);
+        SPC_STORE(&spc_ring_format_seq, seq + 1);
+        __atomic_thread_fence(__ATOMIC_RELEASE);
+        spc_ring_sample_format = *format;
+        SPC_STORE(&spc_ring_format_seq, seq + 2);
+    }
+
+    size = num_samples * sample_size;
+    if (size > spc_ring_size - readable) {
+        size = spc_ring_size - readable;
+        spc_ring_overruns++;
+    }
+    size -= size % frame_size;
+    spc_ring_copy_in(write_pos, samples, size);
+    SPC_STORE(&spc_ring_write_pos, write_pos + size);
+
+    if (pending != NULL)
+        *pending = (readable + size) / sample_size;
+    return size / sample_size;
+}
+
+uint32_t spc_ring_read(void *buffer, uint32_t size, uint32_t align)
+{
+    uint32_t read_pos = spc_ring_read_pos;
+    uint32_t readable = SPC_LOAD(&spc_ring_write_pos) - read_pos;
+
+    if (spc_ring_data == NULL)
+        return 0;
+    if (size > readable)
+        size = readable;
+    if (align > 1)
+        size -= size % align;
+    spc_ring_copy_out(read_pos, buffer, size);
+    SPC_STORE(&spc_ring_read_pos, read_pos + size);
+    return size;
+}
+
+uint32_t spc_ring_skip(uint32_t size)
+{
+    uint32_t read_pos = spc_ring_read_pos;
+    uint32_t readable = SPC_LOAD(&spc_ring_write_pos) - read_pos;
+
+    if (size > readable)
+        size = readable;
+    SPC_STORE(&spc_ring_read_pos, read_pos + size);
+    return size;
+}
+
+uint32_t spc_ring_write_position(void)
+{
+    return SPC_LOAD(&spc_ring_write_pos);
+}
+
+uint32_t spc_ring_read_position(void)
+{
+    return SPC_LOAD(&spc_ring_read_pos);
+}
+
+uint32_t spc_ring_skip_to(uint32_t pos)
+{
+    /* Only moves forward, and never past what has been written, so a stale
+     * position is ignored. */
+    uint32_t read_pos = spc_ring_read_pos;
+    uint32_t readable = SPC_LOAD(&spc_ring_write_pos) - read_pos;
+    uint32_t size = pos - read_pos;
+
+    if (size > readable)
+        return 0;
+    SPC_STORE(&spc_ring_read_pos, pos);
+    return size;
+}
+
+int spc_ring_format_changing(void)
+{
+    return SPC_LOAD(&spc_ring_format_pending);
+}
+
+uint32_t spc_ring_readable(void)
+{
+    return spc_ring_readable_bytes();
+}
+
+uint32_t spc_ring_capacity(void)
+{
+    return spc_ring_size;
+}
+
+uint32_t spc_ring_overrun_count(void)
+{
+    return SPC_LOAD(&spc_ring_overruns);
+}
+
+int spc_ring_format(SpSampleFormat *format)
+{
+    uint32_t seq;
+
+    for (;;) {
+        seq = SPC_LOAD(&spc_ring_format_seq);
+        if (seq == 0)
+            return 0;
+        if (seq % 2 != 0)
+            continue;
+        *format = spc_ring_sample_format;
+        __atomic_thread_fence(__ATOMIC_ACQUIRE);
+        if (__atomic_load_n(&spc_ring_format_seq, __ATOMIC_RELAXED) == seq)
+            return 1;
+    }
+}
+
+
+/*
+ * Biquad filter cascades
+ *
+ * spc_sos_process_s16() and spc_sos_process_f32() run interleaved audio in
+ * place through a cascade of second order sections. Each section has five
+ * coefficients b0, b1, b2, a1, a2, normalized so that a0 is 1, and two state
+ * values per channel for the transposed direct form II. The state is kept
+ * by the caller, so filtering can continue across blocks.
+ */
+
+static double spc_sos_sample(
+        double x, const double *sos, double *state, uint32_t sections)
+{
+    uint32_t i;
+    double y;
+
+    for (i = 0; i < sections; i++, sos += 5, state += 2) {
+        y = sos[0] * x + state[0];
+        state[0] = sos[1] * x - sos[3] * y + state[1];
+        state[1] = sos[2] * x - sos[4] * y;
+        x = y;
+    }
+    return x;
+}
+
+void spc_sos_process_s16(
+        int16_t *samples, uint32_t num_frames, uint32_t channels,
+        const double *sos, uint32_t sections, double *state)
+{
+    uint32_t frame, channel;
+    double y;
+
+    for (frame = 0; frame < num_frames; frame++) {
+        for (channel = 0; channel < channels; channel++, samples++) {
+            y = spc_sos_sample(
+                *samples, sos, state + 2 * sections * channel, sections);
+            y = y < 0 ? y - 0.5 : y + 0.5;
+            if (y >= 32767)
+                *samples = 32767;
+            else if (y <= -32768)
+                *samples = -32768;
+            else
+                *samples = (int16_t)y;
+        }
+    }
+}
+
+void spc_sos_process_f32(
+        float *samples, uint32_t num_frames, uint32_t channels,
+        const double *sos, uint32_t sections, double *state)
+{
+    uint32_t frame, channel;
+
+    for (frame = 0; frame < num_frames; frame++) {
+        for (channel = 0; channel < channels; channel++, samples++) {
+            *samples = (float)spc_sos_sample(
+                *samples, sos, state + 2 * sections * channel, sections);
+        }
+    }
+}
+
+void spc_gain_smooth(
+        double *gain, uint32_t num_frames, uint32_t hold, double attack,
+        double release, double *state)
+{
+    double held = state[0], smoothed = state[2];
+    uint32_t remaining = (uint32_t)state[1];
+    uint32_t frame;
+
+    for (frame = 0; frame < num_frames; frame++) {
+        /* Hold each reduction for the look-ahead, so the smoothed gain has
+         * reached it by the time the delayed peak is output. */
+        if (gain[frame] <= held) {
+            held = gain[frame];
+            remaining = hold;
+        } else if (remaining) {
+            remaining--;
+        } else {
+            held = gain[frame];
+        }
+        if (held < smoothed)
+            smoothed = held + attack * (smoothed - held);
+        else
+            smoothed = held + release * (smoothed - held);
+        gain[frame] = smoothed;
+    }
+    state[0] = held;
+    state[1] = remaining;
+    state[2] = smoothed;
+}
+
+
+/*
+ * Spectrum publication
+ *
+ * A SpectrumAnalyzer publishes band levels to shared memory that readers in
+ * other processes copy out. The levels are guarded by a sequence count that
+ * is odd while they are written, with the memory barriers needed on weakly
+ * ordered CPUs, so readers never see a mix of old and new levels.
+ */
+
+void spc_spectrum_publish(
+        uint32_t *sequence, float *levels, const double *bands,
+        uint32_t count)
+{
+    uint32_t seq = __atomic_load_n(sequence, __ATOMIC_RELAXED);
+    uint32_t i;
+
+    __atomic_store_n(sequence, seq + 1, __ATOMIC_RELAXED);
+    __atomic_thread_fence(__ATOMIC_RELEASE);
+    for (i = 0; i < count; i++)
+        levels[i] = (float)bands[i];
+    SPC_STORE(sequence, seq + 2);
+}
+
+uint32_t spc_spectrum_read(
+        const uint32_t *sequence, const float *levels, float *out,
+        uint32_t count)
+{
+    uint32_t seq;
+
+    for (;;) {
+        seq = SPC_LOAD(sequence);
+        if (seq % 2 != 0)
+            continue;
+        memcpy(out, levels, count * sizeof(float));
+        __atomic_thread_fence(__ATOMIC_ACQUIRE);
+        if (__atomic_load_n(sequence, __ATOMIC_RELAXED) == seq)
+            return seq;
+    }
+}
+
+
+/*
+ * RTP packets
+ *
+ * spc_rtp_send() packs interleaved 16-bit audio into num_packets RTP packets
+ * of packet_frames frames each, with an L16 payload, which is big-endian,
+ * and sends them on the connected UDP socket fd. header holds the 12 byte
+ * RTP header of the first packet. The sequence number and timestamp are
+ * advanced for every packet, sent or not, and written back to header, and
+ * the marker bit is cleared after the first packet.
+ *
+ * The packets are built in buffer, which has room for batch packets, and
+ * each batch is sent with a single sendmmsg() call. Where sendmmsg() isn't
+ * available the packets are sent one at a time. The socket is non-blocking,
+ * so packets the kernel has no room for are dropped. Returns the number of
+ * packets sent.
+ */
+
+#define SPC_RTP_HEADER_SIZE 12
+#define SPC_RTP_MAX_BATCH 64
+
+#if defined(__linux__) && defined(_GNU_SOURCE)
+#define SPC_HAVE_SENDMMSG 1
+static int spc_sendmmsg_missing = 0;
+#endif
+
+static void spc_rtp_pack(
+        uint8_t *packet, const uint8_t *header, uint16_t sequence,
+        uint32_t timestamp, const int16_t *samples, uint32_t num_samples)
+{
+    uint8_t *payload = packet + SPC_RTP_HEADER_SIZE;
+    uint16_t sample;
+    uint32_t i;
+
+    memcpy(packet, header, SPC_RTP_HEADER_SIZE);
+    packet[2] = (uint8_t)(sequence >> 8);
+    packet[3] = (uint8_t)sequence;
+    packet[4] = (uint8_t)(timestamp >> 24);
+    packet[5] = (uint8_t)(timestamp >> 16);
+    packet[6] = (uint8_t)(timestamp >> 8);
+    packet[7] = (uint8_t)timestamp;
+    for (i = 0; i < num_samples; i++) {
+        sample = (uint16_t)samples[i];
+        payload[2 * i] = (uint8_t)(sample >> 8);
+        payload[2 * i + 1] = (uint8_t)sample;
+    }
+}
+
+static uint32_t spc_rtp_send_batch(
+        int fd, uint8_t *buffer, uint32_t count, uint32_t packet_size)
+{
+    uint32_t i, sent = 0;
+#ifdef SPC_HAVE_SENDMMSG
+    struct mmsghdr messages[SPC_RTP_MAX_BATCH];
+    struct iovec iovecs[SPC_RTP_MAX_BATCH];
+    int result;
+
+    if (!spc_sendmmsg_missing) {
+        memset(messages, 0, count * sizeof(messages[0]));
+        for (i = 0; i < count; i++) {
+            iovecs[i].iov_base = buffer + i * packet_size;
+            iovecs[i].iov_len = packet_size;
+            messages[i].msg_hdr.msg_iov = &iovecs[i];
+            messages[i].msg_hdr.msg_iovlen = 1;
+        }
+        while (sent < count) {
+            result = sendmmsg(fd, messages + sent, count - sent, 0);
+            if (result > 0) {
+                sent += result;
+                continue;
+            }
+            if (result < 0 && errno == EINTR)
+                continue;
+            if (result < 0 && errno == ENOSYS) {
+                spc_sendmmsg_missing = 1;
+                break;
+            }
+            return sent;
+        }
+        if (!spc_sendmmsg_missing)
+            return sent;
+    }
+#endif
+    for (i = sent; i < count; i++) {
+        while (send(fd, buffer + i * packet_size, packet_size, 0) < 0) {
+            if (errno != EINTR)
+                return sent;
+        }
+        sent++;
+    }
+    return sent;
+}
+
+uint32_t spc_rtp_send(
+        int fd, const int16_t *samples, uint32_t num_packets,
+        uint32_t packet_frames, uint32_t channels, uint8_t *header,
+        uint8_t *buffer, uint32_t batch)
+{
+    uint32_t packet_samples = packet_frames * channels;
+    uint32_t packet_size = SPC_RTP_HEADER_SIZE + 2 * packet_samples;
+    uint16_t sequence = (uint16_t)((header[2] << 8) | header[3]);
+    uint32_t timestamp = ((uint32_t)header[4] << 24) |
+        ((uint32_t)header[5] << 16) | ((uint32_t)header[6] << 8) |
+        header[7];
+    uint32_t count, i, sent = 0;
+
+    if (batch > SPC_RTP_MAX_BATCH)
+        batch = SPC_RTP_MAX_BATCH;
+    while (num_packets) {
+        count = num_packets < batch ? num_packets : batch;
+        for (i = 0; i < count; i++) {
+            spc_rtp_pack(
+                buffer + i * packet_size, header, sequence, timestamp,
+                samples, packet_samples);
+            /* Only the first packet after a discontinuity is marked. */
+            header[1] &= 0x7f;
+            sequence++;
+            timestamp += packet_frames;
+            samples += packet_samples;
+        }
+        sent += spc_rtp_send_batch(fd, buffer, count, packet_size);
+        num_packets -= count;
+    }
+    header[2] = (uint8_t)(sequence >> 8);
+    header[3] = (uint8_t)sequence;
+    header[4] = (uint8_t)(timestamp >> 24);
+    header[5] = (uint8_t)(timestamp >> 16);
+    header[6] = (uint8_t)(timestamp >> 8);
+    header[7] = (uint8_t)timestamp;
+    return sent;
+}
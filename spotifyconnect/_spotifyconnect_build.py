@@ -25,20 +25,59 @@ else:
         machine)
 
 header_file = os.path.join(os.path.dirname(__file__), header_processed)
+native_file = os.path.join(os.path.dirname(__file__), '_native.c')
 
 with open(header_file) as fh:
     header = fh.read()
 
+with open(native_file) as fh:
+    native = fh.read()
+
 ffi = cffi.FFI()
 ffi.cdef(header)
 ffi.cdef("""
 void *malloc(size_t size);
 void exit(int status);
 """)
+ffi.cdef("""
+int spc_ring_init(uint32_t size);
+void spc_ring_set_enabled(int enabled);
+uint32_t spc_audio_data(
+    const void *samples, uint32_t num_samples, SpSampleFormat *format,
+    uint32_t *pending, void *userdata);
+uint32_t spc_ring_read(void *buffer, uint32_t size, uint32_t align);
+uint32_t spc_ring_skip(uint32_t size);
+uint32_t spc_ring_write_position(void);
+uint32_t spc_ring_read_position(void);
+uint32_t spc_ring_skip_to(uint32_t pos);
+int spc_ring_format_changing(void);
+uint32_t spc_ring_readable(void);
+uint32_t spc_ring_capacity(void);
+uint32_t spc_ring_overrun_count(void);
+int spc_ring_format(SpSampleFormat *format);
+void spc_sos_process_s16(
+    int16_t *samples, uint32_t num_frames, uint32_t channels,
+    const double *sos, uint32_t sections, double *state);
+void spc_sos_process_f32(
+    float *samples, uint32_t num_frames, uint32_t channels,
+    const double *sos, uint32_t sections, double *state);
+void spc_gain_smooth(
+    double *gain, uint32_t num_frames, uint32_t hold, double attack,
+    double release, double *state);
+void spc_spectrum_publish(
+    uint32_t *sequence, float *levels, const double *bands, uint32_t count);
+uint32_t spc_spectrum_read(
+    const uint32_t *sequence, const float *levels, float *out,
+    uint32_t count);
+uint32_t spc_rtp_send(
+    int fd, const int16_t *samples, uint32_t num_packets,
+    uint32_t packet_frames, uint32_t channels, uint8_t *header,
+    uint8_t *buffer, uint32_t batch);
+""")
 
 ffi.set_source(
     'spotifyconnect._spotifyconnect',
-    header,
+    header + native,
     libraries=['spotify_embedded_shared'],
     include_dirs=[
         os.path.dirname(__file__)])
@@ -9,15 +9,42 @@ __all__ = [
     'AudioBufferStats',
     'AudioFormat',
     'Bitrate',
+    'SampleFormat',
     'SampleType',
+    'TrackMarker',
+    'frame_array',
 ]
 
 
 class AudioBufferStats(collections.namedtuple(
-        'AudioBufferStats', ['samples', 'stutter'])):
+        'AudioBufferStats', ['samples', 'stutter', 'overruns', 'target'])):
 
-    """Stats about the application's alsa_sink buffers."""
-    pass
+    """Stats about the application's alsa_sink buffers.
+
+    ``samples`` is the number of samples currently buffered, counting every
+    channel of a frame like libspotify does, ``stutter`` the number of times
+    the buffer ran empty during playback, ``overruns`` the number of times
+    audio could not be accepted because the buffer was full and ``target``
+    the number of samples buffered before playback starts.
+    """
+
+    def __new__(cls, samples, stutter, overruns=0, target=0):
+        return super(AudioBufferStats, cls).__new__(
+            cls, samples, stutter, overruns, target)
+
+
+class TrackMarker(collections.namedtuple(
+        'TrackMarker', ['offset', 'track_uri', 'reason'])):
+
+    """A track boundary in the audio of a period.
+
+    ``offset`` is the index of the first frame in the period that belongs to
+    the track ``track_uri``, which is :class:`None` if the track is unknown.
+    ``reason`` is the :class:`PlaybackNotify` that started the track,
+    :attr:`~PlaybackNotify.TrackChanged` or
+    :attr:`~PlaybackNotify.AudioFlush`, or
+    :attr:`PlayerEvent.PLAYBACK_SEEK` after a seek.
+    """
 
 
 @utils.make_enum('kSpBitrate', 'BITRATE_')
@@ -30,6 +57,31 @@ class SampleType(utils.IntEnum):
     pass
 
 
+# Sample types libspotify never delivers, but audio can be converted to with
+# a FormatConverter. S24NativeEndian is 24-bit audio in the low bits of a
+# 32-bit sample, S24_3LE packs each 24-bit sample into three bytes.
+SampleType.add('S24NativeEndian', 100)
+SampleType.add('S24_3LE', 101)
+SampleType.add('S32NativeEndian', 102)
+SampleType.add('Float32NativeEndian', 103)
+
+
+_SAMPLE_SIZES = {
+    SampleType.S16NativeEndian: 2,
+    SampleType.S24NativeEndian: 4,
+    SampleType.S24_3LE: 3,
+    SampleType.S32NativeEndian: 4,
+    SampleType.Float32NativeEndian: 4,
+}
+
+
+def _sample_size(sample_type):
+    try:
+        return _SAMPLE_SIZES[sample_type]
+    except KeyError:
+        raise ValueError('Unknown sample type: %d' % sample_type)
+
+
 class AudioFormat(object):
 
     """A Spotify alsa_sink format object.
@@ -44,8 +96,9 @@ class AudioFormat(object):
 
     @property
     def sample_type(self):
-        """The :class:`SampleType`, currently always
-        :attr:`SampleType.S16NativeEndian`."""
+        """The :class:`SampleType`. libspotify always delivers
+        :attr:`SampleType.S16NativeEndian`, the other types are only used
+        for converted audio."""
         return SampleType(self._sp_audioformat.sample_type)
 
     @property
@@ -61,17 +114,129 @@ class AudioFormat(object):
     @property
     def frame_size(self):
         """The byte size of a single frame of this format."""
-        if self.sample_type == SampleType.S16NativeEndian:
-            # Sample size is 2 bytes
-            return self.sample_size * self.channels
-        else:
-            raise ValueError('Unknown sample type: %d', self.sample_type)
+        return self.sample_size * self.channels
 
     @property
     def sample_size(self):
-        """The byte size of a single frame of this format."""
-        if self.sample_type == SampleType.S16NativeEndian:
-            # Sample size is 2 bytes
-            return 2
-        else:
-            raise ValueError('Unknown sample type: %d', self.sample_type)
+        """The byte size of a single sample of this format."""
+        return _sample_size(self.sample_type)
+
+
+class SampleFormat(object):
+
+    """An immutable description of an audio format.
+
+    Unlike :class:`AudioFormat`, which reads libspotify's format struct on
+    every attribute access, a :class:`SampleFormat` is a plain value with
+    :attr:`sample_size` and :attr:`frame_size` computed once. Instances are
+    interned, so there is only one instance per combination of ``channels``,
+    ``sample_type`` and ``sample_rate`` and formats can be compared by
+    identity.
+
+    :class:`SampleFormat` has the same attributes as :class:`AudioFormat` and
+    can be used wherever an :class:`AudioFormat` is expected.
+    """
+
+    __slots__ = (
+        'channels', 'sample_type', 'sample_rate', 'sample_size', 'frame_size')
+
+    _instances = {}
+
+    def __new__(cls, channels, sample_type, sample_rate):
+        key = (channels, sample_type, sample_rate)
+        instance = cls._instances.get(key)
+        if instance is not None:
+            return instance
+        sample_type = SampleType(sample_type)
+        sample_size = _sample_size(sample_type)
+        instance = object.__new__(cls)
+        instance.channels = channels
+        instance.sample_type = sample_type
+        instance.sample_rate = sample_rate
+        instance.sample_size = sample_size
+        instance.frame_size = sample_size * channels
+        return cls._instances.setdefault(key, instance)
+
+    @classmethod
+    def from_sp_audioformat(cls, sp_audioformat):
+        """Get the :class:`SampleFormat` matching a ``SpSampleFormat``
+        struct."""
+        key = (
+            sp_audioformat.channels,
+            sp_audioformat.sample_type,
+            sp_audioformat.sample_rate)
+        instance = cls._instances.get(key)
+        if instance is None:
+            instance = cls(*key)
+        return instance
+
+    @classmethod
+    def from_audio_format(cls, audio_format):
+        """Get the :class:`SampleFormat` matching an :class:`AudioFormat`."""
+        return cls(
+            audio_format.channels,
+            audio_format.sample_type,
+            audio_format.sample_rate)
+
+    @property
+    def dtype(self):
+        """The name of the NumPy dtype of a single sample of this format."""
+        return _NUMPY_DTYPES[self.sample_type]
+
+    @property
+    def full_scale(self):
+        """The magnitude of a full scale sample of this format.
+
+        This is 1.0 for float samples and e.g. 32768.0 for 16-bit samples,
+        which range from ``-full_scale`` to ``full_scale - 1``.
+        """
+        return _FULL_SCALES[self.sample_type]
+
+    def __repr__(self):
+        return 'SampleFormat(channels=%d, sample_type=%r, sample_rate=%d)' % (
+            self.channels, self.sample_type, self.sample_rate)
+
+
+_NUMPY_DTYPES = {
+    SampleType.S16NativeEndian: 'int16',
+    SampleType.S24NativeEndian: 'int32',
+    # NumPy has no 24-bit integers, so packed samples are opaque 3-byte
+    # values.
+    SampleType.S24_3LE: 'V3',
+    SampleType.S32NativeEndian: 'int32',
+    SampleType.Float32NativeEndian: 'float32',
+}
+
+_FULL_SCALES = {
+    SampleType.S16NativeEndian: float(1 << 15),
+    SampleType.S24NativeEndian: float(1 << 23),
+    SampleType.S24_3LE: float(1 << 23),
+    SampleType.S32NativeEndian: float(1 << 31),
+    SampleType.Float32NativeEndian: 1.0,
+}
+
+
+def frame_array(audio_format, frames, num_frames=None):
+    """Get a read-only ``(num_frames, channels)`` NumPy array over ``frames``.
+
+    ``frames`` may be any object supporting the buffer protocol, like the
+    :class:`bytes` or :func:`ffi.buffer` delivered to sinks. The array is a
+    view, so no audio is copied, and it is only valid as long as ``frames``
+    is. If ``num_frames`` is :class:`None`, all of ``frames`` is used.
+
+    Requires NumPy.
+    """
+    numpy = utils.get_numpy()
+    try:
+        dtype = _NUMPY_DTYPES[audio_format.sample_type]
+    except KeyError:
+        raise ValueError('Unknown sample type: %d' % audio_format.sample_type)
+    channels = audio_format.channels
+    if num_frames is None:
+        count = -1
+    else:
+        count = num_frames * channels
+    array = numpy.frombuffer(frames, dtype=dtype, count=count)
+    array = array.reshape(-1, channels)
+    array.flags.writeable = False
+    return array
@@ -0,0 +1,211 @@
+from __future__ import division, unicode_literals
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.pipeline import Stage
+from spotifyconnect.sink import Sink
+
+__all__ = [
+    'ChannelMatrix',
+    'ChannelSplitSink',
+]
+
+
+# Integer sample types, which mixed audio is clipped to full scale for.
+_INTEGER_TYPES = (
+    spotifyconnect.SampleType.S16NativeEndian,
+    spotifyconnect.SampleType.S24NativeEndian,
+    spotifyconnect.SampleType.S32NativeEndian,
+)
+
+
+class ChannelMatrix(Stage):
+
+    """A :class:`Stage` that routes and mixes channels with a gain matrix.
+
+    ``matrix`` has one row per output channel and one column per input
+    channel, and each output channel is the sum of the input channels
+    weighted by its row. E.g. ``[[0.5, 0.5]]`` mixes stereo down to mono and
+    ``[[0, 1], [1, 0]]`` swaps left and right. The class methods build the
+    common matrices.
+
+    Each block is mixed with a single matrix multiplication. Integer output
+    is rounded and clipped. Requires NumPy.
+
+    :param matrix: the gains from each input channel to each output channel
+    :type matrix: list of lists of float
+    """
+
+    in_place = False
+
+    def __init__(self, matrix):
+        self._numpy = utils.get_numpy()
+        matrix = self._numpy.array(matrix, dtype='float32', ndmin=2)
+        if matrix.ndim != 2 or matrix.size == 0:
+            raise ValueError('Channel matrix must be a non-empty 2D matrix')
+        self._matrix = matrix
+        # Transposed once, so frames can be multiplied by it directly.
+        self._gains = matrix.T.copy()
+        self._capacity = 0
+        self._limits = None
+
+    @classmethod
+    def downmix(cls, channels=2):
+        """Mix ``channels`` input channels down to mono."""
+        return cls([[1 / channels] * channels])
+
+    @classmethod
+    def swap(cls):
+        """Swap the left and right channels of stereo audio."""
+        return cls([[0, 1], [1, 0]])
+
+    @classmethod
+    def select(cls, channels, input_channels=2):
+        """Output the input channels with the indexes in ``channels``.
+
+        Channels can be listed more than once to duplicate them, e.g.
+        ``[0, 0, 1, 1]`` feeds two bi-amped speakers from stereo audio.
+        """
+        matrix = [[0] * input_channels for channel in channels]
+        for row, channel in zip(matrix, channels):
+            row[channel] = 1
+        return cls(matrix)
+
+    @property
+    def matrix(self):
+        """The gain matrix, with one row per output channel."""
+        return self._matrix
+
+    @property
+    def channels(self):
+        """The number of output channels."""
+        return self._matrix.shape[0]
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type == spotifyconnect.SampleType.Float32NativeEndian:
+            self._limits = None
+        elif sample_type in _INTEGER_TYPES:
+            scale = int(audio_format.full_scale)
+            self._limits = (-scale, scale - 1)
+        else:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        if audio_format.channels != self._matrix.shape[1]:
+            raise ValueError(
+                'Channel matrix needs %d input channels, got %d' % (
+                    self._matrix.shape[1], audio_format.channels))
+        self._capacity = 0
+        return spotifyconnect.SampleFormat(
+            self.channels, sample_type, audio_format.sample_rate)
+
+    def process(self, audio_format, frames, out):
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames, audio_format.channels)
+        out = out[:num_frames]
+        if self._limits is None:
+            numpy.matmul(frames, self._gains, out=out)
+            return out
+        # Mix in float, so nothing overflows before clipping.
+        mixed = self._mixed[:num_frames]
+        samples = self._samples[:num_frames]
+        numpy.copyto(samples, frames)
+        numpy.matmul(samples, self._gains, out=mixed)
+        numpy.rint(mixed, out=mixed)
+        numpy.clip(mixed, self._limits[0], self._limits[1], out=mixed)
+        numpy.copyto(out, mixed, casting='unsafe')
+        return out
+
+    def _allocate(self, num_frames, input_channels):
+        numpy = self._numpy
+        self._samples = numpy.empty(
+            (num_frames, input_channels), dtype='float64')
+        self._mixed = numpy.empty(
+            (num_frames, self.channels), dtype='float64')
+        self._capacity = num_frames
+
+
+class ChannelSplitSink(Sink):
+
+    """Sink that sends different channels of the audio to different sinks.
+
+    ``routes`` is a list of ``(matrix, sink)`` pairs, where ``matrix`` is a
+    :class:`ChannelMatrix` picking the channels for ``sink``. E.g. to play
+    the left channel in one zone and the right channel in another::
+
+        ChannelSplitSink([
+            (ChannelMatrix.select([0]), left_zone_sink),
+            (ChannelMatrix.select([1]), right_zone_sink),
+        ])
+
+    The sinks must not be turned on themselves; they are opened and closed
+    together with this sink. Zones don't hold each other back: if a sink
+    doesn't accept all of its audio, the rest is dropped and counted in
+    :attr:`overruns`. Requires NumPy.
+
+    :param routes: the channel matrix and sink of each zone
+    :type routes: list of (:class:`ChannelMatrix`, :class:`Sink`) pairs
+    """
+
+    zero_copy = True
+    numpy_frames = True
+
+    def __init__(self, routes):
+        self._numpy = utils.get_numpy()
+        self._routes = list(routes)
+        self._audio_format = None
+        self._formats = None
+        self._buffers = None
+        self._capacity = 0
+
+    @property
+    def routes(self):
+        """The ``(matrix, sink)`` pairs of the zones."""
+        return list(self._routes)
+
+    @property
+    def frames_buffered(self):
+        return max([0] + [
+            sink.frames_buffered for matrix, sink in self._routes])
+
+    def _open(self):
+        for matrix, sink in self._routes:
+            sink._open()
+
+    def _close(self):
+        for matrix, sink in self._routes:
+            sink._close()
+
+    def _write(self, audio_format, frames, num_frames):
+        if audio_format is not self._audio_format:
+            self._negotiate(audio_format, num_frames)
+        elif num_frames > self._capacity:
+            self._allocate(num_frames)
+        session = spotifyconnect._session_instance
+        for (matrix, sink), output_format, buffer in zip(
+                self._routes, self._formats, self._buffers):
+            output = matrix.process(audio_format, frames, buffer)
+            if sink.zero_copy or sink.numpy_frames:
+                data = utils.byte_view(output)
+            else:
+                data = output.tobytes()
+            num_frames_consumed = sink._on_music_delivery(
+                output_format, data, num_frames, None, session)
+            if num_frames_consumed < num_frames:
+                self.overruns += 1
+        return num_frames
+
+    def _negotiate(self, audio_format, num_frames):
+        self._formats = [
+            matrix.negotiate(audio_format) for matrix, sink in self._routes]
+        self._audio_format = audio_format
+        self._allocate(num_frames)
+
+    def _allocate(self, num_frames):
+        self._buffers = [
+            self._numpy.empty(
+                (num_frames, output_format.channels),
+                dtype=output_format.dtype)
+            for output_format in self._formats]
+        self._capacity = num_frames
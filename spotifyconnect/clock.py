@@ -0,0 +1,98 @@
+from __future__ import division, unicode_literals
+
+import threading
+
+import spotifyconnect
+from spotifyconnect import utils
+
+__all__ = [
+    'PlaybackClock',
+]
+
+
+_clock = utils.perf_counter
+
+
+class PlaybackClock(object):
+
+    """The playback position in the current track, derived from the audio
+    the sink has consumed.
+
+    You'll never need to create an instance of this class yourself. You'll
+    find it ready to use as the :attr:`~Player.clock` attribute on the
+    :class:`Player` instance.
+
+    Every delivery of audio moves the clock on by the frames the sink
+    consumed, less the frames the sink reports through ``pending`` as
+    buffered but not played yet. Between deliveries the position moves on
+    with the time, but never past the audio consumed so far. The clock is
+    rebased on :attr:`~PlayerEvent.PLAYBACK_SEEK`, frozen on
+    :attr:`~PlaybackNotify.Pause` until :attr:`~PlaybackNotify.Play`, and
+    reset to the start on :attr:`~PlaybackNotify.TrackChanged`.
+
+    Reading :attr:`position_ms` neither calls libspotify nor takes any lock,
+    so UIs can poll it as often as they like from any thread.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = True
+        self._base_ms = 0
+        self._consumed_ms = 0.0
+        # (base_ms, played_ms, time, running, limit_ms), replaced as a whole
+        # so readers always see a consistent state without locking.
+        self._state = (0, 0.0, _clock(), True, 0.0)
+
+    @property
+    def position_ms(self):
+        """The position in the current track in milliseconds."""
+        base_ms, played_ms, at, running, limit_ms = self._state
+        if running:
+            played_ms += (_clock() - at) * 1000
+        return int(max(base_ms, min(played_ms, limit_ms)))
+
+    @property
+    def running(self):
+        """Whether the clock is running, i.e. playback isn't paused."""
+        return self._state[3]
+
+    def _on_frames(self, num_frames, frames_buffered, sample_rate):
+        # Called from the audio thread after the sink consumed num_frames
+        # frames and reported frames_buffered frames not played yet.
+        if not sample_rate:
+            return
+        with self._lock:
+            self._consumed_ms += num_frames * 1000 / sample_rate
+            limit_ms = self._base_ms + self._consumed_ms
+            if self._running:
+                played_ms = limit_ms - frames_buffered * 1000 / sample_rate
+            else:
+                # Stay frozen until playback resumes.
+                played_ms = self._state[1]
+            self._state = (
+                self._base_ms, played_ms, _clock(), self._running, limit_ms)
+
+    def _on_playback_notify(self, playback_notify):
+        if playback_notify == spotifyconnect.PlaybackNotify.Pause:
+            self._set_running(False)
+        elif playback_notify == spotifyconnect.PlaybackNotify.Play:
+            self._set_running(True)
+        elif playback_notify == spotifyconnect.PlaybackNotify.TrackChanged:
+            self._rebase(0)
+
+    def _on_playback_seek(self, millis):
+        self._rebase(millis)
+
+    def _set_running(self, running):
+        with self._lock:
+            position_ms = self.position_ms
+            self._running = running
+            self._state = (
+                self._base_ms, position_ms, _clock(), running,
+                self._base_ms + self._consumed_ms)
+
+    def _rebase(self, millis):
+        with self._lock:
+            self._base_ms = millis
+            self._consumed_ms = 0.0
+            self._state = (millis, millis, _clock(), self._running, millis)
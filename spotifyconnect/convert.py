@@ -0,0 +1,181 @@
+from __future__ import division, unicode_literals
+
+import sys
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'FormatConverter',
+]
+
+
+# Significant bits of each sample type. Float samples have the precision of
+# their 24-bit mantissa.
+_BITS = {
+    spotifyconnect.SampleType.S16NativeEndian: 16,
+    spotifyconnect.SampleType.S24NativeEndian: 24,
+    spotifyconnect.SampleType.S24_3LE: 24,
+    spotifyconnect.SampleType.S32NativeEndian: 32,
+    spotifyconnect.SampleType.Float32NativeEndian: 24,
+}
+
+_FLOAT = spotifyconnect.SampleType.Float32NativeEndian
+
+# Bytes of a native 32-bit integer holding the low 24 bits.
+if sys.byteorder == 'little':
+    _LOW_BYTES = slice(0, 3)
+else:
+    _LOW_BYTES = slice(1, 4)
+
+# Number of dither noise samples generated up front. The noise repeats after
+# this many samples, which is well over a second of stereo audio.
+_NOISE_SIZE = 1 << 17
+
+
+class FormatConverter(Stage):
+
+    """A :class:`Stage` that converts audio to another :class:`SampleType`.
+
+    libspotify delivers 16-bit audio, which is converted exactly to
+    :attr:`~SampleType.Float32NativeEndian`, to 24-bit audio in a 32-bit
+    :attr:`~SampleType.S24NativeEndian` or packed
+    :attr:`~SampleType.S24_3LE` sample, or to
+    :attr:`~SampleType.S32NativeEndian`.
+
+    Audio can also be converted the other way, e.g. back to 16 bits after
+    floating point processing. If ``dither`` is :class:`True`, TPDF dither
+    of one least significant bit of the output is added whenever the output
+    has fewer bits than the input, which turns the rounding error into
+    benign white noise. :attr:`~SampleType.S24_3LE` is only supported as
+    output.
+
+    All scratch buffers are kept between blocks, so converting a stream
+    allocates nothing once the largest block has been seen. Requires NumPy.
+
+    :param sample_type: the sample type to convert to
+    :type sample_type: :class:`SampleType`
+    :param dither: whether to dither when reducing the bit depth
+    :type dither: bool
+    :param seed: seed for the dither noise, for reproducible output
+    :type seed: int or :class:`None`
+    """
+
+    in_place = False
+
+    def __init__(
+            self, sample_type=spotifyconnect.SampleType.Float32NativeEndian,
+            dither=False, seed=None):
+        self._numpy = utils.get_numpy()
+        self._sample_type = spotifyconnect.SampleType(sample_type)
+        if self._sample_type not in _BITS:
+            raise ValueError('Unknown sample type: %d' % sample_type)
+        self._dither = dither
+        if dither:
+            # The difference of two uniform random numbers has a triangular
+            # distribution of +-1 least significant bit. RandomState can't
+            # fill a preallocated array, but unlike Generator it is available
+            # in every NumPy version we support, so the noise is generated
+            # once and read from at a rolling offset.
+            random = self._numpy.random.RandomState(seed)
+            self._noise = random.random_sample(_NOISE_SIZE)
+            self._noise -= random.random_sample(_NOISE_SIZE)
+            self._noise_offset = 0
+        self._input_type = None
+        self._capacity = 0
+
+    @property
+    def sample_type(self):
+        """The :class:`SampleType` audio is converted to."""
+        return self._sample_type
+
+    @property
+    def dither(self):
+        """Whether dither is added when reducing the bit depth."""
+        return self._dither
+
+    def negotiate(self, audio_format):
+        input_type = audio_format.sample_type
+        if (input_type not in _BITS or
+                input_type == spotifyconnect.SampleType.S24_3LE):
+            raise ValueError('Unsupported sample type: %d' % input_type)
+        output_format = spotifyconnect.SampleFormat(
+            audio_format.channels, self._sample_type,
+            audio_format.sample_rate)
+        self._input_type = input_type
+        self._input_scale = audio_format.full_scale
+        self._output_scale = output_format.full_scale
+        self._channels = audio_format.channels
+        self._capacity = 0
+        return output_format
+
+    def process(self, audio_format, frames, out):
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        numpy = self._numpy
+        input_type, output_type = self._input_type, self._sample_type
+        packed = output_type == spotifyconnect.SampleType.S24_3LE
+        out = out[:num_frames]
+        if packed:
+            # Convert to 24 bits in 32, then keep the low three bytes.
+            target = self._packing[:num_frames]
+            output_type = spotifyconnect.SampleType.S24NativeEndian
+        else:
+            target = out
+
+        if input_type == output_type:
+            target[...] = frames
+        elif (output_type != _FLOAT and input_type != _FLOAT and
+                _BITS[output_type] > _BITS[input_type]):
+            # Widening integers is exact, it is just a shift.
+            shift = _BITS[output_type] - _BITS[input_type]
+            numpy.multiply(frames, numpy.int32(1 << shift), out=target)
+        elif output_type == _FLOAT:
+            numpy.multiply(
+                frames, numpy.float32(1 / self._input_scale), out=target)
+        else:
+            self._quantize(frames, target, input_type, output_type)
+
+        if packed:
+            out.view('uint8').reshape(num_frames, self._channels, 3)[...] = (
+                target.view('uint8').reshape(
+                    num_frames, self._channels, 4)[..., _LOW_BYTES])
+        return out
+
+    def _quantize(self, frames, target, input_type, output_type):
+        # Reduce the bit depth, or convert from float, with rounding and
+        # optional dither.
+        numpy = self._numpy
+        num_frames = len(frames)
+        scaled = self._scaled[:num_frames]
+        scale = self._output_scale
+        numpy.multiply(frames, scale / self._input_scale, out=scaled)
+        if self._dither and _BITS[output_type] < _BITS[input_type]:
+            self._add_noise(scaled.reshape(-1))
+        numpy.rint(scaled, out=scaled)
+        numpy.clip(scaled, -scale, scale - 1, out=scaled)
+        numpy.copyto(target, scaled, casting='unsafe')
+
+    def _add_noise(self, samples):
+        # Add the next len(samples) values of the noise table, wrapping
+        # around at its end.
+        numpy = self._numpy
+        noise = self._noise
+        offset = self._noise_offset
+        start = 0
+        while start < len(samples):
+            count = min(len(samples) - start, len(noise) - offset)
+            chunk = samples[start:start + count]
+            numpy.add(chunk, noise[offset:offset + count], out=chunk)
+            start += count
+            offset = (offset + count) % len(noise)
+        self._noise_offset = offset
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        shape = (num_frames, self._channels)
+        self._scaled = numpy.empty(shape, dtype='float64')
+        self._packing = numpy.empty(shape, dtype='int32')
+        self._capacity = num_frames
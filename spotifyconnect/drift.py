@@ -0,0 +1,298 @@
+from __future__ import division, unicode_literals
+
+import collections
+import math
+import threading
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'DriftCorrector',
+    'DriftEstimator',
+]
+
+
+_clock = utils.perf_counter
+
+# Interpolation needs one frame before and two after each output frame.
+_HISTORY = 3
+
+
+class DriftEstimator(object):
+
+    """Estimates how fast a sink consumes audio compared to a reference
+    clock.
+
+    Each :meth:`update` records the frames the sink has consumed, that is
+    :attr:`Sink.frames_accepted` less :attr:`Sink.frames_buffered`, at a
+    time of the reference clock. The reference is the local monotonic clock
+    by default, but :meth:`update` also takes times from elsewhere, e.g.
+    timestamps received from a peer the audio should stay in sync with. The
+    consumption rate is the least squares slope of the frames against the
+    reference time over the last ``window`` seconds, which averages out the
+    jitter of period-sized writes to the audio device.
+
+    Call :meth:`update` regularly, e.g. once a second, and :meth:`reset`
+    when the sink drops audio without playing it, e.g. after a flush. Feed
+    :attr:`drift_ppm` to a :class:`DriftCorrector` to correct the drift.
+
+    :param sink: the sink whose consumption is measured
+    :type sink: :class:`Sink`
+    :param sample_rate: the sample rate of the audio the sink plays
+    :type sample_rate: int
+    :param window: the number of seconds of measurements used
+    :type window: float
+    :param reference: a function returning the reference time in seconds,
+        or :class:`None` for the local monotonic clock
+    :type reference: callable or :class:`None`
+    """
+
+    def __init__(self, sink, sample_rate, window=300.0, reference=None):
+        self._sink = sink
+        self._sample_rate = sample_rate
+        self._window = window
+        self._reference = reference or _clock
+        self._lock = threading.Lock()
+        self._measurements = collections.deque()
+        self._drift_ppm = 0.0
+
+    @property
+    def drift_ppm(self):
+        """How much faster the sink consumes audio than the reference clock,
+        in parts per million, or 0.0 until there are enough measurements."""
+        return self._drift_ppm
+
+    @property
+    def num_measurements(self):
+        """The number of measurements in the window."""
+        return len(self._measurements)
+
+    @property
+    def span(self):
+        """The number of reference seconds covered by the measurements."""
+        measurements = list(self._measurements)
+        if not measurements:
+            return 0.0
+        return measurements[-1][0] - measurements[0][0]
+
+    def update(self, reference_time=None):
+        """Record the sink's consumption at ``reference_time``, or now if
+        :class:`None`, and return the new :attr:`drift_ppm`."""
+        if reference_time is None:
+            reference_time = self._reference()
+        frames = self._sink.frames_accepted - self._sink.frames_buffered
+        with self._lock:
+            measurements = self._measurements
+            measurements.append((reference_time, frames))
+            while reference_time - measurements[0][0] > self._window:
+                measurements.popleft()
+            slope = self._slope()
+            if slope is not None:
+                self._drift_ppm = (slope / self._sample_rate - 1) * 1e6
+        return self._drift_ppm
+
+    def reset(self):
+        """Forget all measurements."""
+        with self._lock:
+            self._measurements.clear()
+            self._drift_ppm = 0.0
+
+    def _slope(self):
+        # Least squares fit, relative to the first measurement to keep the
+        # sums small.
+        measurements = self._measurements
+        n = len(measurements)
+        if n < 3:
+            return None
+        t0, f0 = measurements[0]
+        sum_t = sum_f = sum_tt = sum_tf = 0.0
+        for t, f in measurements:
+            t -= t0
+            f -= f0
+            sum_t += t
+            sum_f += f
+            sum_tt += t * t
+            sum_tf += t * f
+        denominator = n * sum_tt - sum_t * sum_t
+        if denominator <= 0:
+            return None
+        return (n * sum_tf - sum_t * sum_f) / denominator
+
+
+class DriftCorrector(Stage):
+
+    """A :class:`Stage` that resamples the audio by a tiny ratio to correct
+    clock drift.
+
+    When the audio device runs :attr:`correction_ppm` parts per million
+    faster than the reference clock, the stage stretches the audio by the
+    same amount, so the device plays it at the reference rate. The audio is
+    resampled continuously with cubic interpolation between frames, so there
+    are no skipped or repeated frames, and the pitch changes by at most a
+    few hundredths of a semitone. The correction is limited to ``max_ppm``.
+
+    The correction follows the :attr:`DriftEstimator.drift_ppm` of
+    ``estimator``, or can be set directly. :attr:`frames_adjusted` counts
+    the frames added to, or if negative removed from, the audio so far. The
+    stage delays the audio by two frames.
+
+    Supports :attr:`~SampleType.S16NativeEndian` and
+    :attr:`~SampleType.Float32NativeEndian` audio. Requires NumPy.
+
+    :param estimator: the estimator to follow, or :class:`None` to set
+        :attr:`correction_ppm` yourself
+    :type estimator: :class:`DriftEstimator` or :class:`None`
+    :param max_ppm: the largest correction in parts per million
+    :type max_ppm: float
+    """
+
+    in_place = False
+    latency = _HISTORY - 1
+
+    def __init__(self, estimator=None, max_ppm=1000.0):
+        self._numpy = utils.get_numpy()
+        self._estimator = estimator
+        self._max_ppm = max_ppm
+        self._correction_ppm = 0.0
+        self._capacity = 0
+        self._channels = 0
+        self._position = 1.0
+        self._frames_in = 0
+        self._frames_out = 0
+
+    @property
+    def correction_ppm(self):
+        """The correction applied to the audio in parts per million, positive
+        when the audio is stretched."""
+        return self._correction_ppm
+
+    @correction_ppm.setter
+    def correction_ppm(self, value):
+        self._correction_ppm = max(-self._max_ppm, min(value, self._max_ppm))
+
+    @property
+    def frames_adjusted(self):
+        """The number of frames added to the audio so far, negative if more
+        frames were removed."""
+        return self._frames_out - self._frames_in
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type not in (
+                spotifyconnect.SampleType.S16NativeEndian,
+                spotifyconnect.SampleType.Float32NativeEndian):
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        self._integer = (
+            sample_type == spotifyconnect.SampleType.S16NativeEndian)
+        self._channels = audio_format.channels
+        self._capacity = 0
+        self.reset()
+        return audio_format
+
+    def max_output_frames(self, num_frames):
+        return int(num_frames * (1 + self._max_ppm * 1e-6)) + _HISTORY
+
+    def reset(self):
+        self._position = 1.0
+        if self._capacity:
+            self._work[:_HISTORY] = 0
+
+    def process(self, audio_format, frames, out):
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        if self._estimator is not None:
+            self.correction_ppm = self._estimator.drift_ppm
+        step = 1 / (1 + self._correction_ppm * 1e-6)
+        work = self._work
+        work[_HISTORY:_HISTORY + num_frames] = frames
+
+        # Output frames are interpolated at positions in the work buffer,
+        # up to the last one with two frames after it.
+        end = num_frames + 1
+        position = self._position
+        n = max(0, int(math.ceil((end - position) / step)))
+        if n and position + (n - 1) * step >= end:
+            n -= 1
+        positions = self._positions[:n]
+        numpy.multiply(self._steps[:n], step, out=positions)
+        numpy.add(positions, position, out=positions)
+        floors = self._floors[:n]
+        numpy.floor(positions, out=floors)
+        fraction = self._fraction[:n]
+        numpy.subtract(positions, floors, out=fraction[:, 0])
+        # The index of the frame before each position.
+        numpy.subtract(floors, 1, out=floors)
+        index = self._index[:n]
+        numpy.copyto(index, floors, casting='unsafe')
+
+        # Catmull-Rom spline through the frames around each position.
+        before = numpy.take(work, index, axis=0, out=self._before[:n])
+        x0 = numpy.take(work[1:], index, axis=0, out=self._x0[:n])
+        x1 = numpy.take(work[2:], index, axis=0, out=self._x1[:n])
+        after = numpy.take(work[3:], index, axis=0, out=self._after[:n])
+        result = self._result[:n]
+        c = self._c[:n]
+        # c3 = (after - before) / 2 + 3 (x0 - x1) / 2
+        numpy.subtract(x0, x1, out=result)
+        numpy.multiply(result, 3, out=result)
+        numpy.add(result, after, out=result)
+        numpy.subtract(result, before, out=result)
+        numpy.multiply(result, 0.5, out=result)
+        numpy.multiply(result, fraction, out=result)
+        # c2 = before - 5 x0 / 2 + 2 x1 - after / 2
+        numpy.multiply(x1, 4, out=c)
+        numpy.subtract(c, after, out=c)
+        numpy.multiply(c, 0.5, out=c)
+        numpy.add(c, before, out=c)
+        numpy.add(result, c, out=result)
+        numpy.multiply(x0, 2.5, out=c)
+        numpy.subtract(result, c, out=result)
+        numpy.multiply(result, fraction, out=result)
+        # c1 = (x1 - before) / 2
+        numpy.subtract(x1, before, out=c)
+        numpy.multiply(c, 0.5, out=c)
+        numpy.add(result, c, out=result)
+        numpy.multiply(result, fraction, out=result)
+        numpy.add(result, x0, out=result)
+
+        out = out[:n]
+        if self._integer:
+            numpy.rint(result, out=result)
+            numpy.clip(result, -32768, 32767, out=result)
+        numpy.copyto(out, result, casting='unsafe')
+
+        # Keep the last frames as history for the next block.
+        work[:_HISTORY] = work[num_frames:num_frames + _HISTORY]
+        self._position = position + n * step - num_frames
+        self._frames_in += num_frames
+        self._frames_out += n
+        return out
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        channels = self._channels
+        max_output_frames = self.max_output_frames(num_frames)
+        history = None
+        if self._capacity:
+            history = self._work[:_HISTORY].copy()
+        self._work = numpy.zeros(
+            (_HISTORY + num_frames, channels), dtype='float32')
+        if history is not None:
+            self._work[:_HISTORY] = history
+        self._steps = numpy.arange(max_output_frames, dtype='float64')
+        self._positions = numpy.empty(max_output_frames, dtype='float64')
+        self._floors = numpy.empty(max_output_frames, dtype='float64')
+        self._index = numpy.empty(max_output_frames, dtype='int64')
+        self._fraction = numpy.empty((max_output_frames, 1), dtype='float32')
+        shape = (max_output_frames, channels)
+        self._before = numpy.empty(shape, dtype='float32')
+        self._x0 = numpy.empty(shape, dtype='float32')
+        self._x1 = numpy.empty(shape, dtype='float32')
+        self._after = numpy.empty(shape, dtype='float32')
+        self._c = numpy.empty(shape, dtype='float32')
+        self._result = numpy.empty(shape, dtype='float32')
+        self._capacity = num_frames
@@ -0,0 +1,211 @@
+from __future__ import division, unicode_literals
+
+import math
+
+import spotifyconnect
+from spotifyconnect import ffi, lib, utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'Compressor',
+]
+
+
+# The longest look-ahead allowed, which bounds the latency of the stage.
+MAX_LOOKAHEAD_MS = 100
+
+# Sample types the stage supports.
+_SAMPLE_TYPES = (
+    spotifyconnect.SampleType.S16NativeEndian,
+    spotifyconnect.SampleType.Float32NativeEndian,
+)
+
+# Levels are floored at -200 dBFS, so silence has a finite level.
+_MIN_LEVEL = 1e-10
+
+
+def _coefficient(millis, sample_rate):
+    # The pole of a one-pole smoother with a time constant of ``millis``.
+    frames = millis * sample_rate / 1000
+    if frames <= 0:
+        return 0.0
+    return math.exp(-1 / frames)
+
+
+class Compressor(Stage):
+
+    """A :class:`Stage` that compresses the dynamic range of the audio.
+
+    The level of each frame is the peak of its channels, so all channels get
+    the same gain and the stereo image is kept. Whenever the level goes
+    above ``threshold`` dBFS, the gain is reduced so that the level above the
+    threshold is divided by ``ratio``. The gain reduction follows the level
+    with ``attack_ms`` and ``release_ms`` time constants, and ``makeup`` dB
+    of gain is added afterwards.
+
+    The audio is delayed by ``lookahead_ms`` milliseconds, at most
+    :data:`MAX_LOOKAHEAD_MS`, while the gain reduction is computed from the
+    undelayed audio, so the gain is already reduced when a peak is output.
+    The delay is reported by :attr:`latency`, and is included in
+    :attr:`Pipeline.frames_buffered`. Use :meth:`limiter` to keep peaks
+    below a ceiling.
+
+    The level detection and gain are computed over whole blocks with NumPy,
+    and the attack and release smoothing runs in C. The current gain
+    reduction is available from :attr:`gain_reduction` for metering.
+
+    Supports :attr:`~SampleType.S16NativeEndian` and
+    :attr:`~SampleType.Float32NativeEndian` audio. Requires NumPy.
+
+    :param threshold: the level in dBFS above which the audio is compressed
+    :type threshold: float
+    :param ratio: the compression ratio, :class:`float` ``inf`` to limit
+    :type ratio: float
+    :param attack_ms: the time constant of gain reductions
+    :type attack_ms: float
+    :param release_ms: the time constant of gain recovery
+    :type release_ms: float
+    :param lookahead_ms: how far ahead the level is detected
+    :type lookahead_ms: float
+    :param makeup: the gain in dB added after compression
+    :type makeup: float
+    """
+
+    def __init__(
+            self, threshold=-20.0, ratio=4.0, attack_ms=5.0,
+            release_ms=100.0, lookahead_ms=5.0, makeup=0.0):
+        if ratio < 1:
+            raise ValueError('Ratio must be at least 1, got %r' % ratio)
+        if not 0 <= lookahead_ms <= MAX_LOOKAHEAD_MS:
+            raise ValueError(
+                'Look-ahead must be between 0 and %d ms, got %r' % (
+                    MAX_LOOKAHEAD_MS, lookahead_ms))
+        self._numpy = utils.get_numpy()
+        self._threshold = threshold
+        self._ratio = ratio
+        self._attack_ms = attack_ms
+        self._release_ms = release_ms
+        self._lookahead_ms = lookahead_ms
+        self._makeup = makeup
+        self._lookahead = 0
+        self._capacity = 0
+        self._state = ffi.new('double[]', 3)
+        self._gain_reduction = 0.0
+
+    @classmethod
+    def limiter(cls, ceiling=-1.0, release_ms=50.0, lookahead_ms=5.0):
+        """A brickwall limiter keeping the peaks below ``ceiling`` dBFS.
+
+        The attack is short enough to be complete within the look-ahead, and
+        anything that still gets above the ceiling is clipped.
+        """
+        return cls(
+            threshold=ceiling, ratio=float('inf'),
+            attack_ms=lookahead_ms / 5, release_ms=release_ms,
+            lookahead_ms=lookahead_ms)
+
+    @property
+    def threshold(self):
+        """The level in dBFS above which the audio is compressed."""
+        return self._threshold
+
+    @property
+    def ratio(self):
+        """The compression ratio."""
+        return self._ratio
+
+    @property
+    def gain_reduction(self):
+        """The largest gain reduction applied to the last block of audio, in
+        dB and positive, not counting the makeup gain."""
+        return self._gain_reduction
+
+    @property
+    def latency(self):
+        return self._lookahead
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type not in _SAMPLE_TYPES:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        sample_rate = audio_format.sample_rate
+        self._scale = audio_format.full_scale
+        self._integer = (
+            sample_type != spotifyconnect.SampleType.Float32NativeEndian)
+        self._channels = audio_format.channels
+        self._lookahead = int(round(self._lookahead_ms * sample_rate / 1000))
+        self._attack = _coefficient(self._attack_ms, sample_rate)
+        self._release = _coefficient(self._release_ms, sample_rate)
+        self._capacity = 0
+        self.reset()
+        return audio_format
+
+    def reset(self):
+        self._state[0:3] = [0.0, 0.0, 0.0]
+        self._gain_reduction = 0.0
+        if self._capacity:
+            self._work[:self._lookahead] = 0
+
+    def process(self, audio_format, frames, out):
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        lookahead = self._lookahead
+        work = self._work
+        samples = work[lookahead:lookahead + num_frames]
+        numpy.multiply(frames, 1 / self._scale, out=samples)
+
+        # The gain reduction in dB each frame needs, from its peak level.
+        magnitudes = self._magnitudes[:num_frames]
+        gain = self._gain[:num_frames]
+        numpy.absolute(samples, out=magnitudes)
+        numpy.max(magnitudes, axis=1, out=gain)
+        numpy.maximum(gain, _MIN_LEVEL, out=gain)
+        numpy.log10(gain, out=gain)
+        numpy.multiply(gain, 20, out=gain)
+        numpy.subtract(gain, self._threshold, out=gain)
+        numpy.multiply(gain, 1 / self._ratio - 1, out=gain)
+        numpy.minimum(gain, 0, out=gain)
+
+        lib.spc_gain_smooth(
+            ffi.cast('double *', ffi.from_buffer(gain)), num_frames,
+            lookahead, self._attack, self._release, self._state)
+        if num_frames:
+            self._gain_reduction = -float(gain.min())
+
+        numpy.add(gain, self._makeup, out=gain)
+        numpy.multiply(gain, 1 / 20, out=gain)
+        numpy.power(10, gain, out=gain)
+        result = self._result[:num_frames]
+        numpy.multiply(work[:num_frames], gain[:, None], out=result)
+        if self._ratio == float('inf'):
+            ceiling = 10 ** (self._threshold / 20)
+            numpy.clip(result, -ceiling, ceiling, out=result)
+        # Keep the last frames as the delay line for the next block.
+        work[:lookahead] = work[num_frames:num_frames + lookahead]
+
+        if self._integer:
+            numpy.multiply(result, self._scale, out=result)
+            numpy.rint(result, out=result)
+            numpy.clip(result, -self._scale, self._scale - 1, out=result)
+            numpy.copyto(frames, result, casting='unsafe')
+        else:
+            numpy.copyto(frames, result)
+        return frames
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        lookahead, channels = self._lookahead, self._channels
+        history = None
+        if self._capacity:
+            history = self._work[:lookahead].copy()
+        self._work = numpy.zeros(
+            (lookahead + num_frames, channels), dtype='float32')
+        if history is not None:
+            self._work[:lookahead] = history
+        self._magnitudes = numpy.empty(
+            (num_frames, channels), dtype='float32')
+        self._gain = numpy.empty(num_frames, dtype='float64')
+        self._result = numpy.empty((num_frames, channels), dtype='float32')
+        self._capacity = num_frames
@@ -0,0 +1,192 @@
+from __future__ import division, unicode_literals
+
+import collections
+import math
+
+import spotifyconnect
+from spotifyconnect import ffi, lib, utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'Equalizer',
+    'EqualizerBand',
+    'FilterType',
+]
+
+
+class FilterType(utils.IntEnum):
+
+    """The shape of an :class:`EqualizerBand`."""
+    pass
+
+
+FilterType.add('PEAKING', 0)
+FilterType.add('LOW_SHELF', 1)
+FilterType.add('HIGH_SHELF', 2)
+FilterType.add('LOW_PASS', 3)
+FilterType.add('HIGH_PASS', 4)
+
+
+class EqualizerBand(collections.namedtuple(
+        'EqualizerBand', ['filter_type', 'frequency', 'gain', 'q'])):
+
+    """A band of an :class:`Equalizer`.
+
+    ``filter_type`` is a :class:`FilterType`, ``frequency`` the center or
+    corner frequency in Hz and ``gain`` the boost or cut in dB, which is
+    ignored by the pass filters. ``q`` sets the bandwidth of peaking filters
+    and the steepness of the others, the default gives a Butterworth
+    response for the pass filters.
+    """
+
+    def __new__(cls, filter_type, frequency, gain=0.0, q=1 / math.sqrt(2)):
+        return super(EqualizerBand, cls).__new__(
+            cls, FilterType(filter_type), frequency, gain, q)
+
+    def coefficients(self, sample_rate):
+        """The ``[b0, b1, b2, a1, a2]`` biquad coefficients of the band at
+        ``sample_rate``, normalized so that ``a0`` is 1.
+
+        The filters are the ones from Robert Bristow-Johnson's Audio EQ
+        Cookbook.
+        """
+        amp = 10 ** (self.gain / 40)
+        w0 = 2 * math.pi * self.frequency / sample_rate
+        cos = math.cos(w0)
+        alpha = math.sin(w0) / (2 * self.q)
+        if self.filter_type == FilterType.PEAKING:
+            b = [1 + alpha * amp, -2 * cos, 1 - alpha * amp]
+            a = [1 + alpha / amp, -2 * cos, 1 - alpha / amp]
+        elif self.filter_type == FilterType.LOW_SHELF:
+            shelf = 2 * math.sqrt(amp) * alpha
+            b = [
+                amp * ((amp + 1) - (amp - 1) * cos + shelf),
+                2 * amp * ((amp - 1) - (amp + 1) * cos),
+                amp * ((amp + 1) - (amp - 1) * cos - shelf)]
+            a = [
+                (amp + 1) + (amp - 1) * cos + shelf,
+                -2 * ((amp - 1) + (amp + 1) * cos),
+                (amp + 1) + (amp - 1) * cos - shelf]
+        elif self.filter_type == FilterType.HIGH_SHELF:
+            shelf = 2 * math.sqrt(amp) * alpha
+            b = [
+                amp * ((amp + 1) + (amp - 1) * cos + shelf),
+                -2 * amp * ((amp - 1) + (amp + 1) * cos),
+                amp * ((amp + 1) + (amp - 1) * cos - shelf)]
+            a = [
+                (amp + 1) - (amp - 1) * cos + shelf,
+                2 * ((amp - 1) - (amp + 1) * cos),
+                (amp + 1) - (amp - 1) * cos - shelf]
+        elif self.filter_type == FilterType.LOW_PASS:
+            b = [(1 - cos) / 2, 1 - cos, (1 - cos) / 2]
+            a = [1 + alpha, -2 * cos, 1 - alpha]
+        else:
+            b = [(1 + cos) / 2, -(1 + cos), (1 + cos) / 2]
+            a = [1 + alpha, -2 * cos, 1 - alpha]
+        return [b[0] / a[0], b[1] / a[0], b[2] / a[0], a[1] / a[0],
+                a[2] / a[0]]
+
+
+class Equalizer(Stage):
+
+    """A :class:`Stage` with a parametric equalizer.
+
+    The audio is filtered in place by a cascade of one biquad filter per
+    :class:`EqualizerBand`. The filtering runs in C over whole blocks with
+    the GIL released, and the filter state is kept between blocks.
+
+    :attr:`bands` can be changed at any time, from any thread. The filter
+    coefficients are only computed when the bands or the sample rate change.
+    The filter state is cleared on seeks, on
+    :attr:`PlaybackNotify.AudioFlush` and when the track changes, so the
+    tail of the previous audio doesn't ring into the new audio.
+
+    Supports :attr:`~SampleType.S16NativeEndian` and
+    :attr:`~SampleType.Float32NativeEndian` audio.
+
+    :param bands: the bands of the equalizer
+    :type bands: list of :class:`EqualizerBand`
+    """
+
+    def __init__(self, bands=()):
+        self.bands = bands
+        self._sample_rate = None
+        self._channels = 0
+        self._sections = 0
+        self._sos = None
+        self._state = None
+        self._reset_requested = False
+
+    @property
+    def bands(self):
+        """The bands of the equalizer, as a tuple of
+        :class:`EqualizerBand`."""
+        return self._bands
+
+    @bands.setter
+    def bands(self, bands):
+        self._bands = tuple(bands)
+        # Picked up by the audio thread on the next block.
+        self._configured_bands = None
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type == spotifyconnect.SampleType.S16NativeEndian:
+            self._process = lib.spc_sos_process_s16
+            self._sample_ctype = 'int16_t *'
+        elif sample_type == spotifyconnect.SampleType.Float32NativeEndian:
+            self._process = lib.spc_sos_process_f32
+            self._sample_ctype = 'float *'
+        else:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        self._sample_rate = audio_format.sample_rate
+        self._channels = audio_format.channels
+        self._state = None
+        self._configure()
+        return audio_format
+
+    def process(self, audio_format, frames, out):
+        if self._configured_bands is not self._bands:
+            self._configure()
+        if self._reset_requested:
+            self._reset_requested = False
+            self.reset()
+        if self._sections:
+            self._process(
+                ffi.cast(self._sample_ctype, ffi.from_buffer(frames)),
+                len(frames), self._channels, self._sos, self._sections,
+                self._state)
+        return frames
+
+    def reset(self):
+        if self._sections:
+            self._state = ffi.new(
+                'double[]', 2 * self._sections * self._channels)
+
+    def _configure(self):
+        bands = self._bands
+        coefficients = []
+        for band in bands:
+            coefficients.extend(band.coefficients(self._sample_rate))
+        self._sos = ffi.new('double[]', coefficients)
+        if len(bands) != self._sections or self._state is None:
+            # Filters are only reset if the number of filters changes, so
+            # adjusting a band while playing doesn't click.
+            self._sections = len(bands)
+            self._state = None
+            self.reset()
+        self._configured_bands = bands
+
+    def _open(self):
+        spotifyconnect._session_instance.player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+
+    def _close(self):
+        spotifyconnect._session_instance.player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify == spotifyconnect.PlaybackNotify.TrackChanged:
+            self._reset_requested = True
@@ -0,0 +1,487 @@
+from __future__ import division, unicode_literals
+
+import errno
+import logging
+import socket
+import struct
+import threading
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.sink import Sink
+
+__all__ = [
+    'HTTPStreamSink',
+]
+
+logger = logging.getLogger(__name__)
+
+
+_clock = utils.monotonic
+
+# WAV format tag and bits per sample of the sample types that can be
+# streamed.
+_WAV_FORMATS = {
+    spotifyconnect.SampleType.S16NativeEndian: (1, 16),
+    spotifyconnect.SampleType.S24_3LE: (1, 24),
+    spotifyconnect.SampleType.S32NativeEndian: (1, 32),
+    spotifyconnect.SampleType.Float32NativeEndian: (3, 32),
+}
+
+# Paths clients can request, and whether they get a WAV header.
+_PATHS = {
+    '/': True,
+    '/stream.wav': True,
+    '/stream.pcm': False,
+}
+
+_MAX_REQUEST_SIZE = 8192
+_SEND_SIZE = 0x10000
+_WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+
+
+def _get_selectors():
+    try:
+        import selectors
+    except ImportError:
+        raise ImportError(
+            'This feature requires the selectors module, which is available '
+            'from Python 3.4')
+    return selectors
+
+
+def _wav_header(audio_format):
+    # The sizes are unknown for a stream, so they are set to the largest
+    # value, which players treat as "until the end of the stream".
+    format_tag, bits = _WAV_FORMATS[audio_format.sample_type]
+    block_align = audio_format.frame_size
+    return struct.pack(
+        '<4sI4s4sIHHIIHH4sI', b'RIFF', 0xFFFFFFFF, b'WAVE', b'fmt ', 16,
+        format_tag, audio_format.channels, audio_format.sample_rate,
+        audio_format.sample_rate * block_align, block_align, bits, b'data',
+        0xFFFFFFFF)
+
+
+class _Client(object):
+
+    # State of one connected client, only used by the server thread.
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.request = b''
+        self.header = None
+        self.wav = True
+        self.streaming = False
+        self.writing = False
+        self.generation = None
+        self.position = 0
+
+
+def _skip_to(client, position, frame_size):
+    # Moves the client forward to position by whole frames, as a partial
+    # send may have left it partway through a frame. It then skips the start
+    # of the frame at position instead, so its stream stays frame aligned.
+    skip = position - client.position
+    if skip > 0:
+        client.position += -(-skip // frame_size) * frame_size
+
+
+class HTTPStreamSink(Sink):
+
+    """Sink that streams the audio over HTTP to any number of clients.
+
+    Clients get WAV audio from ``/`` or ``/stream.wav``, and raw
+    native-endian PCM from ``/stream.pcm``. The response has no length and
+    lasts until the client disconnects or the audio format changes.
+
+    All clients are served from one ring buffer, which the audio is copied
+    into once, by a single thread using :mod:`selectors`. Each client only
+    keeps its position in the ring. New clients start ``buffer_ms`` behind
+    the newest audio, so their players can buffer right away. A client that
+    falls so far behind that its audio would be overwritten is skipped
+    forward, or disconnected if ``drop_slow_clients`` is set, and counted in
+    :attr:`skips` or :attr:`clients_dropped`. Slow clients never hold back
+    the others or libspotify.
+
+    On seeks and on :attr:`~PlaybackNotify.AudioFlush`, the audio not sent to
+    the clients yet is dropped, and the new audio is streamed right away
+    instead of waiting for the old audio to play out. Audio already sent is
+    up to the clients' players.
+
+    The sink takes audio at the speed it is played, staying ``buffer_ms``
+    ahead of real time, so it can be used on its own. It can also be a
+    :class:`TeeBranch` next to a local audio device. The server is started
+    by :meth:`on`, or when the sink is opened by another sink, and stopped
+    again when the sink is turned off.
+
+    Supports :attr:`~SampleType.S16NativeEndian`,
+    :attr:`~SampleType.S24_3LE`, :attr:`~SampleType.S32NativeEndian` and
+    :attr:`~SampleType.Float32NativeEndian` audio. Requires Python 3.4.
+
+    :param host: the address to listen on, all interfaces by default
+    :type host: string
+    :param port: the port to listen on, 0 for any free port
+    :type port: int
+    :param buffer_ms: how far the stream runs ahead of real time
+    :type buffer_ms: int
+    :param drop_slow_clients: whether to disconnect clients that fall behind
+        instead of skipping them forward
+    :type drop_slow_clients: bool
+    """
+
+    zero_copy = True
+
+    skips = 0
+    """The number of times a client was skipped forward."""
+
+    clients_dropped = 0
+    """The number of clients disconnected for falling behind."""
+
+    def __init__(
+            self, host='', port=8000, buffer_ms=1000,
+            drop_slow_clients=False):
+        self._selectors = _get_selectors()
+        self._host = host
+        self._port = port
+        self._buffer_ms = buffer_ms
+        self._drop_slow_clients = drop_slow_clients
+        self._audio_format = None
+        # (audio format, format generation, ring, buffer size, ring
+        # position), replaced as a whole by the audio thread after every
+        # write, so the server thread always sees a consistent stream.
+        self._stream = (None, 0, None, 0, 0)
+        self._frames_written = 0
+        self._clock_start = None
+        self._clock_frames = 0
+        # (number of flushes, format generation, ring position), replaced as
+        # a whole by the thread emitting the playback events, and applied by
+        # the audio and the server thread.
+        self._flush_request = (0, 0, 0)
+        self._flushes_written = 0
+        self._flushes_sent = 0
+        self._flush_position = (0, 0)
+        self._listener = None
+        self._thread = None
+        self._running = False
+        self._clients = []
+
+    @property
+    def address(self):
+        """The ``(host, port)`` the server listens on, or :class:`None` if
+        it isn't running."""
+        listener = self._listener
+        if listener is None:
+            return None
+        return listener.getsockname()[:2]
+
+    @property
+    def num_clients(self):
+        """The number of connected clients."""
+        return len(self._clients)
+
+    @property
+    def frames_buffered(self):
+        return max(0, self._frames_written - self._frames_played(_clock()))
+
+    def _frames_played(self, now):
+        if self._clock_start is None:
+            return self._frames_written
+        return self._clock_frames + int(
+            (now - self._clock_start) * self._audio_format.sample_rate)
+
+    def _open(self):
+        if self._running:
+            return
+        self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listener.bind((self._host, self._port))
+        self._listener.listen(16)
+        self._listener.setblocking(False)
+        self._wake_reader, self._wake_writer = socket.socketpair()
+        self._wake_reader.setblocking(False)
+        self._wake_writer.setblocking(False)
+        self._selector = self._selectors.DefaultSelector()
+        self._selector.register(self._listener, self._selectors.EVENT_READ)
+        self._selector.register(
+            self._wake_reader, self._selectors.EVENT_READ)
+        player = spotifyconnect._session_instance.player
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='SpotifyConnectHTTPStreamSink')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _close(self):
+        if not self._running:
+            return
+        player = spotifyconnect._session_instance.player
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._running = False
+        self._wake()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+        self._thread = None
+        for client in list(self._clients):
+            self._disconnect(client)
+        self._selector.close()
+        self._listener.close()
+        self._listener = None
+        self._wake_reader.close()
+        self._wake_writer.close()
+        self._clock_start = None
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify == spotifyconnect.PlaybackNotify.AudioFlush:
+            self._request_flush()
+
+    def _on_playback_seek(self, millis, session):
+        self._request_flush()
+
+    def _request_flush(self):
+        audio_format, generation, ring, buffer_size, write_pos = self._stream
+        flushes = self._flush_request[0] + 1
+        self._flush_request = (flushes, generation, write_pos)
+        self._wake()
+
+    def _write(self, audio_format, frames, num_frames):
+        if audio_format is not self._audio_format:
+            self._set_audio_format(audio_format)
+        flushes = self._flush_request[0]
+        if flushes != self._flushes_written:
+            # Take the new audio right away, the old audio won't be played.
+            self._flushes_written = flushes
+            self._clock_start = None
+
+        # Only take audio as fast as it plays.
+        now = _clock()
+        played = self._frames_played(now)
+        if played >= self._frames_written:
+            # Out of audio, e.g. after a pause, so restart the clock.
+            self._clock_start = now
+            self._clock_frames = played = self._frames_written
+        room = self._buffer_frames - (self._frames_written - played)
+        num_frames = max(0, min(num_frames, room))
+        if not num_frames:
+            return 0
+
+        audio_format, generation, ring, buffer_size, write_pos = self._stream
+        data = utils.byte_view(frames)[:num_frames * audio_format.frame_size]
+        start = write_pos % len(ring)
+        first = min(len(data), len(ring) - start)
+        ring[start:start + first] = data[:first]
+        if len(data) > first:
+            ring[:len(data) - first] = data[first:]
+        self._stream = (
+            audio_format, generation, ring, buffer_size,
+            write_pos + len(data))
+        self._frames_written += num_frames
+        self._wake()
+        return num_frames
+
+    def _set_audio_format(self, audio_format):
+        if audio_format.sample_type not in _WAV_FORMATS:
+            raise ValueError(
+                'Unsupported sample type: %d' % audio_format.sample_type)
+        self._buffer_frames = max(
+            1, audio_format.sample_rate * self._buffer_ms // 1000)
+        buffer_size = self._buffer_frames * audio_format.frame_size
+        # Twice the buffer, so clients can fall behind by a whole buffer
+        # before they must be skipped.
+        ring = memoryview(bytearray(2 * buffer_size))
+        self._frames_written = 0
+        self._clock_start = None
+        self._audio_format = audio_format
+        # Clients of the old format are disconnected by the server thread.
+        generation = self._stream[1] + 1
+        self._stream = (audio_format, generation, ring, buffer_size, 0)
+
+    def _wake(self):
+        try:
+            self._wake_writer.send(b'\0')
+        except (socket.error, AttributeError):
+            # The wake-up socket is full, so the server will wake anyway, or
+            # the server isn't running.
+            pass
+
+    def _run(self):
+        selectors = self._selectors
+        while self._running:
+            ready = self._selector.select(timeout=1.0)
+            self._drop_flushed()
+            for key, events in ready:
+                if key.fileobj is self._listener:
+                    self._accept()
+                elif key.fileobj is self._wake_reader:
+                    try:
+                        while self._wake_reader.recv(4096):
+                            pass
+                    except socket.error:
+                        pass
+                else:
+                    client = key.data
+                    if events & selectors.EVENT_READ:
+                        self._read(client)
+                    if events & selectors.EVENT_WRITE and client.sock:
+                        self._send(client)
+            for client in list(self._clients):
+                self._send(client)
+
+    def _drop_flushed(self):
+        # Skips the clients past the audio written before the last flush,
+        # unless the audio format has changed since. New clients start after
+        # it too.
+        flushes, generation, position = self._flush_request
+        if flushes == self._flushes_sent:
+            return
+        self._flushes_sent = flushes
+        self._flush_position = (generation, position)
+        audio_format, current_generation = self._stream[:2]
+        if current_generation != generation:
+            # The clients of that format are disconnected anyway.
+            return
+        for client in self._clients:
+            if client.generation == generation:
+                _skip_to(client, position, audio_format.frame_size)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, address = self._listener.accept()
+            except socket.error:
+                return
+            sock.setblocking(False)
+            client = _Client(sock, address)
+            self._clients.append(client)
+            self._selector.register(
+                sock, self._selectors.EVENT_READ, client)
+
+    def _read(self, client):
+        try:
+            data = client.sock.recv(4096)
+        except socket.error:
+            return
+        if not data:
+            self._disconnect(client)
+            return
+        if client.header is not None:
+            # Anything sent after the request is ignored.
+            return
+        client.request += data
+        if b'\r\n\r\n' not in client.request:
+            if len(client.request) > _MAX_REQUEST_SIZE:
+                self._disconnect(client)
+            return
+        request_line = client.request.split(b'\r\n', 1)[0].decode(
+            'latin-1').split()
+        if (len(request_line) != 3 or request_line[0] != 'GET' or
+                request_line[1].split('?')[0] not in _PATHS):
+            client.header = b'HTTP/1.0 404 Not Found\r\n\r\n'
+            client.streaming = False
+        else:
+            client.wav = _PATHS[request_line[1].split('?')[0]]
+            client.streaming = True
+        client.request = b''
+
+    def _start_stream(self, client, stream):
+        audio_format, generation, ring, buffer_size, write_pos = stream
+        if client.wav:
+            content_type = 'audio/wav'
+        else:
+            content_type = 'application/octet-stream'
+        header = (
+            'HTTP/1.0 200 OK\r\n'
+            'Content-Type: %s\r\n'
+            'Cache-Control: no-cache\r\n'
+            'Connection: close\r\n'
+            '\r\n' % content_type).encode('latin-1')
+        if client.wav:
+            header += _wav_header(audio_format)
+        client.header = header
+        client.generation = generation
+        client.position = write_pos - min(write_pos, buffer_size)
+        flush_generation, position = self._flush_position
+        if flush_generation == generation:
+            _skip_to(client, position, audio_format.frame_size)
+
+    def _send(self, client):
+        stream = self._stream
+        if client.header is None:
+            if not client.streaming or stream[0] is None:
+                return
+            self._start_stream(client, stream)
+        if client.streaming and client.generation != stream[1]:
+            self._disconnect(client)
+            return
+        try:
+            while client.header:
+                sent = client.sock.send(client.header)
+                client.header = client.header[sent:]
+            if not client.streaming:
+                self._disconnect(client)
+                return
+            caught_up = self._send_audio(client, stream)
+        except socket.error as exc:
+            if exc.args and exc.args[0] in _WOULD_BLOCK:
+                caught_up = False
+            else:
+                logger.debug('Client %s failed: %s', client.address, exc)
+                self._disconnect(client)
+                return
+        # Only wait for the socket to be writable while there is audio the
+        # client hasn't taken yet.
+        self._set_writing(client, not caught_up)
+
+    def _send_audio(self, client, stream):
+        audio_format, generation, ring, buffer_size, write_pos = stream
+        ring_size = len(ring)
+        if write_pos - client.position > ring_size - buffer_size:
+            # The client is so far behind that the audio it needs could be
+            # overwritten by the next deliveries.
+            if self._drop_slow_clients:
+                self.clients_dropped += 1
+                self._disconnect(client)
+                return True
+            self.skips += 1
+            frame_size = audio_format.frame_size
+            _skip_to(
+                client, write_pos - buffer_size // 2 // frame_size *
+                frame_size, frame_size)
+        while client.position < write_pos:
+            start = client.position % ring_size
+            size = min(write_pos - client.position, ring_size - start,
+                       _SEND_SIZE)
+            sent = client.sock.send(ring[start:start + size])
+            client.position += sent
+            if sent < size:
+                return False
+        return True
+
+    def _set_writing(self, client, writing):
+        if client.sock is None or client.writing == writing:
+            return
+        events = self._selectors.EVENT_READ
+        if writing:
+            events |= self._selectors.EVENT_WRITE
+        self._selector.modify(client.sock, events, client)
+        client.writing = writing
+
+    def _disconnect(self, client):
+        if client.sock is None:
+            return
+        try:
+            self._selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        client.sock.close()
+        client.sock = None
+        self._clients.remove(client)
@@ -0,0 +1,85 @@
+from __future__ import division, unicode_literals
+
+from spotifyconnect import utils
+
+__all__ = [
+    'JitterBuffer',
+]
+
+
+_clock = utils.monotonic
+
+
+class JitterBuffer(object):
+
+    """How much audio a :class:`RingBufferSink` buffers before it starts
+    playing.
+
+    Pass an instance as the ``jitter_buffer`` argument of a
+    :class:`RingBufferSink`. The sink then holds back its output until
+    :attr:`target_ms` milliseconds of audio are buffered: when audio is first
+    delivered, after every underrun, on :attr:`~PlaybackNotify.Play` and on
+    seeks.
+
+    The target starts out at ``target_ms``. Every underrun during playback
+    raises it by ``step_ms``, up to ``max_target_ms``, and it decays back
+    towards ``target_ms`` by ``decay_rate`` milliseconds per second without
+    underruns. Devices that only stutter at startup thus settle on a short
+    delay, while devices with slow storage or a busy CPU get the buffer they
+    need. Set ``step_ms`` to 0 for a fixed prebuffer.
+
+    :param target_ms: the initial and lowest target in milliseconds
+    :type target_ms: float
+    :param max_target_ms: the highest target in milliseconds
+    :type max_target_ms: float
+    :param step_ms: how much each underrun raises the target in milliseconds
+    :type step_ms: float
+    :param decay_rate: how fast the target decays in milliseconds per second
+    :type decay_rate: float
+    """
+
+    def __init__(
+            self, target_ms=100.0, max_target_ms=2000.0, step_ms=100.0,
+            decay_rate=2.0):
+        self._min_target_ms = target_ms
+        self._max_target_ms = max(target_ms, max_target_ms)
+        self._step_ms = step_ms
+        self._decay_rate = decay_rate
+        # (target_ms, time), replaced as a whole so readers on other threads
+        # always see a consistent state.
+        self._state = (target_ms, _clock())
+
+    underruns = 0
+    """The number of underruns that raised the target."""
+
+    @property
+    def min_target_ms(self):
+        """The target the buffer decays back to in milliseconds."""
+        return self._min_target_ms
+
+    @property
+    def max_target_ms(self):
+        """The highest target in milliseconds."""
+        return self._max_target_ms
+
+    @property
+    def target_ms(self):
+        """The current target in milliseconds."""
+        target_ms, at = self._state
+        target_ms -= (_clock() - at) * self._decay_rate
+        return max(self._min_target_ms, target_ms)
+
+    def target_frames(self, sample_rate):
+        """The current target in frames at ``sample_rate``."""
+        return int(self.target_ms * sample_rate / 1000)
+
+    def reset(self):
+        """Return the target to ``target_ms``."""
+        self._state = (self._min_target_ms, _clock())
+
+    def _on_underrun(self):
+        # Called from the sink's consumer thread when it ran out of audio
+        # while playing.
+        target_ms = min(self.target_ms + self._step_ms, self._max_target_ms)
+        self._state = (target_ms, _clock())
+        self.underruns += 1
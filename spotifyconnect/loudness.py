@@ -0,0 +1,505 @@
+from __future__ import division, unicode_literals
+
+import collections
+import json
+import logging
+import math
+import numbers
+import os
+import threading
+
+import spotifyconnect
+from spotifyconnect import ffi, lib, utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'LoudnessCache',
+    'LoudnessMeter',
+    'LoudnessNormalizer',
+]
+
+logger = logging.getLogger(__name__)
+
+
+# Sample types the stage supports.
+_SAMPLE_TYPES = (
+    spotifyconnect.SampleType.S16NativeEndian,
+    spotifyconnect.SampleType.Float32NativeEndian,
+)
+
+# The number of finished tracks the normalizer caches the loudness of
+# before saving the cache.
+_SAVE_INTERVAL = 10
+
+# Gating blocks are 400 ms, made of four 100 ms blocks so they overlap by
+# 75%. Short-term loudness is measured over 30 blocks, i.e. 3 s.
+_MOMENTARY_BLOCKS = 4
+_SHORT_TERM_BLOCKS = 30
+
+# Gating blocks are counted in a histogram of 0.1 LU bins from the absolute
+# gate up to +5 LUFS, so the integrated loudness of any length of audio is
+# measured in constant memory.
+_ABSOLUTE_GATE = -70.0
+_RELATIVE_GATE = -10.0
+_BINS_PER_LU = 10
+_BINS = 75 * _BINS_PER_LU
+
+
+def _k_weighting(sample_rate):
+    # The two biquads of the ITU-R BS.1770 K-weighting filter, a high shelf
+    # modelling the head and a high pass, designed for ``sample_rate``. At
+    # 48 kHz these are exactly the coefficients in the standard.
+    k = math.tan(math.pi * 1681.974450955533 / sample_rate)
+    q = 0.7071752369554196
+    vh = 10 ** (3.999843853973347 / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = [
+        (vh + vb * k / q + k * k) / a0,
+        2 * (k * k - vh) / a0,
+        (vh - vb * k / q + k * k) / a0,
+        2 * (k * k - 1) / a0,
+        (1 - k / q + k * k) / a0,
+    ]
+    k = math.tan(math.pi * 38.13547087602444 / sample_rate)
+    q = 0.5003270373238773
+    a0 = 1 + k / q + k * k
+    high_pass = [
+        1.0, -2.0, 1.0, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0]
+    return shelf + high_pass
+
+
+def _loudness(mean_square):
+    if mean_square <= 0:
+        return float('-inf')
+    return -0.691 + 10 * math.log10(mean_square)
+
+
+class LoudnessMeter(Stage):
+
+    """A :class:`Stage` that measures the loudness of the audio.
+
+    Loudness is measured as specified by EBU R 128 and ITU-R BS.1770, in
+    LUFS, with all channels weighted equally. The audio is passed on
+    unchanged.
+
+    The audio is K-weighted by the same C biquad kernel as
+    :class:`Equalizer`, and its power is summed over whole blocks with
+    NumPy. The integrated loudness is gated over a histogram, so the meter
+    uses constant memory however long it runs.
+
+    Supports :attr:`~SampleType.S16NativeEndian` and
+    :attr:`~SampleType.Float32NativeEndian` audio. Requires NumPy.
+    """
+
+    def __init__(self):
+        self._numpy = utils.get_numpy()
+        self._sample_rate = None
+        self._channels = 0
+        self._capacity = 0
+        self._state = None
+        self._counts = self._numpy.zeros(_BINS, dtype='int64')
+        self._energies = self._numpy.zeros(_BINS, dtype='float64')
+        self._blocks = collections.deque(maxlen=_SHORT_TERM_BLOCKS)
+        self._clear()
+
+    @property
+    def momentary(self):
+        """The loudness of the last 400 ms in LUFS, or :class:`None` if less
+        audio has been measured."""
+        return self._momentary
+
+    @property
+    def short_term(self):
+        """The loudness of the last 3 s in LUFS, or :class:`None` if less
+        audio has been measured."""
+        return self._short_term
+
+    @property
+    def integrated(self):
+        """The gated loudness of all the audio measured since the last
+        :meth:`reset` in LUFS, or :class:`None` if nothing above the absolute
+        gate has been measured."""
+        counts, energies = self._counts, self._energies
+        count = counts.sum()
+        if not count:
+            return None
+        relative = _loudness(energies.sum() / count) + _RELATIVE_GATE
+        start = max(0, int((relative - _ABSOLUTE_GATE) * _BINS_PER_LU))
+        return _loudness(energies[start:].sum() / counts[start:].sum())
+
+    @property
+    def duration(self):
+        """The number of seconds of audio measured since the last
+        :meth:`reset`."""
+        if not self._sample_rate:
+            return 0.0
+        return self._num_frames / self._sample_rate
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type not in _SAMPLE_TYPES:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        if (audio_format.sample_rate != self._sample_rate or
+                audio_format.channels != self._channels):
+            self._sample_rate = audio_format.sample_rate
+            self._channels = audio_format.channels
+            self._sos = ffi.new(
+                'double[]', _k_weighting(audio_format.sample_rate))
+            self.reset()
+        self._scale = audio_format.full_scale
+        self._capacity = 0
+        return audio_format
+
+    def reset(self):
+        """Start a new measurement."""
+        self._state = ffi.new('double[]', 4 * max(self._channels, 1))
+        self._counts[:] = 0
+        self._energies[:] = 0
+        self._clear()
+
+    def process(self, audio_format, frames, out):
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        weighted = self._weighted[:num_frames]
+        numpy.multiply(frames, 1 / self._scale, out=weighted)
+        lib.spc_sos_process_f32(
+            ffi.cast('float *', ffi.from_buffer(weighted)), num_frames,
+            self._channels, self._sos, 2, self._state)
+        numpy.square(weighted, out=weighted)
+        power = self._power[:num_frames]
+        numpy.sum(weighted, axis=1, out=power)
+
+        block_frames = self._sample_rate // 10
+        offset = 0
+        while offset < num_frames:
+            count = min(num_frames - offset, block_frames - self._filled)
+            self._energy += float(power[offset:offset + count].sum())
+            self._filled += count
+            offset += count
+            if self._filled == block_frames:
+                self._add_block(self._energy / block_frames)
+                self._energy = 0.0
+                self._filled = 0
+        self._num_frames += num_frames
+        return frames
+
+    def _clear(self):
+        self._blocks.clear()
+        self._energy = 0.0
+        self._filled = 0
+        self._num_frames = 0
+        self._momentary = None
+        self._short_term = None
+
+    def _add_block(self, mean_square):
+        blocks = self._blocks
+        blocks.append(mean_square)
+        if len(blocks) < _MOMENTARY_BLOCKS:
+            return
+        gating_block = sum(
+            blocks[i] for i in range(-_MOMENTARY_BLOCKS, 0)) / (
+            _MOMENTARY_BLOCKS)
+        loudness = _loudness(gating_block)
+        self._momentary = loudness
+        if len(blocks) == _SHORT_TERM_BLOCKS:
+            self._short_term = _loudness(sum(blocks) / _SHORT_TERM_BLOCKS)
+        if loudness >= _ABSOLUTE_GATE:
+            index = min(
+                _BINS - 1, int((loudness - _ABSOLUTE_GATE) * _BINS_PER_LU))
+            self._counts[index] += 1
+            self._energies[index] += gating_block
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        self._weighted = numpy.empty(
+            (num_frames, self._channels), dtype='float32')
+        self._power = numpy.empty(num_frames, dtype='float64')
+        self._capacity = num_frames
+
+
+class LoudnessCache(object):
+
+    """A persistent cache of the integrated loudness of tracks.
+
+    Loudness values are stored by track URI in the JSON file ``filename``,
+    which is read when the cache is created and written by :meth:`save`.
+    A file that can't be read or doesn't hold a cache is ignored. When the
+    cache holds more than ``max_entries`` tracks, the least recently used
+    ones are dropped. The cache can be used from any thread.
+
+    :param filename: the file to keep the cache in
+    :type filename: string
+    :param max_entries: the largest number of tracks kept
+    :type max_entries: int
+    """
+
+    def __init__(self, filename, max_entries=10000):
+        self._filename = filename
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._changed = False
+        self._lock = threading.Lock()
+        self._load()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, track_uri):
+        return track_uri in self._entries
+
+    def get(self, track_uri):
+        """The loudness of ``track_uri`` in LUFS, or :class:`None` if it
+        isn't known."""
+        with self._lock:
+            loudness = self._entries.pop(track_uri, None)
+            if loudness is not None:
+                self._entries[track_uri] = loudness
+            return loudness
+
+    def put(self, track_uri, loudness):
+        """Store the loudness of ``track_uri`` in LUFS."""
+        with self._lock:
+            if self._entries.pop(track_uri, None) != loudness:
+                self._changed = True
+            self._entries[track_uri] = loudness
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        """Write the cache to its file, if any loudness has changed since it
+        was last read or written.
+
+        The file is replaced atomically, so it is never left half written.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            entries = list(self._entries.items())
+            self._changed = False
+        try:
+            temporary = self._filename + '.tmp'
+            with open(temporary, 'w') as fh:
+                json.dump(entries, fh)
+            getattr(os, 'replace', os.rename)(temporary, self._filename)
+        except Exception:
+            self._changed = True
+            raise
+
+    def _load(self):
+        if not os.path.exists(self._filename):
+            return
+        try:
+            with open(self._filename) as fh:
+                entries = json.load(fh)
+        except (IOError, ValueError) as exc:
+            logger.warning(
+                'Ignoring unreadable loudness cache %s: %s',
+                self._filename, exc)
+            return
+        if not _valid_entries(entries):
+            logger.warning(
+                'Ignoring loudness cache %s: Not a list of '
+                '[track URI, loudness] pairs', self._filename)
+            return
+        for track_uri, loudness in entries[-self._max_entries:]:
+            self._entries[track_uri] = loudness
+
+
+def _valid_entries(entries):
+    if not isinstance(entries, list):
+        return False
+    for entry in entries:
+        if not isinstance(entry, list) or len(entry) != 2:
+            return False
+        track_uri, loudness = entry
+        if (not isinstance(track_uri, utils.string_types) or
+                not isinstance(loudness, numbers.Real) or
+                isinstance(loudness, bool)):
+            return False
+    return True
+
+
+class LoudnessNormalizer(Stage):
+
+    """A :class:`Stage` that plays all tracks at the same loudness.
+
+    The loudness of the audio is measured with a :class:`LoudnessMeter`, and
+    a gain is applied to bring it to ``target`` LUFS, limited to
+    ``max_gain`` dB of boost or cut.
+
+    When the track changes, the integrated loudness of the previous track is
+    stored in ``cache``, a :class:`LoudnessCache`, if at least
+    ``min_duration`` seconds of it were played. The cache is saved every few
+    tracks and when the normalizer is turned off. If the new track is in the
+    cache, its gain is applied from the first block of audio. Otherwise the
+    gain starts from the previous track's and follows the loudness measured
+    so far, at most ``rate`` dB per second.
+
+    Gain changes are ramped over a block to avoid clicks. The normalizer
+    doesn't limit peaks, so boosted audio should be passed through a
+    :meth:`Compressor.limiter`.
+
+    Supports :attr:`~SampleType.S16NativeEndian` and
+    :attr:`~SampleType.Float32NativeEndian` audio. Requires NumPy.
+
+    :param cache: where to keep the loudness of played tracks
+    :type cache: :class:`LoudnessCache` or :class:`None`
+    :param target: the loudness to normalize to in LUFS
+    :type target: float
+    :param max_gain: the largest boost or cut in dB
+    :type max_gain: float
+    :param rate: how fast the gain follows the loudness of unknown tracks
+    :type rate: float
+    :param min_duration: seconds of a track needed to cache its loudness
+    :type min_duration: float
+    """
+
+    def __init__(
+            self, cache=None, target=-14.0, max_gain=12.0, rate=1.0,
+            min_duration=10.0):
+        self._numpy = utils.get_numpy()
+        self._cache = cache
+        self._target = target
+        self._max_gain = max_gain
+        self._rate = rate
+        self._min_duration = min_duration
+        self._meter = LoudnessMeter()
+        # The track being measured, only touched from the audio thread, and
+        # the URI and cached loudness of the next track.
+        self._track_uri = None
+        self._next_track = (None, None)
+        # The URI and loudness of finished tracks, handed from the audio
+        # thread to the thread that stores them in the cache.
+        self._finished = collections.deque()
+        self._unsaved = 0
+        self._known = False
+        self._gain = 0.0
+        self._applied = 0.0
+        self._capacity = 0
+        self._reset_requested = False
+
+    @property
+    def meter(self):
+        """The :class:`LoudnessMeter` measuring the current track."""
+        return self._meter
+
+    @property
+    def gain(self):
+        """The gain in dB currently applied."""
+        return self._applied
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type not in _SAMPLE_TYPES:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        self._meter.negotiate(audio_format)
+        self._integer = (
+            sample_type != spotifyconnect.SampleType.Float32NativeEndian)
+        self._scale = audio_format.full_scale
+        self._channels = audio_format.channels
+        self._capacity = 0
+        return audio_format
+
+    def process(self, audio_format, frames, out):
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        if self._reset_requested:
+            # A new track started. The meter still holds the finished
+            # track, so its loudness is taken before the meter is reset.
+            self._reset_requested = False
+            meter = self._meter
+            loudness = meter.integrated
+            if (self._cache is not None and self._track_uri and
+                    loudness is not None and
+                    meter.duration >= self._min_duration):
+                self._finished.append((self._track_uri, loudness))
+            self._track_uri, loudness = self._next_track
+            meter.reset()
+            self._known = loudness is not None
+            if self._known:
+                self._gain = self._gain_for(loudness)
+        self._meter.process(audio_format, frames, None)
+        if not self._known:
+            loudness = self._meter.integrated
+            if loudness is not None:
+                step = self._rate * num_frames / audio_format.sample_rate
+                self._gain += max(
+                    -step, min(step, self._gain_for(loudness) - self._gain))
+
+        start, end = self._applied, self._gain
+        self._applied = end
+        if start == end == 0:
+            return frames
+        start, end = 10 ** (start / 20), 10 ** (end / 20)
+        if start == end and not self._integer:
+            numpy.multiply(frames, numpy.float32(end), out=frames)
+            return frames
+        gains = self._gains[:num_frames]
+        numpy.multiply(
+            self._steps[:num_frames], (end - start) / num_frames, out=gains)
+        numpy.add(gains, start, out=gains)
+        if not self._integer:
+            numpy.multiply(frames, gains[:, None], out=frames)
+            return frames
+        scaled = self._scaled[:num_frames]
+        numpy.multiply(frames, gains[:, None], out=scaled)
+        numpy.rint(scaled, out=scaled)
+        numpy.clip(scaled, -self._scale, self._scale - 1, out=scaled)
+        numpy.copyto(frames, scaled, casting='unsafe')
+        return frames
+
+    def _gain_for(self, loudness):
+        return max(
+            -self._max_gain, min(self._max_gain, self._target - loudness))
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        self._steps = numpy.arange(1, num_frames + 1, dtype='float32')
+        self._gains = numpy.empty(num_frames, dtype='float32')
+        self._scaled = numpy.empty(
+            (num_frames, self._channels), dtype='float32')
+        self._capacity = num_frames
+
+    def _open(self):
+        spotifyconnect._session_instance.player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+
+    def _close(self):
+        spotifyconnect._session_instance.player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        self._store_finished(save=True)
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify != spotifyconnect.PlaybackNotify.TrackChanged:
+            return
+        self._store_finished()
+        try:
+            track_uri = session.player.current_track.track_uri
+        except spotifyconnect.Error:
+            track_uri = None
+        loudness = None
+        if self._cache is not None and track_uri:
+            loudness = self._cache.get(track_uri)
+        self._next_track = (track_uri, loudness)
+        # The meter and gain are only touched from the audio thread.
+        self._reset_requested = True
+
+    def _store_finished(self, save=False):
+        # Put the loudness of finished tracks in the cache, and save it
+        # every _SAVE_INTERVAL tracks or when asked to.
+        cache, finished = self._cache, self._finished
+        if cache is None:
+            return
+        while finished:
+            cache.put(*finished.popleft())
+            self._unsaved += 1
+        if self._unsaved >= _SAVE_INTERVAL or (save and self._unsaved):
+            self._unsaved = 0
+            cache.save()
@@ -0,0 +1,125 @@
+from __future__ import division, unicode_literals
+
+import collections
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'LevelMeter',
+    'Levels',
+]
+
+
+# Sample types the stage supports.
+_SAMPLE_TYPES = (
+    spotifyconnect.SampleType.S16NativeEndian,
+    spotifyconnect.SampleType.S24NativeEndian,
+    spotifyconnect.SampleType.S32NativeEndian,
+    spotifyconnect.SampleType.Float32NativeEndian,
+)
+
+
+class Levels(collections.namedtuple('Levels', ['peak', 'rms'])):
+
+    """The levels of the audio since the last :class:`Levels`.
+
+    ``peak`` and ``rms`` are lists with the peak and RMS level of each
+    channel, where 1.0 is full scale.
+    """
+
+
+class LevelMeter(Stage):
+
+    """A :class:`Stage` that measures the peak and RMS level of the audio.
+
+    ``rate`` times per second of audio, the levels of each channel are
+    emitted as a :class:`Levels` with the
+    :attr:`PlayerEvent.PLAYBACK_LEVELS` event, independent of the size of
+    the blocks libspotify delivers. The levels are computed over whole
+    blocks with NumPy, and nothing is computed while the event has no
+    listeners. The audio is passed on unchanged, without being copied.
+
+    Supports all sample types except :attr:`~SampleType.S24_3LE`. Requires
+    NumPy.
+
+    :param rate: how many times per second the levels are emitted
+    :type rate: float
+    """
+
+    reads_only = True
+
+    def __init__(self, rate=30):
+        self._numpy = utils.get_numpy()
+        self._rate = rate
+        self._capacity = 0
+        self._count = 0
+
+    @property
+    def rate(self):
+        """How many times per second the levels are emitted."""
+        return self._rate
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type not in _SAMPLE_TYPES:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        numpy = self._numpy
+        channels = audio_format.channels
+        self._scale = audio_format.full_scale
+        self._interval = max(1, int(audio_format.sample_rate / self._rate))
+        self._peak = numpy.zeros(channels, dtype='float32')
+        self._sum = numpy.zeros(channels, dtype='float64')
+        self._segment_peak = numpy.empty(channels, dtype='float32')
+        self._segment_sum = numpy.empty(channels, dtype='float64')
+        self._channels = channels
+        self._capacity = 0
+        self.reset()
+        return audio_format
+
+    def reset(self):
+        if self._count:
+            self._peak[:] = 0
+            self._sum[:] = 0
+            self._count = 0
+
+    def process(self, audio_format, frames, out):
+        session = spotifyconnect._session_instance
+        if not session.player.num_listeners(
+                spotifyconnect.PlayerEvent.PLAYBACK_LEVELS):
+            self.reset()
+            return frames
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        magnitudes = self._magnitudes[:num_frames]
+        numpy.multiply(frames, 1 / self._scale, out=magnitudes)
+        numpy.absolute(magnitudes, out=magnitudes)
+
+        offset = 0
+        while offset < num_frames:
+            count = min(num_frames - offset, self._interval - self._count)
+            segment = magnitudes[offset:offset + count]
+            numpy.max(segment, axis=0, out=self._segment_peak)
+            numpy.maximum(self._peak, self._segment_peak, out=self._peak)
+            numpy.square(segment, out=segment)
+            numpy.sum(segment, axis=0, out=self._segment_sum)
+            numpy.add(self._sum, self._segment_sum, out=self._sum)
+            self._count += count
+            offset += count
+            if self._count == self._interval:
+                levels = Levels(
+                    self._peak.tolist(),
+                    numpy.sqrt(self._sum / self._count).tolist())
+                self.reset()
+                session.player.emit(
+                    spotifyconnect.PlayerEvent.PLAYBACK_LEVELS,
+                    levels, session)
+        return frames
+
+    def _allocate(self, num_frames):
+        self._magnitudes = self._numpy.empty(
+            (num_frames, self._channels), dtype='float32')
+        self._capacity = num_frames
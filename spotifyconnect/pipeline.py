@@ -0,0 +1,346 @@
+from __future__ import division, unicode_literals
+
+import collections
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.sink import Sink
+
+__all__ = [
+    'Pipeline',
+    'Stage',
+    'StageTiming',
+]
+
+
+_clock = utils.perf_counter
+
+
+class StageTiming(collections.namedtuple(
+        'StageTiming', ['stage', 'calls', 'frames', 'seconds'])):
+
+    """Time spent in one :class:`Stage` of a :class:`Pipeline`.
+
+    ``calls`` is the number of times the stage processed a block of audio,
+    ``frames`` the total number of input frames it processed and ``seconds``
+    the total time it took.
+    """
+
+
+class Stage(object):
+
+    """Base class for audio processing stages of a :class:`Pipeline`.
+
+    Stages work on ``(num_frames, channels)`` NumPy arrays. Before any audio
+    is processed, and whenever the input format changes, :meth:`negotiate` is
+    called with the input format and must return the output format. The
+    pipeline then allocates all the buffers needed, so a stage must not
+    allocate audio buffers in :meth:`process`.
+
+    A stage that changes the audio in place sets :attr:`in_place`, otherwise
+    it writes its output to a scratch buffer provided by the pipeline. A stage
+    that only analyses the audio sets :attr:`reads_only`, so the audio is
+    passed through it without being copied at all.
+    """
+
+    in_place = True
+    """Whether :meth:`process` changes the audio in place.
+
+    If :class:`True`, ``frames`` is always writable and ``out`` is
+    :class:`None`. If :class:`False`, ``frames`` may be read-only and the
+    output must be written to ``out``.
+    """
+
+    reads_only = False
+    """Whether :meth:`process` only reads the audio.
+
+    If :class:`True`, ``frames`` may be read-only, ``out`` is :class:`None`
+    and :meth:`process` must return ``frames`` unchanged. This takes
+    precedence over :attr:`in_place`.
+    """
+
+    @property
+    def latency(self):
+        """The number of frames the stage delays the audio by."""
+        return 0
+
+    def negotiate(self, audio_format):
+        """Prepare for audio of the :class:`SampleFormat` ``audio_format``.
+
+        Returns the :class:`SampleFormat` of the output. Raises
+        :exc:`ValueError` if the stage can't handle ``audio_format``. The
+        default is to pass the audio format on unchanged.
+        """
+        return audio_format
+
+    def max_output_frames(self, num_frames):
+        """The largest number of frames output for ``num_frames`` input
+        frames, used to size the buffers for stages that are not in place."""
+        return num_frames
+
+    def process(self, audio_format, frames, out):
+        """Process a block of ``frames`` of the negotiated ``audio_format``.
+
+        Returns ``frames`` if the stage works in place, or the leading part of
+        ``out`` that the output was written to.
+        """
+        raise NotImplementedError
+
+    def reset(self):
+        """Forget any state kept from earlier audio, e.g. filter history."""
+        pass
+
+    def _open(self):
+        # Called when the pipeline the stage is part of is turned on.
+        pass
+
+    def _close(self):
+        # Called when the pipeline the stage is part of is turned off.
+        pass
+
+
+class Pipeline(Sink):
+
+    """Sink that passes audio through a list of :class:`Stage` objects.
+
+    The processed audio is delivered to ``sink``, or to
+    :meth:`_write_output` if it is overridden. ``sink`` must not be turned on
+    itself; it is opened and closed together with the pipeline.
+
+    Stages are negotiated once for each input format. All buffers are
+    allocated then, and audio is passed between stages through two scratch
+    buffers that are used alternately. Audio is only copied when a stage
+    needs to work in place on audio that isn't writable yet, and never for
+    stages that only read it, so steady-state processing allocates no audio
+    buffers. Deliveries larger than ``max_frames`` are processed in blocks of
+    ``max_frames``.
+
+    Audio the downstream sink doesn't accept is kept and passed on before
+    any new audio is accepted. On seeks and on
+    :attr:`PlaybackNotify.AudioFlush` that audio is dropped and all stages
+    are reset before the next audio is processed.
+
+    Requires NumPy.
+
+    :param stages: the stages to process the audio with, in order
+    :type stages: list of :class:`Stage`
+    :param sink: the sink to deliver the processed audio to
+    :type sink: :class:`Sink` or :class:`None`
+    :param max_frames: the largest block of frames processed at a time
+    :type max_frames: int
+    """
+
+    zero_copy = True
+
+    profile = False
+    """Whether to record the time spent in each stage, see :attr:`timings`."""
+
+    def __init__(self, stages=(), sink=None, max_frames=4096):
+        self._numpy = utils.get_numpy()
+        self._stages = tuple(stages)
+        self._sink = sink
+        self._max_frames = max_frames
+        self._formats = None
+        self._views = None
+        self._backlog = None
+        self._backlog_frames = 0
+        self._reset_requested = False
+        self.reset_timings()
+
+    @property
+    def stages(self):
+        """The stages of the pipeline."""
+        return self._stages
+
+    @property
+    def input_format(self):
+        """The :class:`SampleFormat` the pipeline was negotiated for, or
+        :class:`None` if no audio has been delivered yet."""
+        if self._formats is None:
+            return None
+        return self._formats[0]
+
+    @property
+    def output_format(self):
+        """The :class:`SampleFormat` of the processed audio, or :class:`None`
+        if no audio has been delivered yet."""
+        if self._formats is None:
+            return None
+        return self._formats[-1]
+
+    @property
+    def latency(self):
+        """The number of frames the stages delay the audio by."""
+        return sum(stage.latency for stage in self._stages)
+
+    @property
+    def frames_buffered(self):
+        formats = self._formats
+        if formats is None:
+            return 0
+        num_frames = self._backlog_frames
+        if self._sink is not None:
+            num_frames += self._sink.frames_buffered
+        # Count audio after the stages in frames of the input format.
+        num_frames = (
+            num_frames * formats[0].sample_rate // formats[-1].sample_rate)
+        return num_frames + self.latency
+
+    @property
+    def timings(self):
+        """A list with a :class:`StageTiming` for each stage.
+
+        Only recorded while :attr:`profile` is :class:`True`.
+        """
+        return [
+            StageTiming(stage, *timing)
+            for stage, timing in zip(self._stages, self._timings)]
+
+    def reset_timings(self):
+        """Clear the recorded :attr:`timings`."""
+        self._timings = [[0, 0, 0.0] for stage in self._stages]
+
+    def _open(self):
+        player = spotifyconnect._session_instance.player
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        for stage in self._stages:
+            stage._open()
+        if self._sink is not None:
+            self._sink._open()
+
+    def _close(self):
+        if self._sink is not None:
+            self._sink._close()
+        for stage in reversed(self._stages):
+            stage._close()
+        player = spotifyconnect._session_instance.player
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._backlog_frames = 0
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify == spotifyconnect.PlaybackNotify.AudioFlush:
+            self._reset_requested = True
+
+    def _on_playback_seek(self, millis, session):
+        self._reset_requested = True
+
+    def _write(self, audio_format, frames, num_frames):
+        if self._reset_requested:
+            # The stages are only ever touched from libspotify's audio
+            # thread, so resets requested by playback events happen here.
+            self._reset_requested = False
+            self._backlog_frames = 0
+            for stage in self._stages:
+                stage.reset()
+        if self._backlog_frames:
+            self._write_backlog()
+            if self._backlog_frames:
+                return 0
+        if self._formats is None or audio_format is not self._formats[0]:
+            self._negotiate(audio_format)
+        frames = spotifyconnect.frame_array(audio_format, frames, num_frames)
+        offset = 0
+        while offset < num_frames:
+            count = min(num_frames - offset, self._max_frames)
+            output = self._process(frames[offset:offset + count])
+            offset += count
+            num_output_frames = len(output)
+            num_frames_consumed = self._write_output(
+                self._formats[-1], output, num_output_frames)
+            if num_frames_consumed < num_output_frames:
+                rest = num_output_frames - num_frames_consumed
+                self._backlog[:rest] = output[num_frames_consumed:]
+                self._backlog_frames = rest
+                break
+        return offset
+
+    def _negotiate(self, audio_format):
+        numpy = self._numpy
+        formats = [audio_format]
+        max_frames = [self._max_frames]
+        for stage in self._stages:
+            formats.append(stage.negotiate(formats[-1]))
+            max_frames.append(stage.max_output_frames(max_frames[-1]))
+        size = max(
+            count * fmt.frame_size for count, fmt in zip(max_frames, formats))
+        buffers = (
+            numpy.empty(size, dtype='uint8'),
+            numpy.empty(size, dtype='uint8'))
+        # Views of both scratch buffers for the input format and each stage's
+        # output format.
+        self._views = [
+            tuple(
+                buffer[:count * fmt.frame_size].view(fmt.dtype).reshape(
+                    count, fmt.channels)
+                for buffer in buffers)
+            for count, fmt in zip(max_frames, formats)]
+        self._backlog = numpy.empty(
+            (max_frames[-1], formats[-1].channels), dtype=formats[-1].dtype)
+        self._backlog_frames = 0
+        self._formats = formats
+        for stage in self._stages:
+            stage.reset()
+
+    def _process(self, frames):
+        profile = self.profile
+        formats = self._formats
+        views = self._views
+        # The scratch buffer holding the current audio, or None while it is
+        # still the read-only audio delivered by libspotify.
+        current = None
+        for i, stage in enumerate(self._stages):
+            num_frames = len(frames)
+            if profile:
+                start = _clock()
+            if stage.reads_only:
+                frames = stage.process(formats[i], frames, None)
+            elif stage.in_place:
+                if current is None:
+                    current = 0
+                    staged = views[i][current][:num_frames]
+                    staged[...] = frames
+                    frames = staged
+                frames = stage.process(formats[i], frames, None)
+            else:
+                current = 1 if current == 0 else 0
+                frames = stage.process(
+                    formats[i], frames, views[i + 1][current])
+            if profile:
+                timing = self._timings[i]
+                timing[0] += 1
+                timing[1] += num_frames
+                timing[2] += _clock() - start
+        return frames
+
+    def _write_backlog(self):
+        num_frames = self._backlog_frames
+        num_frames_consumed = self._write_output(
+            self._formats[-1], self._backlog[:num_frames], num_frames)
+        rest = num_frames - num_frames_consumed
+        if rest and num_frames_consumed:
+            backlog = self._backlog
+            backlog[:rest] = backlog[num_frames_consumed:num_frames]
+        self._backlog_frames = rest
+
+    def _write_output(self, audio_format, frames, num_frames):
+        # Called with a NumPy array of processed frames from an internal
+        # libspotify thread. It must not block in any way, and must return
+        # the number of frames consumed.
+        sink = self._sink
+        if sink is None:
+            raise NotImplementedError
+        if sink.zero_copy or sink.numpy_frames:
+            data = utils.byte_view(frames)
+        else:
+            data = frames.tobytes()
+        return sink._on_music_delivery(
+            audio_format, data, num_frames, None,
+            spotifyconnect._session_instance)
@@ -30,6 +30,8 @@ class Player(utils.EventEmitter):
         self._cache = weakref.WeakValueDictionary()
         self._emitters = []
         self._callback_handles = set()
+        self._userdata = session
+        self.clock = spotifyconnect.PlaybackClock()
 
         spotifyconnect.Error.maybe_raise(
             lib.SpRegisterPlaybackCallbacks(
@@ -63,6 +65,13 @@ class Player(utils.EventEmitter):
     Internal attribute.
     """
 
+    _userdata = None
+    """The CData handle for the :class:`Session` that is passed back to all
+    the playback callbacks.
+
+    Internal attribute.
+    """
+
     _callback_handles = None
     """A set of handles returned by :meth:`spotify.ffi.new_handle`.
 
@@ -73,6 +82,94 @@ class Player(utils.EventEmitter):
     Internal attribute.
     """
 
+    clock = None
+    """The :class:`PlaybackClock` giving the position in the current track."""
+
+    zero_copy = False
+    """Whether audio is delivered to the
+    :attr:`~PlayerEvent.MUSIC_DELIVERY` listener without copying it first.
+
+    By default each block of audio is copied into a new :class:`bytes` object
+    before it is handed to the listener. If this is :class:`True`, the
+    listener gets an :func:`ffi.buffer` over libspotify's own memory instead.
+    The buffer must be treated as read-only and is only valid for the duration
+    of the callback, so a listener that wants to keep the audio around must
+    copy it itself.
+
+    This is normally set by :meth:`Sink.on` from :attr:`Sink.zero_copy`.
+    """
+
+    numpy_frames = False
+    """Whether audio is delivered as a NumPy array.
+
+    If :class:`True`, the :attr:`~PlayerEvent.MUSIC_DELIVERY` listener and the
+    audio consumer get a read-only ``(num_frames, channels)`` NumPy array
+    over libspotify's memory instead of :class:`bytes`, see
+    :func:`frame_array`. No audio is copied, so like with :attr:`zero_copy`
+    the array is only valid for the duration of the callback. Requires NumPy.
+
+    Sinks ask for arrays with :attr:`Sink.numpy_frames` instead.
+    """
+
+    _audio_consumer = None
+    """The callable audio is delivered to, if set with
+    :meth:`set_audio_consumer`.
+
+    Internal attribute.
+    """
+
+    def set_audio_consumer(self, consumer):
+        """Deliver audio directly to ``consumer``.
+
+        ``consumer`` is called with the same arguments as a
+        :attr:`~PlayerEvent.MUSIC_DELIVERY` listener and must return the number
+        of frames it consumed. It is bound once here, so each delivery skips
+        the listener bookkeeping of :meth:`~utils.EventEmitter.call`, and the
+        ``audio_format`` argument is an interned :class:`SampleFormat` instead
+        of a new :class:`AudioFormat`.
+
+        While a consumer is set, :attr:`~PlayerEvent.MUSIC_DELIVERY` listeners
+        are not called. Pass :class:`None` to go back to them.
+
+        Like :attr:`~PlayerEvent.MUSIC_DELIVERY` listeners, the consumer is
+        called from an internal libspotify thread and must not block.
+        """
+        self._audio_consumer = consumer
+
+    native_audio = False
+    """Whether audio is delivered to the native ring buffer instead of to the
+    :attr:`~PlayerEvent.MUSIC_DELIVERY` listener.
+
+    See :meth:`set_native_audio`.
+    """
+
+    @serialized
+    def set_native_audio(self, enabled):
+        """Deliver audio to the native ring buffer if ``enabled`` is
+        :class:`True`, or to the :attr:`~PlayerEvent.MUSIC_DELIVERY` listener
+        otherwise.
+
+        The native ring buffer is filled by C code running on libspotify's
+        audio thread, so audio never enters Python until it is read with
+        :meth:`NativeRingBuffer.read_into`. You'll normally not call this
+        yourself, but use a :class:`NativeRingBufferSink`.
+
+        The native ring buffer can't be reset while this is enabled.
+        """
+        # The ring must be marked as in use before the native callback may
+        # write to it, and for as long as it may.
+        lib.spc_ring_set_enabled(self.native_audio or enabled)
+        try:
+            spotifyconnect.Error.maybe_raise(
+                lib.SpRegisterPlaybackCallbacks(
+                    _PlayerCallbacks.get_struct(native_audio=enabled),
+                    self._userdata))
+        except spotifyconnect.Error:
+            lib.spc_ring_set_enabled(self.native_audio)
+            raise
+        lib.spc_ring_set_enabled(enabled)
+        self.native_audio = enabled
+
     @serialized
     def play(self):
         """Play the currently loaded track.
@@ -187,11 +284,22 @@ class Player(utils.EventEmitter):
 class PlayerEvent(object):
 
     """AlsaSink events.
+
+    :attr:`MUSIC_DELIVERY` listeners are called with ``audio_format``,
+    ``frames``, ``num_frames``, ``pending`` and ``session``, and must return
+    the number of whole frames they consumed. The rest is delivered again
+    later. ``pending`` points to where the listener should store the number
+    of samples it has buffered but not played yet.
+
+    :attr:`PLAYBACK_LEVELS` listeners are called with a :class:`Levels` and
+    ``session``. The event is emitted by a :class:`LevelMeter` from the
+    audio thread, so listeners must return quickly.
     """
     PLAYBACK_NOTIFY = 'playback_notify'
     MUSIC_DELIVERY = 'playback_data'
     PLAYBACK_SEEK = 'playback_seek'
     PLAYBACK_VOLUME = 'playback_volume'
+    PLAYBACK_LEVELS = 'playback_levels'
 
 
 class _PlayerCallbacks(object):
@@ -199,10 +307,14 @@ class _PlayerCallbacks(object):
     """Internal class."""
 
     @classmethod
-    def get_struct(cls):
+    def get_struct(cls, native_audio=False):
+        if native_audio:
+            audio_data = lib.spc_audio_data
+        else:
+            audio_data = cls.playback_data
         return ffi.new('SpPlaybackCallbacks *', {
             'notify': cls.playback_notify,
-            'audio_data': cls.playback_data,
+            'audio_data': audio_data,
             'seek': cls.playback_seek,
             'apply_volume': cls.playback_volume
         })
@@ -216,7 +328,9 @@ class _PlayerCallbacks(object):
         if not spotifyconnect._session_instance:
             return
         playback_notify = PlaybackNotify(sp_playback_notify)
-        spotifyconnect._session_instance.player.emit(
+        player = spotifyconnect._session_instance.player
+        player.clock._on_playback_notify(playback_notify)
+        player.emit(
             PlayerEvent.PLAYBACK_NOTIFY,
             playback_notify,
             ffi.from_handle(sp_userdata))
@@ -233,26 +347,48 @@ class _PlayerCallbacks(object):
             sp_userdata):
         if not spotifyconnect._session_instance:
             return
-        if spotifyconnect._session_instance.player.num_listeners(
+        player = spotifyconnect._session_instance.player
+        consumer = player._audio_consumer
+        if consumer is None and player.num_listeners(
                 PlayerEvent.MUSIC_DELIVERY) == 0:
             return 0
 
-        audio_format = spotifyconnect.AudioFormat(sp_audioformat)
+        sample_format = spotifyconnect.SampleFormat.from_sp_audioformat(
+            sp_audioformat)
 
-        # Make sure waudio_formate don't pass incomplete frames
-        num_samples -= num_samples % audio_format.frame_size
+        # libspotify counts interleaved samples, while sinks work with whole
+        # frames of one sample per channel.
+        num_frames = num_samples // sample_format.channels
 
         samples_buffer = ffi.buffer(
-            samples, num_samples * audio_format.sample_size)
-        samples_bytes = samples_buffer[:]
-        num_samples_consumed = spotifyconnect._session_instance.player.call(
-            PlayerEvent.MUSIC_DELIVERY,
-            audio_format,
-            samples_bytes,
-            num_samples,
-            sp_pending,
-            ffi.from_handle(sp_userdata))
-        return num_samples_consumed
+            samples, num_frames * sample_format.frame_size)
+        if player.numpy_frames:
+            samples_buffer = spotifyconnect.frame_array(
+                sample_format, samples_buffer)
+        elif not player.zero_copy:
+            samples_buffer = samples_buffer[:]
+        if consumer is not None:
+            num_frames_consumed = consumer(
+                sample_format,
+                samples_buffer,
+                num_frames,
+                sp_pending,
+                ffi.from_handle(sp_userdata))
+        else:
+            num_frames_consumed = player.call(
+                PlayerEvent.MUSIC_DELIVERY,
+                spotifyconnect.AudioFormat(sp_audioformat),
+                samples_buffer,
+                num_frames,
+                sp_pending,
+                ffi.from_handle(sp_userdata))
+        if num_frames_consumed:
+            # The sink reports the samples it holds but hasn't played yet.
+            player.clock._on_frames(
+                num_frames_consumed,
+                sp_pending[0] // sample_format.channels if sp_pending else 0,
+                sample_format.sample_rate)
+        return num_frames_consumed * sample_format.channels
 
     @staticmethod
     @ffi.callback('void(uint32_t millis, void *userdata)')
@@ -260,7 +396,9 @@ class _PlayerCallbacks(object):
         if not spotifyconnect._session_instance:
             return
         millis = int(sp_millis)
-        spotifyconnect._session_instance.player.emit(
+        player = spotifyconnect._session_instance.player
+        player.clock._on_playback_seek(millis)
+        player.emit(
             PlayerEvent.PLAYBACK_SEEK, millis, ffi.from_handle(sp_userdata))
 
     @staticmethod
@@ -0,0 +1,198 @@
+from __future__ import division, unicode_literals
+
+import fractions
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'ResampleQuality',
+    'Resampler',
+]
+
+
+class ResampleQuality(utils.IntEnum):
+
+    """Quality presets for the :class:`Resampler`.
+
+    Higher qualities use longer filters, which give a steeper cutoff and
+    less aliasing, at the cost of more CPU time and latency.
+    """
+    pass
+
+
+ResampleQuality.add('LOW', 0)
+ResampleQuality.add('MEDIUM', 1)
+ResampleQuality.add('HIGH', 2)
+
+
+# Filter taps per phase, the cutoff relative to the Nyquist frequency of the
+# lower of the two rates, and the beta of the Kaiser window for each preset.
+_PRESETS = {
+    ResampleQuality.LOW: (16, 0.85, 6.0),
+    ResampleQuality.MEDIUM: (32, 0.9, 8.0),
+    ResampleQuality.HIGH: (64, 0.95, 10.0),
+}
+
+
+def _filter_bank(up, down, taps, cutoff, beta):
+    numpy = utils.get_numpy()
+    length = up * taps
+    # Cutoff in cycles per sample of the upsampled signal.
+    fc = 0.5 * cutoff / max(up, down)
+    t = numpy.arange(length) - (length - 1) / 2
+    h = 2 * fc * numpy.sinc(2 * fc * t) * numpy.kaiser(length, beta)
+    # Scale each phase to unity gain at DC.
+    h *= up / h.sum()
+    # Tap k of phase p is applied to the input frame k frames back.
+    return h.reshape(taps, up).T.astype('float32').copy()
+
+
+class Resampler(Stage):
+
+    """A :class:`Stage` that changes the sample rate of 16-bit audio.
+
+    The audio is resampled by a rational factor with a polyphase filter
+    bank, e.g. by 160/147 from 44100 Hz to 48000 Hz. Each block is filtered
+    with a handful of vectorised NumPy operations, and the last input frames
+    are kept between blocks so there are no discontinuities at block
+    boundaries. The filter delays the audio by :attr:`latency` input frames.
+
+    When added to a :class:`Pipeline`, the filter history is cleared on
+    seeks and flushes so no audio from before the seek is heard after it.
+
+    Requires NumPy.
+
+    :param rate: the sample rate to resample to
+    :type rate: int
+    :param quality: the filter quality preset
+    :type quality: :class:`ResampleQuality`
+    """
+
+    in_place = False
+
+    def __init__(self, rate=48000, quality=ResampleQuality.MEDIUM):
+        self._numpy = utils.get_numpy()
+        self._rate = rate
+        self._quality = ResampleQuality(quality)
+        self._taps, self._cutoff, self._beta = _PRESETS[self._quality]
+        self._up = self._down = 1
+        self._bank = None
+        self._capacity = 0
+        self._channels = 0
+        # Position of the next output frame in the upsampled input, counted
+        # from the first frame of the next input block.
+        self._position = 0
+
+    @property
+    def rate(self):
+        """The sample rate the audio is resampled to."""
+        return self._rate
+
+    @property
+    def quality(self):
+        """The :class:`ResampleQuality` preset in use."""
+        return self._quality
+
+    @property
+    def latency(self):
+        if self._up == self._down:
+            return 0
+        return self._taps // 2
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type != spotifyconnect.SampleType.S16NativeEndian:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        ratio = fractions.Fraction(self._rate, audio_format.sample_rate)
+        self._up, self._down = ratio.numerator, ratio.denominator
+        if self._up != self._down:
+            self._bank = _filter_bank(
+                self._up, self._down, self._taps, self._cutoff, self._beta)
+        self._channels = audio_format.channels
+        self._capacity = 0
+        self.reset()
+        return spotifyconnect.SampleFormat(
+            audio_format.channels, sample_type, self._rate)
+
+    def max_output_frames(self, num_frames):
+        return num_frames * self._up // self._down + 1
+
+    def reset(self):
+        self._position = 0
+        if self._capacity:
+            self._work[:self._taps - 1] = 0
+
+    def process(self, audio_format, frames, out):
+        num_frames = len(frames)
+        if self._up == self._down:
+            out = out[:num_frames]
+            out[...] = frames
+            return out
+        numpy = self._numpy
+        up, down, taps = self._up, self._down, self._taps
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        history = taps - 1
+        work = self._work
+        work[history:history + num_frames] = frames
+
+        num_output_frames = max(
+            0, (num_frames * up - self._position + down - 1) // down)
+        n = num_output_frames
+        positions = self._positions[:n]
+        index = self._index[:n]
+        phase = self._phase[:n]
+        numpy.add(self._steps[:n], self._position, out=positions)
+        numpy.floor_divide(positions, up, out=index)
+        numpy.remainder(positions, up, out=phase)
+
+        # Gather the input frames each output frame is computed from, and the
+        # filter phase to apply to them.
+        windows = self._windows[:n]
+        numpy.add(index[:, None], self._offsets, out=windows)
+        numpy.take(work, windows, axis=0, out=self._gathered[:n])
+        numpy.take(self._bank, phase, axis=0, out=self._coefficients[:n])
+        result = self._result[:n]
+        numpy.matmul(
+            self._coefficients[:n, None, :], self._gathered[:n],
+            out=result[:, None, :])
+
+        numpy.rint(result, out=result)
+        numpy.clip(result, -32768, 32767, out=result)
+        out = out[:n]
+        numpy.copyto(out, result, casting='unsafe')
+
+        # Keep the last input frames as history for the next block.
+        work[:history] = work[num_frames:num_frames + history]
+        self._position += n * down - num_frames * up
+        return out
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        taps, channels = self._taps, self._channels
+        max_output_frames = self.max_output_frames(num_frames)
+        history = None
+        if self._capacity:
+            history = self._work[:taps - 1].copy()
+        self._work = numpy.zeros(
+            (taps - 1 + num_frames, channels), dtype='float32')
+        if history is not None:
+            self._work[:taps - 1] = history
+        self._steps = numpy.arange(
+            0, max_output_frames * self._down, self._down, dtype='int64')
+        self._positions = numpy.empty(max_output_frames, dtype='int64')
+        self._index = numpy.empty(max_output_frames, dtype='int64')
+        self._phase = numpy.empty(max_output_frames, dtype='int64')
+        # Offsets into the work buffer of the taps of each output frame,
+        # newest input frame first.
+        self._offsets = numpy.arange(taps - 1, -1, -1, dtype='int64')
+        self._windows = numpy.empty((max_output_frames, taps), dtype='int64')
+        self._gathered = numpy.empty(
+            (max_output_frames, taps, channels), dtype='float32')
+        self._coefficients = numpy.empty(
+            (max_output_frames, taps), dtype='float32')
+        self._result = numpy.empty(
+            (max_output_frames, channels), dtype='float32')
+        self._capacity = num_frames
@@ -0,0 +1,231 @@
+from __future__ import unicode_literals
+
+from spotifyconnect import ffi, lib, utils
+
+
+__all__ = [
+    'NativeRingBuffer',
+    'RingBuffer'
+]
+
+
+class RingBuffer(object):
+
+    """A fixed-capacity byte ring for one producer and one consumer thread.
+
+    The ring is preallocated once and never grows. The producer only ever
+    moves the write position and the consumer only ever moves the read
+    position, so no lock is needed as long as each side is used from a single
+    thread. Both positions count bytes since the ring was created and are only
+    wrapped when indexing into the buffer.
+
+    :param size: the capacity of the ring in bytes
+    :type size: int
+    """
+
+    def __init__(self, size):
+        if size <= 0:
+            raise ValueError('Ring buffer size must be positive')
+        self._size = size
+        self._buffer = bytearray(size)
+        self._view = memoryview(self._buffer)
+        self._write_pos = 0
+        self._read_pos = 0
+
+    @property
+    def size(self):
+        """The capacity of the ring in bytes."""
+        return self._size
+
+    @property
+    def readable(self):
+        """The number of bytes that can be read from the ring."""
+        return self._write_pos - self._read_pos
+
+    @property
+    def writable(self):
+        """The number of bytes that can be written to the ring."""
+        return self._size - (self._write_pos - self._read_pos)
+
+    def write(self, data, align=1):
+        """Copy as much of ``data`` into the ring as there is room for.
+
+        ``data`` may be any object supporting the buffer protocol. The number
+        of bytes written is rounded down to a multiple of ``align``, so that
+        e.g. only whole audio frames are accepted.
+
+        Producer side. Returns the number of bytes written, which may be
+        less than ``len(data)`` if the ring is full.
+        """
+        data = utils.byte_view(data)
+        size = min(len(data), self.writable)
+        size -= size % align
+        if size == 0:
+            return 0
+        start = self._write_pos % self._size
+        first = min(size, self._size - start)
+        self._view[start:start + first] = data[:first]
+        if size > first:
+            self._view[:size - first] = data[first:size]
+        self._write_pos += size
+        return size
+
+    def read_into(self, buffer, align=1):
+        """Copy as many bytes as are available and fit into ``buffer``.
+
+        ``buffer`` must be a writable object supporting the buffer protocol.
+        The number of bytes read is rounded down to a multiple of ``align``.
+
+        Consumer side. Returns the number of bytes read.
+        """
+        buffer = memoryview(buffer)
+        size = min(len(buffer), self.readable)
+        size -= size % align
+        if size == 0:
+            return 0
+        start = self._read_pos % self._size
+        first = min(size, self._size - start)
+        buffer[:first] = self._view[start:start + first]
+        if size > first:
+            buffer[first:size] = self._view[:size - first]
+        self._read_pos += size
+        return size
+
+    def skip(self, size=None):
+        """Discard ``size`` bytes, or everything that is readable if
+        ``size`` is :class:`None`.
+
+        Consumer side. Returns the number of bytes discarded.
+        """
+        readable = self.readable
+        if size is None or size > readable:
+            size = readable
+        self._read_pos += size
+        return size
+
+    @property
+    def write_position(self):
+        """The number of bytes written to the ring since it was created."""
+        return self._write_pos
+
+    @property
+    def read_position(self):
+        """The number of bytes read from or skipped in the ring since it was
+        created."""
+        return self._read_pos
+
+    def skip_to(self, position):
+        """Discard everything written before ``position``, an earlier
+        :attr:`write_position`.
+
+        Does nothing if everything before ``position`` has been read
+        already, so any thread may take the position and leave the skip to
+        the consumer. Consumer side. Returns the number of bytes discarded.
+        """
+        size = position - self._read_pos
+        if size <= 0 or size > self.readable:
+            return 0
+        self._read_pos = position
+        return size
+
+
+class NativeRingBuffer(object):
+
+    """The consumer side of the ring buffer filled by the native audio
+    callback.
+
+    The ring is filled by C code on libspotify's audio thread once
+    :meth:`Player.set_native_audio` has been enabled. There is only one native
+    ring buffer per process, so creating a :class:`NativeRingBuffer` resets
+    and, if needed, reallocates it. That raises :exc:`RuntimeError` while
+    native audio delivery is enabled.
+
+    Reading from the ring releases the GIL while copying.
+
+    :param size: the capacity of the ring in bytes
+    :type size: int
+    """
+
+    def __init__(self, size):
+        result = lib.spc_ring_init(size)
+        if result == -2:
+            raise RuntimeError(
+                'Native ring buffer is in use by native audio delivery')
+        if result != 0:
+            raise ValueError('Could not allocate a %d byte ring buffer' % size)
+
+    @property
+    def size(self):
+        """The capacity of the ring in bytes."""
+        return lib.spc_ring_capacity()
+
+    @property
+    def readable(self):
+        """The number of bytes that can be read from the ring."""
+        return lib.spc_ring_readable()
+
+    @property
+    def writable(self):
+        """The number of bytes that can be written to the ring."""
+        return lib.spc_ring_capacity() - lib.spc_ring_readable()
+
+    @property
+    def overruns(self):
+        """The number of deliveries that could not be accepted in full
+        because the ring was full."""
+        return lib.spc_ring_overrun_count()
+
+    @property
+    def format_pending(self):
+        """Whether the producer waits for the ring to be drained before it
+        writes audio in a new format."""
+        return bool(lib.spc_ring_format_changing())
+
+    def get_sample_format(self, sp_audioformat):
+        """Copy the format of the audio in the ring into
+        ``sp_audioformat``.
+
+        Returns :class:`False` if no audio has been delivered yet.
+        """
+        return bool(lib.spc_ring_format(sp_audioformat))
+
+    def read_into(self, buffer, align=1):
+        """Copy as many bytes as are available and fit into ``buffer``.
+
+        ``buffer`` must be a writable object supporting the buffer protocol.
+        The number of bytes read is rounded down to a multiple of ``align``.
+
+        Returns the number of bytes read.
+        """
+        buffer = ffi.from_buffer(buffer)
+        return lib.spc_ring_read(buffer, len(buffer), align)
+
+    def skip(self, size=None):
+        """Discard ``size`` bytes, or everything that is readable if
+        ``size`` is :class:`None`.
+
+        Returns the number of bytes discarded.
+        """
+        if size is None:
+            size = lib.spc_ring_capacity()
+        return lib.spc_ring_skip(size)
+
+    @property
+    def write_position(self):
+        """The number of bytes written to the ring, modulo 2**32."""
+        return lib.spc_ring_write_position()
+
+    @property
+    def read_position(self):
+        """The number of bytes read from or skipped in the ring, modulo
+        2**32."""
+        return lib.spc_ring_read_position()
+
+    def skip_to(self, position):
+        """Discard everything written before ``position``, an earlier
+        :attr:`write_position`.
+
+        Does nothing if everything before ``position`` has been read
+        already. Returns the number of bytes discarded.
+        """
+        return lib.spc_ring_skip_to(position)
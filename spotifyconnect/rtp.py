@@ -0,0 +1,279 @@
+from __future__ import division, unicode_literals
+
+import random
+import socket
+import struct
+
+import spotifyconnect
+from spotifyconnect import ffi, lib, utils
+from spotifyconnect.sink import Sink
+
+__all__ = [
+    'RTPSink',
+]
+
+
+_clock = utils.monotonic
+
+_HEADER_SIZE = 12
+
+# Static payload types of L16 audio, see RFC 3551. Other formats use a
+# dynamic payload type the receiver must be told about.
+_STATIC_PAYLOAD_TYPES = {
+    (2, 44100): 10,
+    (1, 44100): 11,
+}
+_DYNAMIC_PAYLOAD_TYPE = 96
+
+
+def _is_multicast(address):
+    return 224 <= int(address.split('.')[0]) <= 239
+
+
+class RTPSink(Sink):
+
+    """Sink that sends the audio as RTP packets over UDP.
+
+    The audio is split into packets of exactly ``packet_frames`` frames with
+    an L16 payload, as described by RFC 3551, so receivers such as GStreamer's
+    ``rtpL16depay`` or ffmpeg can play it. Each packet's timestamp is the
+    number of frames before it, starting from a random base, which lets the
+    receivers of a multicast group play the same frame at the same time.
+    Frames that don't fill a packet are kept until the next delivery.
+
+    On a seek or :attr:`~PlaybackNotify.AudioFlush`, partial packets are
+    dropped, the timestamps jump to a new random base and the marker bit is
+    set on the first packet, so receivers know to resync instead of waiting
+    for the missing audio. The new audio is sent right away, without waiting
+    for the audio sent ahead to play out. When the audio resumes after
+    running out, e.g. after a pause, the partial packet is padded with
+    silence and sent, and the timestamps move on by the length of the gap,
+    so they keep pace with real time. The first packet after the gap is
+    marked as well.
+
+    The packets are sent to ``host``, which can be a multicast group, from
+    libspotify's audio thread without blocking. On Linux they are sent in
+    batches with a single ``sendmmsg()`` call per batch. Packets the kernel
+    has no room for are dropped and counted in :attr:`packets_dropped`. The
+    sink takes audio at the speed it is played, up to ``buffer_ms`` ahead, so
+    receivers should buffer at least that much.
+
+    Only supports :attr:`~SampleType.S16NativeEndian` audio; use a
+    :class:`FormatConverter` in a :class:`Pipeline` for other sample types.
+
+    :param host: the address or multicast group to send to
+    :type host: string
+    :param port: the UDP port to send to
+    :type port: int
+    :param packet_frames: the number of frames in each packet
+    :type packet_frames: int
+    :param payload_type: the RTP payload type, or :class:`None` for the
+        static payload type of 44.1 kHz audio and 96 otherwise
+    :type payload_type: int or :class:`None`
+    :param ttl: the time to live of multicast packets
+    :type ttl: int
+    :param buffer_ms: how far the stream runs ahead of real time
+    :type buffer_ms: int
+    """
+
+    zero_copy = True
+
+    packets_sent = 0
+    """The number of packets sent."""
+
+    packets_dropped = 0
+    """The number of packets dropped because the socket was full."""
+
+    def __init__(
+            self, host, port=5004, packet_frames=256, payload_type=None,
+            ttl=1, buffer_ms=200):
+        if packet_frames < 1:
+            raise ValueError('packet_frames must be positive')
+        self._host = host
+        self._port = port
+        self._packet_frames = packet_frames
+        self._payload_type = payload_type
+        self._ttl = ttl
+        self._buffer_ms = buffer_ms
+        self._batch = 32
+        self._socket = None
+        self._audio_format = None
+        self._header = ffi.new('uint8_t[]', _HEADER_SIZE)
+        # Version 2, and the marker bit set on the first packet.
+        self._header[0] = 0x80
+        self._header[1] = 0x80
+        struct.pack_into(
+            '>HII', ffi.buffer(self._header), 2, random.getrandbits(16),
+            random.getrandbits(32), random.getrandbits(32))
+        self._partial_frames = 0
+        self._frames_written = 0
+        self._clock_start = None
+        self._clock_frames = 0
+        self._reset_requested = False
+
+    @property
+    def ssrc(self):
+        """The synchronization source identifier of the stream."""
+        return struct.unpack_from('>I', ffi.buffer(self._header), 8)[0]
+
+    @property
+    def timestamp(self):
+        """The RTP timestamp of the next frame the sink takes."""
+        timestamp = struct.unpack_from('>I', ffi.buffer(self._header), 4)[0]
+        return (timestamp + self._partial_frames) & 0xFFFFFFFF
+
+    @property
+    def frames_buffered(self):
+        return max(0, self._frames_written - self._frames_played(_clock()))
+
+    def _frames_played(self, now):
+        if self._clock_start is None:
+            return self._frames_written
+        return self._clock_frames + int(
+            (now - self._clock_start) * self._audio_format.sample_rate)
+
+    def _open(self):
+        if self._socket is not None:
+            return
+        address = socket.gethostbyname(self._host)
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if _is_multicast(address):
+            self._socket.setsockopt(
+                socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, self._ttl)
+        self._socket.connect((address, self._port))
+        self._socket.setblocking(False)
+        player = spotifyconnect._session_instance.player
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+
+    def _close(self):
+        if self._socket is None:
+            return
+        player = spotifyconnect._session_instance.player
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._socket.close()
+        self._socket = None
+        self._reset_requested = True
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify == spotifyconnect.PlaybackNotify.AudioFlush:
+            self._reset_requested = True
+
+    def _on_playback_seek(self, millis, session):
+        # Applied by the audio thread, which owns the stream state.
+        self._reset_requested = True
+
+    def _write(self, audio_format, frames, num_frames):
+        if audio_format is not self._audio_format:
+            self._set_audio_format(audio_format)
+        if self._reset_requested:
+            self._reset_requested = False
+            self._new_timestamp_base()
+            # The audio sent ahead won't be played, so take the new audio
+            # right away.
+            self._clock_start = None
+
+        # Only take audio as fast as it plays.
+        now = _clock()
+        played = self._frames_played(now)
+        if self._clock_start is None or played > self._frames_written:
+            # Out of audio, e.g. after a pause, so restart the clock.
+            if self._clock_start is not None:
+                self._skip_gap(played - self._frames_written)
+            self._clock_start = now
+            self._clock_frames = played = self._frames_written
+        room = self._buffer_frames - (self._frames_written - played)
+        num_frames = max(0, min(num_frames, room))
+        if not num_frames:
+            return 0
+
+        frame_size = audio_format.frame_size
+        packet_frames = self._packet_frames
+        data = utils.byte_view(frames)[:num_frames * frame_size]
+        offset = 0
+        if self._partial_frames:
+            # Complete the packet left over from the last delivery.
+            offset = min(num_frames, packet_frames - self._partial_frames)
+            start = self._partial_frames * frame_size
+            self._partial[start:start + offset * frame_size] = (
+                data[:offset * frame_size])
+            self._partial_frames += offset
+            if self._partial_frames == packet_frames:
+                self._partial_frames = 0
+                self._send(self._partial, 1)
+        num_packets = (num_frames - offset) // packet_frames
+        if num_packets:
+            self._send(data[offset * frame_size:], num_packets)
+            offset += num_packets * packet_frames
+        if offset < num_frames:
+            self._partial_frames = num_frames - offset
+            self._partial[:self._partial_frames * frame_size] = (
+                data[offset * frame_size:])
+        self._frames_written += num_frames
+        return num_frames
+
+    def _set_audio_format(self, audio_format):
+        if (audio_format.sample_type !=
+                spotifyconnect.SampleType.S16NativeEndian):
+            raise ValueError(
+                'Unsupported sample type: %d' % audio_format.sample_type)
+        payload_type = self._payload_type
+        if payload_type is None:
+            payload_type = _STATIC_PAYLOAD_TYPES.get(
+                (audio_format.channels, audio_format.sample_rate),
+                _DYNAMIC_PAYLOAD_TYPE)
+        self._header[1] = (self._header[1] & 0x80) | (payload_type & 0x7f)
+        packet_size = self._packet_frames * audio_format.frame_size
+        self._partial = memoryview(bytearray(packet_size))
+        self._buffer = ffi.new(
+            'uint8_t[]', self._batch * (_HEADER_SIZE + packet_size))
+        self._buffer_frames = max(
+            1, audio_format.sample_rate * self._buffer_ms // 1000)
+        self._frames_written = 0
+        self._clock_start = None
+        if self._audio_format is not None:
+            self._new_timestamp_base()
+        self._audio_format = audio_format
+
+    def _new_timestamp_base(self):
+        # Drops any partial packet, and marks the next packet as the start
+        # of a new stretch of audio.
+        self._partial_frames = 0
+        struct.pack_into(
+            '>I', ffi.buffer(self._header), 4, random.getrandbits(32))
+        self._header[1] |= 0x80
+        self._clock_start = None
+        self._frames_written = 0
+
+    def _skip_gap(self, num_frames):
+        # Pads the partial packet with silence and sends it, then moves the
+        # timestamps on by the rest of the gap, so they keep pace with real
+        # time.
+        if self._partial_frames:
+            frame_size = self._audio_format.frame_size
+            start = self._partial_frames * frame_size
+            self._partial[start:] = b'\0' * (len(self._partial) - start)
+            num_frames -= self._packet_frames - self._partial_frames
+            self._partial_frames = 0
+            self._send(self._partial, 1)
+        header = ffi.buffer(self._header)
+        timestamp = struct.unpack_from('>I', header, 4)[0]
+        struct.pack_into(
+            '>I', header, 4, (timestamp + max(0, num_frames)) & 0xFFFFFFFF)
+        self._header[1] |= 0x80
+
+    def _send(self, data, num_packets):
+        sent = lib.spc_rtp_send(
+            self._socket.fileno(),
+            ffi.cast('int16_t *', ffi.from_buffer(data)), num_packets,
+            self._packet_frames, self._audio_format.channels, self._header,
+            self._buffer, self._batch)
+        self.packets_sent += sent
+        self.packets_dropped += num_packets - sent
@@ -1,14 +1,47 @@
-from __future__ import unicode_literals
+from __future__ import division, unicode_literals
+
+import collections
+import threading
+import time
 
 import spotifyconnect
+from spotifyconnect import ffi, utils
 
 __all__ = [
+    'CoalescingSink',
+    'NativeRingBufferSink',
+    'RingBufferSink',
     'Sink'
 ]
 
 
+_clock = utils.monotonic
+
+# Markers nobody reads are dropped, oldest first, beyond this many.
+_MAX_MARKERS = 64
+
+
 class Sink(object):
 
+    zero_copy = False
+    """Whether the sink accepts audio without a copy being made first.
+
+    If :class:`True`, the ``frames`` argument to :meth:`_on_music_delivery` is
+    an :func:`ffi.buffer` over libspotify's memory instead of :class:`bytes`.
+    It is only valid until :meth:`_on_music_delivery` returns, so sinks that
+    keep the audio around must copy it themselves. See
+    :attr:`Player.zero_copy`.
+    """
+
+    numpy_frames = False
+    """Whether the sink wants audio as a NumPy array.
+
+    If :class:`True`, the ``frames`` argument to :meth:`_write` is a read-only
+    ``(num_frames, channels)`` NumPy array, see :func:`frame_array`. The array
+    is a view over libspotify's memory, so no audio is copied, and it is only
+    valid until :meth:`_write` returns. Requires NumPy.
+    """
+
     def on(self):
         """Turn on the alsa_sink sink.
 
@@ -18,6 +51,9 @@ class Sink(object):
         """
         assert spotifyconnect._session_instance.player.num_listeners(
             spotifyconnect.PlayerEvent.MUSIC_DELIVERY) == 0
+        self._open()
+        spotifyconnect._session_instance.player.zero_copy = (
+            self.zero_copy or self.numpy_frames)
         spotifyconnect._session_instance.player.on(
             spotifyconnect.PlayerEvent.MUSIC_DELIVERY, self._on_music_delivery)
 
@@ -30,8 +66,57 @@ class Sink(object):
             spotifyconnect.PlayerEvent.MUSIC_DELIVERY, self._on_music_delivery)
         assert spotifyconnect._session_instance.player.num_listeners(
             spotifyconnect.PlayerEvent.MUSIC_DELIVERY) == 0
+        spotifyconnect._session_instance.player.zero_copy = False
         self._close()
 
+    frames_accepted = 0
+    """The number of frames the sink has accepted from libspotify."""
+
+    underruns = 0
+    """The number of times the sink ran out of audio while playing."""
+
+    overruns = 0
+    """The number of deliveries that could not be accepted in full because
+    the sink's buffers were full."""
+
+    @property
+    def frames_buffered(self):
+        """The number of accepted frames that have not been played yet.
+
+        Sinks that buffer audio before it reaches the audio device must
+        override this. The default is 0, for sinks that play audio as soon as
+        it is delivered.
+        """
+        return 0
+
+    @property
+    def frames_played(self):
+        """The number of accepted frames that have been played."""
+        return self.frames_accepted - self.frames_buffered
+
+    @property
+    def prebuffer_frames(self):
+        """The number of frames the sink buffers before it starts playing.
+
+        The default is 0, for sinks that play audio as soon as it is
+        delivered.
+        """
+        return 0
+
+    _channels = 0
+    # The number of channels of the audio delivered last.
+
+    @property
+    def buffer_stats(self):
+        """An :class:`AudioBufferStats` snapshot of the sink's buffers.
+
+        Buffered audio is counted in samples, like libspotify does.
+        """
+        channels = self._channels
+        return spotifyconnect.AudioBufferStats(
+            self.frames_buffered * channels, self.underruns, self.overruns,
+            self.prebuffer_frames * channels)
+
     def _on_music_delivery(
             self,
             audio_format,
@@ -41,7 +126,639 @@ class Sink(object):
             session):
         # This method is called from an internal libspotify thread and must
         # not block in any way.
+        if not isinstance(audio_format, spotifyconnect.SampleFormat):
+            audio_format = spotifyconnect.SampleFormat.from_audio_format(
+                audio_format)
+        self._channels = audio_format.channels
+        if self.numpy_frames:
+            frames = spotifyconnect.frame_array(
+                audio_format, frames, num_frames)
+        num_frames_consumed = self._write(audio_format, frames, num_frames)
+        self.frames_accepted += num_frames_consumed
+        if pending:
+            # libspotify counts buffered audio in samples, not frames.
+            pending[0] = self.frames_buffered * audio_format.channels
+        return num_frames_consumed
+
+    def _write(self, audio_format, frames, num_frames):
+        # This method is called from an internal libspotify thread with a
+        # SampleFormat and must not block in any way. It must return the
+        # number of frames consumed.
         raise NotImplementedError
 
+    def _open(self):
+        # Called by on() before the sink is connected to the player, and by
+        # sinks that pass audio on to this sink instead of the player.
+        pass
+
     def _close(self):
+        # Called by off() after the sink is disconnected from the player, and
+        # by sinks that pass audio on to this sink instead of the player.
+        pass
+
+
+class RingBufferSink(Sink):
+
+    """Base class for sinks that play audio from a separate thread.
+
+    Audio delivered by libspotify is copied into a preallocated
+    :class:`RingBuffer` of ``buffer_size`` bytes, which is all that happens on
+    libspotify's audio thread. When the ring is full, only the frames that fit
+    are consumed and libspotify delivers the rest again later.
+
+    The ring is drained in periods of exactly ``period_size`` frames. By
+    default a consumer thread is started by :meth:`on` which passes each
+    period to :meth:`_on_period`. Pass ``consumer_thread=False`` to drain the
+    ring yourself with :meth:`periods` or :meth:`read_into` instead.
+
+    :meth:`periods` starts yielding once a full period is buffered. With a
+    :class:`JitterBuffer`, it holds back until the jitter buffer's target is
+    buffered instead, when audio is first delivered, after every underrun,
+    on :attr:`~PlaybackNotify.Play` and on seeks, and raises the target on
+    underruns during playback. If no more audio arrives for as long as the
+    target, e.g. at the end of the last track, playback starts anyway.
+
+    On seeks and on :attr:`~PlaybackNotify.AudioFlush`, all audio in the ring
+    at that moment is dropped before the next period is read, so the new
+    audio plays right away. Audio delivered after the event is kept. The
+    dropped frames are counted in :attr:`frames_flushed`.
+
+    Each :attr:`~PlaybackNotify.TrackChanged`, seek and
+    :attr:`~PlaybackNotify.AudioFlush` also puts a :class:`TrackMarker` with
+    the :attr:`Metadata.track_uri` of the current track into the stream, at
+    the ring's write position when the event is handled. Events are emitted
+    on another thread than audio is delivered on, so a marker may be off by
+    the audio delivered in between, usually a block of a few milliseconds.
+    ``periods(markers=True)`` yields the markers with the period they fall
+    into, and the consumer thread passes them to :meth:`_on_track_marker`
+    before the period, so consumers can switch per-track state in step with
+    the audio without any locking.
+
+    :param buffer_size: the capacity of the ring buffer in bytes
+    :type buffer_size: int
+    :param period_size: the number of frames in each period
+    :type period_size: int
+    :param consumer_thread: whether :meth:`on` should start a thread calling
+        :meth:`_on_period`
+    :type consumer_thread: bool
+    :param jitter_buffer: the prebuffer policy, or :class:`None` to start
+        playing as soon as a period is buffered
+    :type jitter_buffer: :class:`JitterBuffer` or :class:`None`
+    """
+
+    zero_copy = True
+
+    frames_flushed = 0
+    """The number of accepted frames dropped on seeks and
+    :attr:`~PlaybackNotify.AudioFlush` without being played."""
+
+    def __init__(
+            self, buffer_size=0x10000, period_size=1024,
+            consumer_thread=True, jitter_buffer=None):
+        self._ring = self._create_ring(buffer_size)
+        self._period_size = period_size
+        self._consumer_thread = consumer_thread
+        self._jitter_buffer = jitter_buffer
+        self._thread = None
+        self._running = False
+        self._playing = False
+        self._paused = False
+        self._prebuffer_requested = False
+        # (number of flushes, ring write position), replaced as a whole by
+        # the thread emitting the playback events.
+        self._flush_request = (0, 0)
+        self._flushes_done = 0
+        # (ring position, track URI, reason) of each marker, appended by the
+        # thread emitting the playback events and taken by the consumer.
+        self._markers = collections.deque(maxlen=_MAX_MARKERS)
+        # The marker taken from the deque that falls into a later period, only
+        # used by the consumer.
+        self._next_marker = None
+        self._audio_format = None
+        # Set by the producer while it waits for the audio in the old format
+        # to drain, so the consumer passes on a last partial period.
+        self._format_pending = False
+        self._frames_read = 0
+
+    @property
+    def period_size(self):
+        """The number of frames in each period."""
+        return self._period_size
+
+    @property
+    def jitter_buffer(self):
+        """The :class:`JitterBuffer`, or :class:`None`."""
+        return self._jitter_buffer
+
+    @property
+    def audio_format(self):
+        """The :class:`SampleFormat` of the audio in the ring buffer, or
+        :class:`None` if no audio has been delivered yet."""
+        return self._audio_format
+
+    def _create_ring(self, buffer_size):
+        return spotifyconnect.RingBuffer(buffer_size)
+
+    @property
+    def frames_buffered(self):
+        audio_format = self.audio_format
+        if audio_format is None:
+            return 0
+        return self._ring.readable // audio_format.frame_size
+
+    @property
+    def prebuffer_frames(self):
+        audio_format = self.audio_format
+        if audio_format is None:
+            return self._period_size
+        return self._prebuffer_size(audio_format) // audio_format.frame_size
+
+    def _prebuffer_size(self, audio_format):
+        # The bytes to buffer before playback starts: at least one period,
+        # and never more than fits into the ring.
+        frame_size = audio_format.frame_size
+        size = self._period_size * frame_size
+        if self._jitter_buffer is not None:
+            target = self._jitter_buffer.target_frames(
+                audio_format.sample_rate) * frame_size
+            capacity = self._ring.size - self._ring.size % frame_size
+            size = max(size, min(target, capacity))
+        return size
+
+    def _open(self):
+        player = spotifyconnect._session_instance.player
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._running = True
+        if self._consumer_thread and self._thread is None:
+            self._thread = threading.Thread(
+                target=self._run, name='SpotifyConnectRingBufferSink')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def _close(self):
+        player = spotifyconnect._session_instance.player
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._running = False
+        if self._thread is not None:
+            if self._thread is not threading.current_thread():
+                self._thread.join()
+            self._thread = None
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify == spotifyconnect.PlaybackNotify.Pause:
+            # Running out of audio while paused is expected, and mustn't
+            # raise the jitter buffer's target.
+            self._paused = True
+        elif playback_notify == spotifyconnect.PlaybackNotify.Play:
+            self._paused = False
+            self._prebuffer_requested = True
+        elif playback_notify == spotifyconnect.PlaybackNotify.AudioFlush:
+            self._request_flush()
+            self._add_marker(playback_notify, session)
+        elif playback_notify == spotifyconnect.PlaybackNotify.TrackChanged:
+            self._add_marker(playback_notify, session)
+
+    def _on_playback_seek(self, millis, session):
+        self._request_flush()
+        self._add_marker(spotifyconnect.PlayerEvent.PLAYBACK_SEEK, session)
+
+    def _add_marker(self, reason, session):
+        position = self._ring.write_position
+        try:
+            track_uri = session.player.current_track.track_uri
+        except spotifyconnect.Error:
+            track_uri = None
+        self._markers.append((position, track_uri, reason))
+
+    def _take_markers(self, start, size, frame_size):
+        # Consumer side. Returns the markers before the end of the size bytes
+        # read from ring position start, which were already dropped if
+        # negative. Native ring positions wrap around at 2**32.
+        # The event thread may evict the oldest marker at any time, so each
+        # marker is popped before it is looked at.
+        markers = self._markers
+        result = []
+        while True:
+            marker = self._next_marker
+            if marker is None:
+                if not markers:
+                    break
+                marker = markers.popleft()
+            position, track_uri, reason = marker
+            offset = (position - start) & 0xFFFFFFFF
+            if offset >= 0x80000000:
+                offset = 0
+            elif offset >= size:
+                self._next_marker = marker
+                break
+            self._next_marker = None
+            result.append(spotifyconnect.TrackMarker(
+                offset // frame_size, track_uri, reason))
+        return result or ()
+
+    def _request_flush(self):
+        # Only the consumer may move the ring's read position, so it drops
+        # the audio written up to now, and takes the playing state with it.
+        flushes = self._flush_request[0] + 1
+        self._flush_request = (flushes, self._ring.write_position)
+        self._prebuffer_requested = True
+
+    def _drop_flushed(self):
+        # Consumer side.
+        flushes, position = self._flush_request
+        if flushes == self._flushes_done:
+            return
+        self._flushes_done = flushes
+        dropped = self._ring.skip_to(position)
+        audio_format = self.audio_format
+        if dropped and audio_format is not None:
+            self.frames_flushed += dropped // audio_format.frame_size
+
+    def _write(self, audio_format, frames, num_frames):
+        if audio_format is not self._audio_format:
+            if self._ring.readable:
+                # Let the consumer drain the audio in the old format first.
+                self._format_pending = True
+                return 0
+            self._format_pending = False
+            self._audio_format = audio_format
+        frame_size = audio_format.frame_size
+        written = self._ring.write(frames, align=frame_size)
+        if written < num_frames * frame_size:
+            self.overruns += 1
+        return written // frame_size
+
+    def read_into(self, buffer):
+        """Read as many whole frames as are available and fit into
+        ``buffer``.
+
+        Never blocks. Returns the number of frames read.
+        """
+        self._drop_flushed()
+        audio_format = self.audio_format
+        if audio_format is None:
+            return 0
+        frame_size = audio_format.frame_size
+        num_frames = self._ring.read_into(
+            buffer, align=frame_size) // frame_size
+        self._frames_read += num_frames
+        return num_frames
+
+    def periods(self, markers=False):
+        """Generator yielding ``(audio_format, period)`` pairs.
+
+        ``period`` is a :class:`memoryview` of exactly :attr:`period_size`
+        frames. It is reused for the next period, so copy it if you need to
+        keep it. The generator waits for audio while the ring buffer does not
+        hold a full period, and stops when the sink is turned off. When the
+        audio format changes, the last partial period in the old format is
+        padded with silence.
+
+        If ``markers`` is :class:`True`, it yields ``(audio_format, period,
+        markers)`` instead, where ``markers`` is a sequence of the
+        :class:`TrackMarker` objects in the period, in order. Markers are
+        only reported here, not by :meth:`read_into`.
+        """
+        period = None
+        period_format = None
+        stalled = None
+        while self._running:
+            audio_format = self.audio_format
+            if audio_format is None:
+                time.sleep(0.01)
+                continue
+            if audio_format is not period_format:
+                period_format = audio_format
+                period = memoryview(bytearray(
+                    self._period_size * audio_format.frame_size))
+            self._drop_flushed()
+            if self._prebuffer_requested:
+                self._prebuffer_requested = False
+                self._playing = False
+            readable = self._ring.readable
+            if not self._playing and readable >= len(period):
+                stalled = self._wait_for_prebuffer(
+                    audio_format, readable, stalled)
+                if stalled is not None:
+                    time.sleep(
+                        self._period_size / audio_format.sample_rate / 4)
+                    continue
+            size = len(period)
+            if readable < size and readable and self._format_changing():
+                # The rest of the period would never come, so pad the last
+                # of the old audio with silence.
+                size = readable
+            elif readable < size:
+                if self._playing:
+                    self._playing = False
+                    self.underruns += 1
+                    if self._jitter_buffer is not None and not self._paused:
+                        self._jitter_buffer._on_underrun()
+                stalled = None
+                time.sleep(
+                    self._period_size / audio_format.sample_rate / 4)
+                continue
+            start = self._ring.read_position
+            self._ring.read_into(period[:size])
+            if size < len(period):
+                period[size:] = b'\0' * (len(period) - size)
+            self._frames_read += size // period_format.frame_size
+            self._playing = True
+            if markers:
+                yield period_format, period, self._take_markers(
+                    start, len(period), period_format.frame_size)
+            else:
+                yield period_format, period
+
+    def _format_changing(self):
+        # Consumer side. Whether the producer waits for the ring to drain
+        # before it takes audio in a new format.
+        return self._format_pending
+
+    def _wait_for_prebuffer(self, audio_format, readable, stalled):
+        # Returns None once playback may start, or the (readable, time) the
+        # ring last grew at while there is more to wait for.
+        size = self._prebuffer_size(audio_format)
+        if readable >= size:
+            return None
+        now = _clock()
+        if stalled is None or readable != stalled[0]:
+            return (readable, now)
+        if now - stalled[1] >= size / audio_format.frame_size / (
+                audio_format.sample_rate):
+            # No more audio is coming for now, so play what there is.
+            return None
+        return stalled
+
+    def _run(self):
+        for audio_format, period, markers in self.periods(markers=True):
+            for marker in markers:
+                self._on_track_marker(audio_format, marker)
+            self._on_period(audio_format, period)
+
+    def _on_track_marker(self, audio_format, marker):
+        # This method is called from the consumer thread with each
+        # TrackMarker, right before the period it falls into is passed to
+        # _on_period().
         pass
+
+    def _on_period(self, audio_format, period):
+        # This method is called from the consumer thread with one period of
+        # audio. It may block, e.g. while writing to the audio device.
+        raise NotImplementedError
+
+
+class NativeRingBufferSink(RingBufferSink):
+
+    """Base class for sinks that play audio buffered by native code.
+
+    Works like :class:`RingBufferSink`, but libspotify's audio is written to
+    a :class:`NativeRingBuffer` by C code, so no Python code runs on
+    libspotify's audio thread at all. The GIL is only taken by the consumer,
+    once per period. The ring also reports how much audio it holds back to
+    libspotify with every delivery.
+
+    Only :attr:`SampleType.S16NativeEndian` audio is supported by the native
+    callback.
+    """
+
+    def _create_ring(self, buffer_size):
+        self._sp_audioformat = ffi.new('SpSampleFormat *')
+        return spotifyconnect.NativeRingBuffer(buffer_size)
+
+    @property
+    def overruns(self):
+        return self._ring.overruns
+
+    @property
+    def frames_accepted(self):
+        # Delivery happens in C, so count what has been read back instead.
+        return self._frames_read + self.frames_flushed + self.frames_buffered
+
+    @property
+    def audio_format(self):
+        if not self._ring.get_sample_format(self._sp_audioformat):
+            return None
+        return spotifyconnect.SampleFormat.from_sp_audioformat(
+            self._sp_audioformat)
+
+    @property
+    def _channels(self):
+        audio_format = self.audio_format
+        return 0 if audio_format is None else audio_format.channels
+
+    def _format_changing(self):
+        return self._ring.format_pending
+
+    def periods(self, markers=False):
+        # Audio reaches the native ring without entering Python, so the
+        # player's clock is moved on here instead, once per period.
+        accepted = self._frames_read
+        for item in super(NativeRingBufferSink, self).periods(markers):
+            audio_format = item[0]
+            frames_accepted = self.frames_accepted
+            session = spotifyconnect._session_instance
+            if session is not None:
+                session.player.clock._on_frames(
+                    frames_accepted - accepted, self.frames_buffered,
+                    audio_format.sample_rate)
+            accepted = frames_accepted
+            yield item
+
+    def on(self):
+        player = spotifyconnect._session_instance.player
+        assert player.num_listeners(
+            spotifyconnect.PlayerEvent.MUSIC_DELIVERY) == 0
+        self._open()
+        player.set_native_audio(True)
+
+    def off(self):
+        spotifyconnect._session_instance.player.set_native_audio(False)
+        self._close()
+
+
+class CoalescingSink(Sink):
+
+    """Sink that collects small deliveries into large periods.
+
+    libspotify delivers audio in small blocks. This sink copies them into a
+    preallocated buffer and only passes the audio on once a full period of
+    ``period_size`` frames, or ``period_ms`` milliseconds if given, has been
+    collected. This reduces the number of writes further down the line by an
+    order of magnitude.
+
+    Periods are passed to :meth:`_write_period`, which by default delivers
+    them to ``sink``. ``sink`` must not be turned on itself; it is opened and
+    closed together with this sink.
+
+    When playback is paused and when the track changes, any partial period
+    is passed on right away instead of waiting for the period to fill up, so
+    track markers further down the line fall after it. On seeks and on
+    :attr:`PlaybackNotify.AudioFlush` it is dropped instead, and counted in
+    :attr:`frames_flushed`.
+
+    :param sink: the sink to pass periods on to
+    :type sink: :class:`Sink` or :class:`None`
+    :param period_size: the number of frames in each period
+    :type period_size: int
+    :param period_ms: the length of each period in milliseconds, overrides
+        ``period_size``
+    :type period_ms: float or :class:`None`
+    """
+
+    zero_copy = True
+
+    frames_flushed = 0
+    """The number of accepted frames dropped on seeks and
+    :attr:`~PlaybackNotify.AudioFlush` without being passed on."""
+
+    def __init__(self, sink=None, period_size=4096, period_ms=None):
+        self._sink = sink
+        self._period_size = period_size
+        self._period_ms = period_ms
+        self._lock = threading.Lock()
+        self._audio_format = None
+        self._buffer = None
+        self._fill = 0
+
+    @property
+    def audio_format(self):
+        """The :class:`SampleFormat` of the audio being collected, or
+        :class:`None` if no audio has been delivered yet."""
+        return self._audio_format
+
+    @property
+    def period_size(self):
+        """The number of frames in each period."""
+        return self._period_size
+
+    @property
+    def frames_buffered(self):
+        audio_format = self._audio_format
+        if audio_format is None:
+            num_frames = 0
+        else:
+            num_frames = self._fill // audio_format.frame_size
+        if self._sink is not None:
+            num_frames += self._sink.frames_buffered
+        return num_frames
+
+    def _open(self):
+        player = spotifyconnect._session_instance.player
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        if self._sink is not None:
+            self._sink._open()
+
+    def _close(self):
+        player = spotifyconnect._session_instance.player
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        with self._lock:
+            self._fill = 0
+        if self._sink is not None:
+            self._sink._close()
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify in (
+                spotifyconnect.PlaybackNotify.Pause,
+                spotifyconnect.PlaybackNotify.TrackChanged):
+            self.flush()
+        elif playback_notify == spotifyconnect.PlaybackNotify.AudioFlush:
+            self.drop()
+
+    def _on_playback_seek(self, millis, session):
+        self.drop()
+
+    def flush(self):
+        """Pass any partial period on right away."""
+        with self._lock:
+            self._write_buffer()
+
+    def drop(self):
+        """Drop any partial period without passing it on."""
+        with self._lock:
+            if self._fill:
+                self.frames_flushed += (
+                    self._fill // self._audio_format.frame_size)
+                self._fill = 0
+
+    def _write(self, audio_format, frames, num_frames):
+        # The audio thread must not block, so if the event thread is busy
+        # flushing, nothing is accepted and libspotify delivers again later.
+        if not self._lock.acquire(False):
+            return 0
+        try:
+            if audio_format is not self._audio_format:
+                self._write_buffer()
+                if self._fill:
+                    return 0
+                self._set_audio_format(audio_format)
+            frames = utils.byte_view(frames)
+            frame_size = audio_format.frame_size
+            period_bytes = len(self._buffer)
+            size = num_frames * frame_size
+            offset = 0
+            while offset < size:
+                chunk = min(size - offset, period_bytes - self._fill)
+                if chunk == 0:
+                    break
+                self._buffer[self._fill:self._fill + chunk] = (
+                    frames[offset:offset + chunk])
+                self._fill += chunk
+                offset += chunk
+                if self._fill == period_bytes:
+                    self._write_buffer()
+            return offset // frame_size
+        finally:
+            self._lock.release()
+
+    def _set_audio_format(self, audio_format):
+        period_size = self._period_size
+        if self._period_ms is not None:
+            period_size = int(round(
+                self._period_ms * audio_format.sample_rate / 1000)) or 1
+        self._period_size = period_size
+        self._buffer = memoryview(
+            bytearray(period_size * audio_format.frame_size))
+        self._audio_format = audio_format
+
+    def _write_buffer(self):
+        # Must be called with the lock held.
+        audio_format = self._audio_format
+        if not self._fill:
+            return
+        frame_size = audio_format.frame_size
+        num_frames_consumed = self._write_period(
+            audio_format, self._buffer[:self._fill], self._fill // frame_size)
+        consumed = num_frames_consumed * frame_size
+        if consumed < self._fill:
+            # Keep what could not be passed on for the next attempt.
+            self._buffer[:self._fill - consumed] = (
+                self._buffer[consumed:self._fill])
+        self._fill -= consumed
+
+    def _write_period(self, audio_format, period, num_frames):
+        # This method is called with a full period from an internal
+        # libspotify thread, or with a partial period from the thread
+        # emitting the playback events. It must not block in any way, and must
+        # return the number of frames consumed.
+        if self._sink is None:
+            raise NotImplementedError
+        return self._sink._on_music_delivery(
+            audio_format, period, num_frames, None,
+            spotifyconnect._session_instance)
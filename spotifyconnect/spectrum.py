@@ -0,0 +1,294 @@
+from __future__ import division, unicode_literals
+
+import time
+
+import spotifyconnect
+from spotifyconnect import ffi, lib, utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'SpectrumAnalyzer',
+    'SpectrumReader',
+]
+
+
+# Sample types the stage supports.
+_SAMPLE_TYPES = (
+    spotifyconnect.SampleType.S16NativeEndian,
+    spotifyconnect.SampleType.S24NativeEndian,
+    spotifyconnect.SampleType.S32NativeEndian,
+    spotifyconnect.SampleType.Float32NativeEndian,
+)
+
+# Layout of the shared memory block: a uint32 sequence counter and padding,
+# a uint32 band count, a float64 reader heartbeat, then float32 band levels
+# in dB and the band edges in Hz.
+_SEQUENCE = 0
+_BANDS = 8
+_HEARTBEAT = 16
+_HEADER_SIZE = 24
+
+# Band levels are floored at -120 dB, so silence has a finite level.
+_MIN_POWER = 1e-12
+
+# Names of the shared memory blocks created by this process.
+_created = set()
+
+
+def _get_shared_memory():
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError(
+            'This feature requires multiprocessing.shared_memory, which is '
+            'available from Python 3.8')
+    return shared_memory
+
+
+def _views(numpy, buf, bands):
+    # NumPy views of the fields of a shared memory block.
+    sequence = numpy.ndarray(1, 'uint32', buf, _SEQUENCE)
+    heartbeat = numpy.ndarray(1, 'float64', buf, _HEARTBEAT)
+    levels = numpy.ndarray(bands, 'float32', buf, _HEADER_SIZE)
+    edges = numpy.ndarray(bands + 1, 'float32', buf, _HEADER_SIZE + 4 * bands)
+    return sequence, heartbeat, levels, edges
+
+
+class SpectrumAnalyzer(Stage):
+
+    """A :class:`Stage` that publishes the spectrum of the audio to other
+    processes.
+
+    ``rate`` times per second of audio, the last ``fft_size`` frames are
+    mixed to mono, Hann windowed and transformed with NumPy's FFT. The power
+    is summed into ``bands`` bands spaced logarithmically from
+    ``min_frequency`` to ``max_frequency`` Hz, and the band levels are
+    written in dB, where 0 dB is a full-scale sine, to a
+    :mod:`multiprocessing.shared_memory` block named :attr:`name`.
+
+    Other processes read the bands with a :class:`SpectrumReader`. The
+    block is guarded by a sequence counter that is odd while the bands are
+    written, updated with memory barriers in native code, so readers never
+    lock or unpickle anything. Readers also write a heartbeat to the block,
+    and while no reader has polled for ``reader_timeout`` seconds the
+    analyzer does nothing at all. The audio is passed on unchanged, without
+    being copied.
+
+    Bands narrower than the FFT's frequency resolution may hold no bins at
+    all, and stay at the -120 dB floor.
+
+    The shared memory is released by :meth:`close`. Supports all sample
+    types except :attr:`~SampleType.S24_3LE`. Requires NumPy and Python 3.8.
+
+    :param bands: the number of bands
+    :type bands: int
+    :param name: the name of the shared memory block, or :class:`None` for a
+        unique name
+    :type name: string or :class:`None`
+    :param rate: how many times per second the spectrum is computed
+    :type rate: float
+    :param fft_size: the number of frames in each FFT
+    :type fft_size: int
+    :param min_frequency: the lower edge of the lowest band in Hz
+    :type min_frequency: float
+    :param max_frequency: the upper edge of the highest band in Hz
+    :type max_frequency: float
+    :param reader_timeout: seconds without readers before analysis stops
+    :type reader_timeout: float
+    """
+
+    reads_only = True
+
+    def __init__(
+            self, bands=16, name=None, rate=30, fft_size=2048,
+            min_frequency=40.0, max_frequency=16000.0, reader_timeout=1.0):
+        shared_memory = _get_shared_memory()
+        self._numpy = numpy = utils.get_numpy()
+        self._num_bands = bands
+        self._rate = rate
+        self._fft_size = fft_size
+        self._reader_timeout = reader_timeout
+        self._memory = shared_memory.SharedMemory(
+            name=name, create=True, size=_HEADER_SIZE + 8 * bands + 4)
+        self._sequence, self._heartbeat, self._levels, self._edges = _views(
+            numpy, self._memory.buf, bands)
+        _created.add(self._memory.name)
+        numpy.ndarray(1, 'uint32', self._memory.buf, _BANDS)[0] = bands
+        self._edges[:] = numpy.geomspace(
+            min_frequency, max_frequency, bands + 1)
+        self._window = numpy.hanning(fft_size).astype('float32')
+        # Scales the power so that a full-scale sine has a peak of 1.
+        self._power_scale = (2 / self._window.sum()) ** 2
+        self._sample_rate = None
+        self._capacity = 0
+        self._count = 0
+
+    @property
+    def name(self):
+        """The name of the shared memory block to read the bands from."""
+        return self._memory.name
+
+    @property
+    def frequencies(self):
+        """The edges of the bands in Hz, one more than there are bands."""
+        return self._edges.tolist()
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type not in _SAMPLE_TYPES:
+            raise ValueError('Unsupported sample type: %d' % sample_type)
+        numpy = self._numpy
+        self._scale = 1 / (audio_format.full_scale * audio_format.channels)
+        if audio_format.sample_rate != self._sample_rate:
+            self._sample_rate = audio_format.sample_rate
+            self._interval = max(
+                1, int(audio_format.sample_rate / self._rate))
+            # The first FFT bin of each band, the lowest bin of a band being
+            # at or above the lower edge.
+            frequencies = numpy.fft.rfftfreq(
+                self._fft_size, 1 / audio_format.sample_rate)
+            bins = numpy.searchsorted(frequencies, self._edges)
+            bins = numpy.clip(bins, 1, len(frequencies) - 1)
+            self._first_bin = int(bins[0])
+            self._last_bin = int(max(bins[-1], bins[0] + 1))
+            # Narrow bands can fall between two bins. reduceat() can't sum
+            # an empty range, so those bands are zeroed after summing.
+            starts = bins[:-1] - self._first_bin
+            ends = numpy.append(starts[1:], self._last_bin - self._first_bin)
+            self._empty = starts >= ends
+            self._starts = numpy.minimum(
+                starts, self._last_bin - self._first_bin - 1)
+            self._power = numpy.empty(len(frequencies), dtype='float64')
+            self._imaginary = numpy.empty(len(frequencies), dtype='float64')
+        self._capacity = 0
+        self.reset()
+        return audio_format
+
+    def reset(self):
+        self._count = 0
+        if self._capacity:
+            self._work[:self._fft_size] = 0
+
+    def process(self, audio_format, frames, out):
+        if time.time() - self._heartbeat[0] > self._reader_timeout:
+            return frames
+        numpy = self._numpy
+        num_frames = len(frames)
+        if num_frames > self._capacity:
+            self._allocate(num_frames)
+        fft_size = self._fft_size
+        work = self._work
+        mono = work[fft_size:fft_size + num_frames]
+        numpy.sum(frames, axis=1, dtype='float32', out=mono)
+        numpy.multiply(mono, self._scale, out=mono)
+
+        offset = 0
+        while offset < num_frames:
+            count = min(num_frames - offset, self._interval - self._count)
+            self._count += count
+            offset += count
+            if self._count == self._interval:
+                self._count = 0
+                self._analyze(work[offset:offset + fft_size])
+        # Keep the last frames for the next FFT.
+        work[:fft_size] = work[num_frames:num_frames + fft_size]
+        return frames
+
+    def close(self):
+        """Release and remove the shared memory block."""
+        del self._sequence, self._heartbeat, self._levels, self._edges
+        self._memory.close()
+        self._memory.unlink()
+        _created.discard(self._memory.name)
+
+    def _analyze(self, samples):
+        numpy = self._numpy
+        windowed = self._windowed
+        numpy.multiply(samples, self._window, out=windowed)
+        spectrum = numpy.fft.rfft(windowed)
+        power, imaginary = self._power, self._imaginary
+        numpy.multiply(spectrum.real, spectrum.real, out=power)
+        numpy.multiply(spectrum.imag, spectrum.imag, out=imaginary)
+        numpy.add(power, imaginary, out=power)
+        bands = self._bands
+        numpy.add.reduceat(
+            power[self._first_bin:self._last_bin], self._starts, out=bands)
+        numpy.copyto(bands, 0, where=self._empty)
+        numpy.multiply(bands, self._power_scale, out=bands)
+        numpy.maximum(bands, _MIN_POWER, out=bands)
+        numpy.log10(bands, out=bands)
+        numpy.multiply(bands, 10, out=bands)
+        lib.spc_spectrum_publish(
+            ffi.cast('uint32_t *', ffi.from_buffer(self._sequence)),
+            ffi.cast('float *', ffi.from_buffer(self._levels)),
+            ffi.cast('double *', ffi.from_buffer(bands)), self._num_bands)
+
+    def _allocate(self, num_frames):
+        numpy = self._numpy
+        fft_size = self._fft_size
+        history = None
+        if self._capacity:
+            history = self._work[:fft_size].copy()
+        self._work = numpy.zeros(fft_size + num_frames, dtype='float32')
+        if history is not None:
+            self._work[:fft_size] = history
+        self._windowed = numpy.empty(fft_size, dtype='float32')
+        self._bands = numpy.empty(self._num_bands, dtype='float64')
+        self._capacity = num_frames
+
+
+class SpectrumReader(object):
+
+    """Reads the bands published by a :class:`SpectrumAnalyzer`, usually in
+    another process.
+
+    Every :meth:`read` tells the analyzer a reader is attached, so poll at
+    least once per ``reader_timeout`` of the analyzer to keep the bands
+    updated. Requires NumPy and Python 3.8.
+
+    :param name: the :attr:`SpectrumAnalyzer.name` of the analyzer
+    :type name: string
+    """
+
+    def __init__(self, name):
+        shared_memory = _get_shared_memory()
+        numpy = utils.get_numpy()
+        try:
+            self._memory = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Before Python 3.13, attaching registers the block with the
+            # resource tracker, which would remove it when this process
+            # exits. Blocks created by this process are registered anyway.
+            from multiprocessing import resource_tracker
+            self._memory = shared_memory.SharedMemory(name=name)
+            if self._memory.name not in _created:
+                resource_tracker.unregister(
+                    self._memory._name, 'shared_memory')
+        bands = int(numpy.ndarray(1, 'uint32', self._memory.buf, _BANDS)[0])
+        self._sequence, self._heartbeat, self._levels, self._edges = _views(
+            numpy, self._memory.buf, bands)
+        self._heartbeat[0] = time.time()
+        self._copy = numpy.empty(bands, dtype='float32')
+
+    @property
+    def frequencies(self):
+        """The edges of the bands in Hz, one more than there are bands."""
+        return self._edges.tolist()
+
+    def read(self):
+        """Returns the sequence number and a list of the band levels in dB.
+
+        The sequence number increases every time the analyzer publishes new
+        bands, and is 0 until the first bands are published.
+        """
+        self._heartbeat[0] = time.time()
+        sequence = lib.spc_spectrum_read(
+            ffi.cast('uint32_t *', ffi.from_buffer(self._sequence)),
+            ffi.cast('float *', ffi.from_buffer(self._levels)),
+            ffi.cast('float *', ffi.from_buffer(self._copy)), len(self._copy))
+        return sequence, self._copy.tolist()
+
+    def close(self):
+        """Detach from the shared memory block."""
+        del self._sequence, self._heartbeat, self._levels, self._edges
+        self._memory.close()
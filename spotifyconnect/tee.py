@@ -0,0 +1,254 @@
+from __future__ import division, unicode_literals
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.sink import Sink
+
+__all__ = [
+    'BranchPolicy',
+    'TeeBranch',
+    'TeeSink',
+]
+
+
+class BranchPolicy(utils.IntEnum):
+
+    """What a :class:`TeeBranch` does when its buffer is full.
+
+    ``BACKPRESSURE`` makes the :class:`TeeSink` accept less audio, so
+    libspotify delivers it again later and no audio is lost. ``DROP``
+    discards the oldest audio in the branch's buffer to make room, so the
+    branch never holds back the others.
+    """
+    pass
+
+
+BranchPolicy.add('BACKPRESSURE', 0)
+BranchPolicy.add('DROP', 1)
+
+
+class TeeBranch(object):
+
+    """A sink fed by a :class:`TeeSink`, with its own buffer and policy.
+
+    ``sink`` must not be turned on itself; it is opened and closed together
+    with the tee.
+
+    :param sink: the sink to pass the audio on to
+    :type sink: :class:`Sink`
+    :param buffer_frames: the most frames kept for ``sink`` while it doesn't
+        accept them
+    :type buffer_frames: int
+    :param policy: what to do when the buffer is full
+    :type policy: :class:`BranchPolicy`
+    """
+
+    def __init__(
+            self, sink, buffer_frames=8192,
+            policy=BranchPolicy.BACKPRESSURE):
+        self.sink = sink
+        self.buffer_frames = buffer_frames
+        self.policy = BranchPolicy(policy)
+        self.overruns = 0
+        self.frames_dropped = 0
+        # Position in the tee's ring, in bytes since the ring was created, of
+        # the first byte not yet accepted by ``sink``.
+        self._cursor = 0
+        self._lag = 0
+
+    def __repr__(self):
+        return 'TeeBranch(%r, %d, %r)' % (
+            self.sink, self.buffer_frames, self.policy)
+
+    @property
+    def frames_buffered(self):
+        """The number of frames kept for the sink, not counting the sink's
+        own buffers."""
+        return self._lag
+
+
+class TeeSink(Sink):
+
+    """Sink that passes the same audio on to several sinks.
+
+    libspotify only delivers audio to a single sink, so e.g. playing to a
+    local DAC and a network stream at the same time needs a tee::
+
+        TeeSink([
+            TeeBranch(dac_sink, policy=BranchPolicy.BACKPRESSURE),
+            TeeBranch(stream_sink, policy=BranchPolicy.DROP),
+        ])
+
+    Each delivery is offered to the branches that are caught up straight
+    from libspotify's memory. Audio a branch doesn't accept is copied once
+    into a ring shared by all branches, where each branch keeps its own
+    position and gets the rest later, up to its ``buffer_frames``. Branches
+    only ever get read-only views of the audio, so nothing is copied per
+    branch. The tee accepts as much as all ``BACKPRESSURE`` branches have
+    room for, so at least one branch should use it to pace libspotify.
+    Nothing on the audio thread ever blocks.
+
+    On seeks and on :attr:`PlaybackNotify.AudioFlush`, the audio kept for the
+    branches is dropped before the next audio is passed on.
+
+    :param branches: the branches to pass the audio on to
+    :type branches: list of :class:`TeeBranch`
+    """
+
+    zero_copy = True
+
+    def __init__(self, branches):
+        self._branches = list(branches)
+        self._backpressure = [
+            branch for branch in self._branches
+            if branch.policy == BranchPolicy.BACKPRESSURE]
+        self._audio_format = None
+        self._ring = None
+        self._ring_size = 0
+        self._write_pos = 0
+        self._drop_requested = False
+
+    @property
+    def branches(self):
+        """The branches of the tee."""
+        return list(self._branches)
+
+    @property
+    def frames_buffered(self):
+        # Reported to libspotify, so only the branches pacing it count.
+        branches = self._backpressure or self._branches
+        return max([0] + [
+            branch._lag + branch.sink.frames_buffered
+            for branch in branches])
+
+    def _open(self):
+        player = spotifyconnect._session_instance.player
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        for branch in self._branches:
+            branch.sink._open()
+
+    def _close(self):
+        for branch in self._branches:
+            branch.sink._close()
+        player = spotifyconnect._session_instance.player
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self._on_playback_notify)
+        player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK, self._on_playback_seek)
+        self._drop_buffers()
+
+    def _on_playback_notify(self, playback_notify, session):
+        if playback_notify == spotifyconnect.PlaybackNotify.AudioFlush:
+            self._drop_requested = True
+
+    def _on_playback_seek(self, millis, session):
+        # Applied by the audio thread, which owns the branches' positions.
+        self._drop_requested = True
+
+    def _write(self, audio_format, frames, num_frames):
+        if self._drop_requested:
+            self._drop_requested = False
+            self._drop_buffers()
+        if audio_format is not self._audio_format:
+            self._write_buffers()
+            if any(branch._lag for branch in self._backpressure):
+                # Let the branches take the audio in the old format first.
+                return 0
+            self._set_audio_format(audio_format)
+        else:
+            self._write_buffers()
+
+        frame_size = audio_format.frame_size
+        num_frames_accepted = min(
+            [num_frames, self._ring_size // frame_size] + [
+                branch.buffer_frames - branch._lag
+                for branch in self._backpressure])
+        if num_frames_accepted < num_frames:
+            self.overruns += 1
+        num_frames = num_frames_accepted
+        if num_frames <= 0:
+            return 0
+        data = utils.byte_view(frames)[:num_frames * frame_size]
+        end = self._write_pos + len(data)
+
+        # Branches that are caught up take the audio straight from
+        # libspotify's memory. Whatever any branch doesn't take is kept in
+        # the ring.
+        keep = len(data)
+        for branch in self._branches:
+            if branch._cursor == self._write_pos:
+                consumed = self._deliver(branch, data, num_frames)
+                branch._cursor += consumed * frame_size
+                keep = min(keep, consumed * frame_size)
+            else:
+                keep = 0
+        if keep < len(data):
+            self._copy_in(self._write_pos + keep, data[keep:])
+        self._write_pos = end
+
+        for branch in self._branches:
+            lag = end - branch._cursor
+            excess = lag - branch.buffer_frames * frame_size
+            if excess > 0:
+                # Only DROP branches can get here, make room by skipping
+                # their oldest audio.
+                branch._cursor += excess
+                branch.frames_dropped += excess // frame_size
+                branch.overruns += 1
+                lag -= excess
+            branch._lag = lag // frame_size
+        return num_frames
+
+    def _set_audio_format(self, audio_format):
+        frame_size = audio_format.frame_size
+        size = max(
+            [1] + [branch.buffer_frames for branch in self._branches])
+        self._ring_size = size * frame_size
+        self._ring = memoryview(bytearray(self._ring_size))
+        self._audio_format = audio_format
+        self._drop_buffers()
+
+    def _drop_buffers(self):
+        for branch in self._branches:
+            branch._cursor = self._write_pos
+            branch._lag = 0
+
+    def _copy_in(self, position, data):
+        start = position % self._ring_size
+        first = min(len(data), self._ring_size - start)
+        self._ring[start:start + first] = data[:first]
+        if len(data) > first:
+            self._ring[:len(data) - first] = data[first:]
+
+    def _write_buffers(self):
+        # Offer each branch the audio kept for it, in at most two parts as
+        # the ring wraps around.
+        audio_format = self._audio_format
+        if audio_format is None:
+            return
+        frame_size = audio_format.frame_size
+        for branch in self._branches:
+            while branch._cursor < self._write_pos:
+                start = branch._cursor % self._ring_size
+                size = min(
+                    self._write_pos - branch._cursor, self._ring_size - start)
+                num_frames = size // frame_size
+                consumed = self._deliver(
+                    branch, self._ring[start:start + size], num_frames)
+                branch._cursor += consumed * frame_size
+                if consumed < num_frames:
+                    break
+            branch._lag = (self._write_pos - branch._cursor) // frame_size
+
+    def _deliver(self, branch, data, num_frames):
+        sink = branch.sink
+        if not (sink.zero_copy or sink.numpy_frames):
+            data = data.tobytes()
+        return sink._on_music_delivery(
+            self._audio_format, data, num_frames, None,
+            spotifyconnect._session_instance)
@@ -2,6 +2,7 @@ from __future__ import unicode_literals
 
 import collections
 import sys
+import time
 
 from spotifyconnect import ffi, lib, serialized
 
@@ -18,6 +19,49 @@ else:
     binary_type = bytes
 
 
+# Clocks for measuring intervals, with fallbacks for Python 2.
+monotonic = getattr(time, 'monotonic', time.time)
+perf_counter = getattr(time, 'perf_counter', time.time)
+
+
+_numpy = None
+
+
+def get_numpy():
+    """Import and return :mod:`numpy`.
+
+    NumPy is an optional dependency, only needed by the audio processing
+    features, so it is imported lazily the first time one of those is used.
+    Raises :exc:`ImportError` if NumPy isn't installed.
+    """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                'This feature requires NumPy, install it with: '
+                'pip install numpy')
+        _numpy = numpy
+    return _numpy
+
+
+def byte_view(data):
+    """Get a flat :class:`memoryview` of the bytes in ``data``.
+
+    ``data`` may be any C-contiguous object supporting the buffer protocol,
+    including multi-dimensional NumPy arrays.
+    """
+    view = memoryview(data)
+    if view.ndim != 1 or view.itemsize != 1:
+        if PY2:
+            # memoryview.cast() is only available on Python 3.
+            view = memoryview(ffi.buffer(ffi.from_buffer(data)))
+        else:
+            view = view.cast('B')
+    return view
+
+
 class EventEmitter(object):
 
     """Mixin for adding event emitter functionality to a class."""
@@ -0,0 +1,224 @@
+from __future__ import division, unicode_literals
+
+import spotifyconnect
+from spotifyconnect import utils
+from spotifyconnect.pipeline import Stage
+
+__all__ = [
+    'SoftwareVolume',
+    'VolumeCurve',
+]
+
+
+class VolumeCurve(utils.IntEnum):
+
+    """How the 0-100 volume from Spotify is mapped to a gain.
+
+    ``LINEAR`` uses the volume as the gain. ``DB`` spreads the volume
+    linearly over a range of decibels, so each step sounds about equally
+    loud. ``CUBIC`` uses the cube of the volume, which is close to ``DB`` at
+    the top of the range but reaches silence smoothly.
+    """
+    pass
+
+
+VolumeCurve.add('LINEAR', 0)
+VolumeCurve.add('DB', 1)
+VolumeCurve.add('CUBIC', 2)
+
+
+# Gains are Q15 fixed-point numbers, i.e. integers where 1 << 15 is unity.
+# Multiplying an int16 sample by a Q15 gain never overflows an int32.
+_GAIN_BITS = 15
+_UNITY = 1 << _GAIN_BITS
+
+# Number of gain table entries per volume percent.
+_TABLE_STEPS = 10
+
+
+def _gain_table(curve, db_range):
+    numpy = utils.get_numpy()
+    volume = numpy.linspace(0.0, 1.0, 100 * _TABLE_STEPS + 1)
+    if curve == VolumeCurve.LINEAR:
+        gain = volume
+    elif curve == VolumeCurve.DB:
+        gain = 10 ** ((volume - 1) * db_range / 20)
+    elif curve == VolumeCurve.CUBIC:
+        gain = volume ** 3
+    else:
+        raise ValueError('Unknown volume curve: %d' % curve)
+    table = numpy.rint(gain * _UNITY).astype('int32')
+    table[0] = 0
+    return table
+
+
+class SoftwareVolume(Stage):
+
+    """Apply Spotify's volume to 16-bit audio in software.
+
+    libspotify only reports volume changes through
+    :attr:`PlayerEvent.PLAYBACK_VOLUME`, it never changes the audio it
+    delivers. Devices without a hardware mixer can use this class to scale
+    the audio instead. Add it to a :class:`Pipeline` to follow the volume set
+    from Spotify, or call :meth:`on` and pass each block of audio through
+    :meth:`process` yourself.
+
+    Gains for the selected ``curve`` are precomputed for every tenth of a
+    percent and applied with fixed-point NumPy operations, so processing
+    never leaves C code for a block. At full volume the audio is left
+    untouched. When the volume changes the gain ramps to its new value over
+    ``ramp_ms`` milliseconds to avoid clicks.
+
+    Requires NumPy.
+
+    :param curve: how the volume is mapped to a gain
+    :type curve: :class:`VolumeCurve`
+    :param ramp_ms: how long a volume change takes, 0 to change immediately
+    :type ramp_ms: int
+    :param db_range: the range of the ``DB`` curve in decibels
+    :type db_range: float
+    :param volume: the initial volume in the range 0-100
+    :type volume: float
+    """
+
+    def __init__(
+            self, curve=VolumeCurve.CUBIC, ramp_ms=10, db_range=60.0,
+            volume=100.0):
+        self._numpy = utils.get_numpy()
+        self._curve = VolumeCurve(curve)
+        self._table = _gain_table(self._curve, db_range)
+        self._ramp_ms = ramp_ms
+        self._scratch = self._numpy.empty(0, dtype='int32')
+        self.volume = volume
+        # The gain is only ever changed by the audio thread, which ramps it
+        # towards the target set by the volume setter.
+        self._gain = self._target
+        self._ramp_from = self._ramp_to = self._target
+        self._ramp_pos = self._ramp_len = 0
+
+    @property
+    def curve(self):
+        """The :class:`VolumeCurve` used to map volume to gain."""
+        return self._curve
+
+    @property
+    def volume(self):
+        """The volume in the range 0-100.
+
+        Can be set from any thread. The new volume is picked up by the next
+        call to :meth:`process`.
+        """
+        return self._volume
+
+    @volume.setter
+    def volume(self, value):
+        value = min(max(value, 0.0), 100.0)
+        self._volume = value
+        self._target = int(self._table[int(round(value * _TABLE_STEPS))])
+
+    @property
+    def gain(self):
+        """The gain currently applied to the audio, in the range 0-1."""
+        return self._gain / _UNITY
+
+    def on(self):
+        """Follow the volume set from Spotify.
+
+        Connects to the :attr:`PlayerEvent.PLAYBACK_VOLUME` event.
+        """
+        spotifyconnect._session_instance.player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_VOLUME,
+            self._on_playback_volume)
+
+    def off(self):
+        """Stop following the volume set from Spotify."""
+        spotifyconnect._session_instance.player.off(
+            spotifyconnect.PlayerEvent.PLAYBACK_VOLUME,
+            self._on_playback_volume)
+
+    def negotiate(self, audio_format):
+        sample_type = audio_format.sample_type
+        if sample_type != spotifyconnect.SampleType.S16NativeEndian:
+            raise ValueError(
+                'Unsupported sample type: %d' % sample_type)
+        return audio_format
+
+    def process(self, audio_format, frames, out=None):
+        """Apply the volume to ``frames`` in place.
+
+        ``frames`` must be a writable ``(num_frames, channels)`` int16 NumPy
+        array. Returns ``frames``.
+        """
+        self.negotiate(audio_format)
+        if len(frames) == 0:
+            return frames
+        target = self._target
+        if target != self._ramp_to:
+            # Start a new ramp from wherever the previous one got to.
+            self._ramp_from = self._gain
+            self._ramp_to = target
+            self._ramp_len = self._ramp_ms * audio_format.sample_rate // 1000
+            self._ramp_pos = 0
+            if self._ramp_len == 0:
+                self._gain = target
+        start = 0
+        if self._ramp_pos < self._ramp_len:
+            start = min(len(frames), self._ramp_len - self._ramp_pos)
+            self._apply_ramp(frames[:start])
+        if start < len(frames):
+            self._apply_gain(frames[start:], self._gain)
+        return frames
+
+    def reset(self):
+        """Jump to the target gain, finishing any ramp in progress."""
+        self._gain = self._ramp_from = self._ramp_to = self._target
+        self._ramp_pos = self._ramp_len = 0
+
+    def _open(self):
+        self.on()
+
+    def _close(self):
+        self.off()
+
+    def _apply_gain(self, frames, gain):
+        if gain == _UNITY:
+            return
+        if gain == 0:
+            frames.fill(0)
+            return
+        numpy = self._numpy
+        scratch = self._get_scratch(frames.shape)
+        numpy.multiply(frames, numpy.int32(gain), out=scratch)
+        self._store(frames, scratch)
+
+    def _apply_ramp(self, frames):
+        numpy = self._numpy
+        num_frames = len(frames)
+        steps = numpy.arange(
+            self._ramp_pos + 1, self._ramp_pos + num_frames + 1,
+            dtype='int64')
+        gains = (
+            self._ramp_from +
+            (self._ramp_to - self._ramp_from) * steps // self._ramp_len)
+        scratch = self._get_scratch(frames.shape)
+        numpy.multiply(
+            frames, gains.astype('int32')[:, None], out=scratch)
+        self._store(frames, scratch)
+        self._ramp_pos += num_frames
+        self._gain = int(gains[-1])
+
+    def _store(self, frames, scratch):
+        # Round the Q15 products to the nearest integer and narrow them back
+        # to int16. As the gain is never above unity, nothing can clip.
+        scratch += 1 << (_GAIN_BITS - 1)
+        self._numpy.right_shift(scratch, _GAIN_BITS, out=scratch)
+        self._numpy.copyto(frames, scratch, casting='unsafe')
+
+    def _get_scratch(self, shape):
+        size = shape[0] * shape[1]
+        if len(self._scratch) < size:
+            self._scratch = self._numpy.empty(size, dtype='int32')
+        return self._scratch[:size].reshape(shape)
+
+    def _on_playback_volume(self, volume, session):
+        self.volume = volume
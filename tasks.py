@@ -1,5 +1,6 @@
 from __future__ import unicode_literals
 
+import glob
 import sys
 
 from invoke import run, task
@@ -15,6 +16,19 @@ def test(coverage=False, watch=False, warn=False):
     run(cmd, pty=True, warn=warn)
 
 
+@task
+def benchmark(name=None):
+    if name is None:
+        names = sorted(
+            path[len('benchmarks/'):-len('.py')]
+            for path in glob.glob('benchmarks/*.py'))
+    else:
+        names = [name]
+    for name in names:
+        # Run against the source tree, even if the package isn't installed.
+        run('PYTHONPATH=. python benchmarks/%s.py' % name, pty=True)
+
+
 @task
 def preprocess_header():
     run(
@@ -4,6 +4,8 @@ import unittest
 
 import spotifyconnect
 
+from tests import mock
+
 
 class AudioBufferStatsTest(unittest.TestCase):
 
@@ -17,6 +19,33 @@ class AudioBufferStatsTest(unittest.TestCase):
 
         self.assertEqual(stats.stutter, 5)
 
+    def test_overruns(self):
+        stats = spotifyconnect.AudioBufferStats(100, 5, 3)
+
+        self.assertEqual(stats.overruns, 3)
+
+    def test_overruns_defaults_to_zero(self):
+        stats = spotifyconnect.AudioBufferStats(100, 5)
+
+        self.assertEqual(stats.overruns, 0)
+
+    def test_target_defaults_to_zero(self):
+        stats = spotifyconnect.AudioBufferStats(100, 5)
+
+        self.assertEqual(stats.target, 0)
+
+
+class TrackMarkerTest(unittest.TestCase):
+
+    def test_fields(self):
+        marker = spotifyconnect.TrackMarker(
+            10, 'spotify:track:a', spotifyconnect.PlaybackNotify.TrackChanged)
+
+        self.assertEqual(marker.offset, 10)
+        self.assertEqual(marker.track_uri, 'spotify:track:a')
+        self.assertEqual(
+            marker.reason, spotifyconnect.PlaybackNotify.TrackChanged)
+
 
 class AudioFormatTest(unittest.TestCase):
 
@@ -53,6 +82,19 @@ class AudioFormatTest(unittest.TestCase):
         # INT16 means 16 bits aka 2 bytes per channel
         self.assertEqual(self.audio_format.sample_size, 2)
 
+    def test_sizes_of_converted_sample_types(self):
+        expected = [
+            (spotifyconnect.SampleType.S24NativeEndian, 4),
+            (spotifyconnect.SampleType.S24_3LE, 3),
+            (spotifyconnect.SampleType.S32NativeEndian, 4),
+            (spotifyconnect.SampleType.Float32NativeEndian, 4),
+        ]
+        for sample_type, sample_size in expected:
+            self._sp_audioformat.sample_type = sample_type
+
+            self.assertEqual(self.audio_format.sample_size, sample_size)
+            self.assertEqual(self.audio_format.frame_size, 2 * sample_size)
+
     def test_sample_size_fails_if_sample_type_is_unknown(self):
         self._sp_audioformat.sample_type = 666
 
@@ -68,7 +110,157 @@ class BitrateTest(unittest.TestCase):
         self.assertEqual(spotifyconnect.Bitrate.BITRATE_320k, 2)
 
 
+class SampleFormatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sample_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def test_sample_type(self):
+        self.assertIs(
+            self.sample_format.sample_type,
+            spotifyconnect.SampleType.S16NativeEndian)
+
+    def test_sample_rate(self):
+        self.assertEqual(self.sample_format.sample_rate, 44100)
+
+    def test_channels(self):
+        self.assertEqual(self.sample_format.channels, 2)
+
+    def test_frame_size(self):
+        self.assertEqual(self.sample_format.frame_size, 4)
+
+    def test_sample_size(self):
+        self.assertEqual(self.sample_format.sample_size, 2)
+
+    def test_dtype(self):
+        self.assertEqual(self.sample_format.dtype, 'int16')
+
+    def test_converted_sample_types(self):
+        expected = [
+            (spotifyconnect.SampleType.S24NativeEndian, 4, 'int32'),
+            (spotifyconnect.SampleType.S24_3LE, 3, 'V3'),
+            (spotifyconnect.SampleType.S32NativeEndian, 4, 'int32'),
+            (spotifyconnect.SampleType.Float32NativeEndian, 4, 'float32'),
+        ]
+        for sample_type, sample_size, dtype in expected:
+            sample_format = spotifyconnect.SampleFormat(
+                2, sample_type, 48000)
+
+            self.assertEqual(sample_format.sample_size, sample_size)
+            self.assertEqual(sample_format.frame_size, 2 * sample_size)
+            self.assertEqual(sample_format.dtype, dtype)
+
+    def test_full_scale(self):
+        expected = [
+            (spotifyconnect.SampleType.S16NativeEndian, 32768.0),
+            (spotifyconnect.SampleType.S24NativeEndian, 8388608.0),
+            (spotifyconnect.SampleType.S24_3LE, 8388608.0),
+            (spotifyconnect.SampleType.S32NativeEndian, 2147483648.0),
+            (spotifyconnect.SampleType.Float32NativeEndian, 1.0),
+        ]
+        for sample_type, full_scale in expected:
+            sample_format = spotifyconnect.SampleFormat(
+                2, sample_type, 48000)
+
+            self.assertEqual(sample_format.full_scale, full_scale)
+
+    def test_is_interned(self):
+        self.assertIs(
+            spotifyconnect.SampleFormat(2, 0, 44100), self.sample_format)
+
+    def test_has_no_instance_dict(self):
+        with self.assertRaises(AttributeError):
+            self.sample_format.foo = 1
+
+    def test_fails_if_sample_type_is_unknown(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.SampleFormat(2, 666, 44100)
+
+    def test_from_sp_audioformat(self):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+        sp_audioformat.sample_rate = 44100
+        sp_audioformat.channels = 2
+
+        self.assertIs(
+            spotifyconnect.SampleFormat.from_sp_audioformat(sp_audioformat),
+            self.sample_format)
+
+    def test_from_audio_format(self):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+        sp_audioformat.sample_rate = 44100
+        sp_audioformat.channels = 2
+        audio_format = spotifyconnect.AudioFormat(sp_audioformat)
+
+        self.assertIs(
+            spotifyconnect.SampleFormat.from_audio_format(audio_format),
+            self.sample_format)
+
+    def test_repr(self):
+        self.assertEqual(
+            repr(self.sample_format),
+            'SampleFormat(channels=2, '
+            'sample_type=<SampleType.S16NativeEndian: 0>, sample_rate=44100)')
+
+
+class FrameArrayTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sample_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.frames = b'\x01\x00\x02\x00\x03\x00\x04\x00'
+
+    def test_shape(self):
+        array = spotifyconnect.frame_array(self.sample_format, self.frames)
+
+        self.assertEqual(array.shape, (2, 2))
+        self.assertEqual(array.dtype, 'int16')
+
+    def test_values(self):
+        array = spotifyconnect.frame_array(self.sample_format, self.frames)
+
+        self.assertEqual(array.tolist(), [[1, 2], [3, 4]])
+
+    def test_num_frames(self):
+        array = spotifyconnect.frame_array(
+            self.sample_format, self.frames, 1)
+
+        self.assertEqual(array.tolist(), [[1, 2]])
+
+    def test_is_a_read_only_view(self):
+        frames = bytearray(self.frames)
+
+        array = spotifyconnect.frame_array(self.sample_format, frames)
+        frames[0] = 5
+
+        self.assertEqual(array[0, 0], 5)
+        self.assertFalse(array.flags.writeable)
+
+    def test_works_with_audio_format(self):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.channels = 1
+        audio_format = spotifyconnect.AudioFormat(sp_audioformat)
+
+        array = spotifyconnect.frame_array(audio_format, self.frames)
+
+        self.assertEqual(array.shape, (4, 1))
+
+    def test_fails_if_sample_type_is_unknown(self):
+        audio_format = mock.Mock(channels=2, sample_type=666)
+
+        with self.assertRaises(ValueError):
+            spotifyconnect.frame_array(audio_format, self.frames)
+
+
 class SampleTypeTest(unittest.TestCase):
 
     def test_has_constants(self):
         self.assertEqual(spotifyconnect.SampleType.S16NativeEndian, 0)
+
+    def test_converted_sample_types_do_not_clash_with_libspotify(self):
+        self.assertGreaterEqual(spotifyconnect.SampleType.S24NativeEndian, 100)
+        self.assertEqual(
+            repr(spotifyconnect.SampleType.S24_3LE),
+            '<SampleType.S24_3LE: 101>')
@@ -0,0 +1,175 @@
+from __future__ import unicode_literals
+
+import struct
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class ChannelMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stereo = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def mix(self, matrix, frames, audio_format=None):
+        audio_format = audio_format or self.stereo
+        output_format = matrix.negotiate(audio_format)
+        out = numpy.empty(
+            (len(frames), output_format.channels), dtype=output_format.dtype)
+        return matrix.process(audio_format, frames, out)
+
+    def test_downmix(self):
+        matrix = spotifyconnect.ChannelMatrix.downmix()
+        frames = numpy.array([[100, 300], [-32768, -32768]], dtype='int16')
+
+        out = self.mix(matrix, frames)
+
+        self.assertEqual(out.tolist(), [[200], [-32768]])
+
+    def test_swap(self):
+        matrix = spotifyconnect.ChannelMatrix.swap()
+        frames = numpy.array([[1, 2], [3, 4]], dtype='int16')
+
+        self.assertEqual(self.mix(matrix, frames).tolist(), [[2, 1], [4, 3]])
+
+    def test_select_duplicates_channels(self):
+        matrix = spotifyconnect.ChannelMatrix.select([0, 0, 1, 1])
+        frames = numpy.array([[1, 2]], dtype='int16')
+
+        self.assertEqual(matrix.channels, 4)
+        self.assertEqual(self.mix(matrix, frames).tolist(), [[1, 1, 2, 2]])
+
+    def test_negotiate_returns_output_format(self):
+        matrix = spotifyconnect.ChannelMatrix.downmix()
+
+        self.assertIs(
+            matrix.negotiate(self.stereo),
+            spotifyconnect.SampleFormat(
+                1, spotifyconnect.SampleType.S16NativeEndian, 44100))
+
+    def test_negotiate_fails_if_channels_do_not_match(self):
+        matrix = spotifyconnect.ChannelMatrix.downmix(3)
+
+        with self.assertRaises(ValueError):
+            matrix.negotiate(self.stereo)
+
+    def test_negotiate_fails_for_packed_samples(self):
+        matrix = spotifyconnect.ChannelMatrix.swap()
+
+        with self.assertRaises(ValueError):
+            matrix.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S24_3LE, 44100))
+
+    def test_matrix_must_not_be_empty(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.ChannelMatrix([])
+
+    def test_gains_are_clipped(self):
+        matrix = spotifyconnect.ChannelMatrix([[1, 1], [1.5, -1.5]])
+        frames = numpy.array([[30000, 30000], [100, 1]], dtype='int16')
+
+        out = self.mix(matrix, frames)
+
+        self.assertEqual(out.tolist(), [[32767, 0], [101, 148]])
+
+    def test_float_audio(self):
+        matrix = spotifyconnect.ChannelMatrix.downmix()
+        float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        frames = numpy.array([[0.5, 1.0]], dtype='float32')
+
+        out = self.mix(matrix, frames, float32)
+
+        self.assertEqual(out.dtype, 'float32')
+        self.assertEqual(out.tolist(), [[0.75]])
+
+
+class ChannelSplitSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.left = self.create_sink()
+        self.right = self.create_sink()
+        self.sink = spotifyconnect.ChannelSplitSink([
+            (spotifyconnect.ChannelMatrix.select([0]), self.left),
+            (spotifyconnect.ChannelMatrix.select([1, 1]), self.right),
+        ])
+        self.sink.on()
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def create_sink(self):
+        sink = mock.Mock(spec=spotifyconnect.Sink)
+        sink.zero_copy = True
+        sink.numpy_frames = False
+        sink.frames_buffered = 0
+        sink.output = []
+
+        def on_music_delivery(audio_format, frames, num_frames, *args):
+            sink.output.append((audio_format.channels, bytes(frames)))
+            return num_frames
+
+        sink._on_music_delivery.side_effect = on_music_delivery
+        return sink
+
+    def deliver(self, *samples):
+        return self.sink._on_music_delivery(
+            self.audio_format, struct.pack('=%dh' % len(samples), *samples),
+            len(samples) // 2, None, self.session)
+
+    def test_on_opens_zone_sinks(self):
+        self.left._open.assert_called_once_with()
+        self.right._open.assert_called_once_with()
+
+    def test_off_closes_zone_sinks(self):
+        self.sink.off()
+
+        self.left._close.assert_called_once_with()
+        self.right._close.assert_called_once_with()
+
+    def test_routes_channels_to_zones(self):
+        self.assertEqual(self.deliver(1, 2, 3, 4), 2)
+
+        self.assertEqual(self.left.output, [(1, struct.pack('=2h', 1, 3))])
+        self.assertEqual(
+            self.right.output, [(2, struct.pack('=4h', 2, 2, 4, 4))])
+
+    def test_larger_deliveries(self):
+        self.deliver(1, 2)
+        self.deliver(*range(8))
+
+        self.assertEqual(
+            self.left.output[1], (1, struct.pack('=4h', 0, 2, 4, 6)))
+
+    def test_slow_zone_does_not_hold_back_others(self):
+        self.left._on_music_delivery.side_effect = None
+        self.left._on_music_delivery.return_value = 0
+
+        self.assertEqual(self.deliver(1, 2), 1)
+
+        self.assertEqual(len(self.right.output), 1)
+        self.assertEqual(self.sink.overruns, 1)
+
+    def test_frames_buffered_is_the_largest_zone_buffer(self):
+        self.left.frames_buffered = 10
+        self.right.frames_buffered = 20
+
+        self.assertEqual(self.sink.frames_buffered, 20)
+
+    def test_delivers_bytes_to_sinks_without_zero_copy(self):
+        self.left.zero_copy = False
+
+        self.deliver(1, 2)
+
+        self.assertIsInstance(
+            self.left._on_music_delivery.call_args[0][1], bytes)
@@ -0,0 +1,129 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import spotifyconnect
+
+from tests import mock
+
+
+@mock.patch('spotifyconnect.clock._clock')
+class PlaybackClockTest(unittest.TestCase):
+
+    def create_clock(self, clock_mock, now=100.0):
+        clock_mock.return_value = now
+        return spotifyconnect.PlaybackClock()
+
+    def test_starts_at_zero(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+
+        clock_mock.return_value = 200.0
+
+        self.assertEqual(clock.position_ms, 0)
+        self.assertTrue(clock.running)
+
+    def test_counts_consumed_frames(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+
+        clock._on_frames(44100, 0, 44100)
+        clock._on_frames(22050, 0, 44100)
+
+        self.assertEqual(clock.position_ms, 1500)
+
+    def test_subtracts_buffered_frames(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+
+        clock._on_frames(44100, 4410, 44100)
+
+        self.assertEqual(clock.position_ms, 900)
+
+    def test_moves_on_between_deliveries(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 4410, 44100)
+
+        clock_mock.return_value = 100.0625
+
+        self.assertEqual(clock.position_ms, 962)
+
+    def test_never_passes_the_consumed_audio(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 4410, 44100)
+
+        clock_mock.return_value = 105.0
+
+        self.assertEqual(clock.position_ms, 1000)
+
+    def test_seek_rebases(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 0, 44100)
+
+        clock._on_playback_seek(60000)
+
+        self.assertEqual(clock.position_ms, 60000)
+
+        clock._on_frames(4410, 0, 44100)
+
+        self.assertEqual(clock.position_ms, 60100)
+
+    def test_buffered_audio_from_before_a_seek_is_ignored(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_playback_seek(60000)
+
+        clock._on_frames(441, 4410, 44100)
+
+        self.assertEqual(clock.position_ms, 60000)
+
+    def test_pause_freezes(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 22050, 44100)
+        clock_mock.return_value = 100.25
+
+        clock._on_playback_notify(spotifyconnect.PlaybackNotify.Pause)
+        clock_mock.return_value = 101.0
+
+        self.assertEqual(clock.position_ms, 750)
+        self.assertFalse(clock.running)
+
+    def test_frames_delivered_while_paused_do_not_move_it(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 22050, 44100)
+        clock._on_playback_notify(spotifyconnect.PlaybackNotify.Pause)
+
+        clock._on_frames(44100, 66150, 44100)
+
+        self.assertEqual(clock.position_ms, 500)
+
+    def test_play_resumes(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 22050, 44100)
+        clock._on_playback_notify(spotifyconnect.PlaybackNotify.Pause)
+        clock_mock.return_value = 110.0
+
+        clock._on_playback_notify(spotifyconnect.PlaybackNotify.Play)
+        clock_mock.return_value = 110.25
+
+        self.assertEqual(clock.position_ms, 750)
+        self.assertTrue(clock.running)
+
+    def test_track_changed_resets(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 0, 44100)
+
+        clock._on_playback_notify(spotifyconnect.PlaybackNotify.TrackChanged)
+
+        self.assertEqual(clock.position_ms, 0)
+
+    def test_other_notifications_are_ignored(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+        clock._on_frames(44100, 0, 44100)
+
+        clock._on_playback_notify(spotifyconnect.PlaybackNotify.Next)
+
+        self.assertEqual(clock.position_ms, 1000)
+
+    def test_unknown_sample_rate_is_ignored(self, clock_mock):
+        clock = self.create_clock(clock_mock)
+
+        clock._on_frames(44100, 0, 0)
+
+        self.assertEqual(clock.position_ms, 0)
@@ -0,0 +1,220 @@
+from __future__ import division, unicode_literals
+
+import struct
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class FormatConverterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def convert(self, converter, frames, audio_format=None):
+        audio_format = audio_format or self.s16
+        output_format = converter.negotiate(audio_format)
+        out = numpy.empty(
+            (len(frames), output_format.channels), dtype=output_format.dtype)
+        return converter.process(audio_format, frames, out)
+
+    def frames(self, *samples):
+        return numpy.array(samples, dtype='int16').reshape(-1, 2)
+
+    def test_default_converts_to_float(self):
+        converter = spotifyconnect.FormatConverter()
+
+        self.assertEqual(
+            converter.sample_type,
+            spotifyconnect.SampleType.Float32NativeEndian)
+        self.assertFalse(converter.dither)
+
+    def test_unknown_sample_type_fails(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.FormatConverter(666)
+
+    def test_negotiate_returns_output_format(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S32NativeEndian)
+
+        self.assertIs(
+            converter.negotiate(self.s16),
+            spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S32NativeEndian, 44100))
+
+    def test_negotiate_fails_for_packed_input(self):
+        converter = spotifyconnect.FormatConverter()
+
+        with self.assertRaises(ValueError):
+            converter.negotiate(mock.Mock(
+                sample_type=spotifyconnect.SampleType.S24_3LE))
+
+    def test_s16_to_float(self):
+        converter = spotifyconnect.FormatConverter()
+
+        out = self.convert(converter, self.frames(-32768, 16384, 0, 32767))
+
+        self.assertEqual(out.dtype, 'float32')
+        self.assertEqual(out.tolist(), [[-1.0, 0.5], [0.0, 32767 / 32768]])
+
+    def test_s16_to_s24(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S24NativeEndian)
+
+        out = self.convert(converter, self.frames(-32768, 1, 0, 32767))
+
+        self.assertEqual(out.tolist(), [[-8388608, 256], [0, 8388352]])
+
+    def test_s16_to_s32(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S32NativeEndian)
+
+        out = self.convert(converter, self.frames(-32768, 1, 0, 32767))
+
+        self.assertEqual(
+            out.tolist(), [[-2147483648, 65536], [0, 2147418112]])
+
+    def test_s16_to_s24_3le(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S24_3LE)
+
+        out = self.convert(converter, self.frames(-32768, 1, 0, 32767))
+
+        self.assertEqual(
+            out.tobytes(),
+            b'\x00\x00\x80' b'\x00\x01\x00' b'\x00\x00\x00' b'\x00\xff\x7f')
+
+    def test_float_to_s16_rounds_and_clips(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian)
+        float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        frames = numpy.array(
+            [[0.5, -0.25], [1.5, -2.0], [1 / 65536 * 3, 0]], dtype='float32')
+
+        out = self.convert(converter, frames, float32)
+
+        self.assertEqual(out.dtype, 'int16')
+        self.assertEqual(
+            out.tolist(), [[16384, -8192], [32767, -32768], [2, 0]])
+
+    def test_s32_to_s16(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian)
+        s32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.S32NativeEndian, 44100)
+        frames = numpy.array([[65536 * 100 + 40000], [-65536]], dtype='int32')
+
+        out = self.convert(converter, frames, s32)
+
+        self.assertEqual(out.tolist(), [[101], [-1]])
+
+    def test_float_roundtrip_is_exact(self):
+        frames = self.frames(*range(-32768, 32768, 7)[:1000])
+        to_float = spotifyconnect.FormatConverter()
+        to_s16 = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian)
+        float32 = to_float.negotiate(self.s16)
+
+        out = self.convert(to_s16, self.convert(to_float, frames), float32)
+
+        self.assertTrue(numpy.array_equal(out, frames))
+
+    def test_dither_when_reducing_bit_depth(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian, dither=True, seed=1)
+        float32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        frames = numpy.full((10000, 1), 0.25 / 32768, dtype='float32')
+
+        out = self.convert(converter, frames, float32)
+
+        # Triangular dither of +-1 LSB around 0.25 LSB.
+        self.assertEqual(set(out[:, 0].tolist()), set([-1, 0, 1]))
+        self.assertAlmostEqual(out.mean(), 0.25, delta=0.05)
+
+    def test_no_dither_by_default(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian)
+        float32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        frames = numpy.full((100, 1), 0.25 / 32768, dtype='float32')
+
+        out = self.convert(converter, frames, float32)
+
+        self.assertTrue((out == 0).all())
+
+    def test_seed_makes_dither_reproducible(self):
+        float32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        frames = numpy.full((100, 1), 0.1, dtype='float32')
+        outputs = []
+        for i in range(2):
+            converter = spotifyconnect.FormatConverter(
+                spotifyconnect.SampleType.S16NativeEndian, dither=True, seed=5)
+            outputs.append(self.convert(converter, frames, float32).copy())
+
+        self.assertTrue(numpy.array_equal(*outputs))
+
+    @mock.patch('spotifyconnect.convert._NOISE_SIZE', 7)
+    def test_dither_noise_wraps_around(self):
+        float32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        frames = numpy.full((5, 1), 0.1, dtype='float32')
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian, dither=True, seed=5)
+        noise = converter._noise.copy()
+        converter.negotiate(float32)
+        out = numpy.empty((5, 1), dtype='int16')
+
+        converter.process(float32, frames, out)
+        converter.process(float32, frames, out)
+
+        self.assertEqual(len(noise), 7)
+        self.assertEqual(converter._noise_offset, 3)
+        self.assertTrue(numpy.array_equal(converter._noise, noise))
+        expected = numpy.rint(0.1 * 32768 + noise[[5, 6, 0, 1, 2]])
+        self.assertEqual(out[:, 0].tolist(), expected.tolist())
+
+    def test_scratch_buffers_are_reused(self):
+        converter = spotifyconnect.FormatConverter(
+            spotifyconnect.SampleType.S16NativeEndian, dither=True)
+        float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        converter.negotiate(float32)
+        out = numpy.empty((100, 2), dtype='int16')
+        frames = numpy.zeros((100, 2), dtype='float32')
+
+        converter.process(float32, frames, out)
+        scaled = converter._scaled
+        converter.process(float32, frames[:50], out)
+
+        self.assertIs(converter._scaled, scaled)
+
+    def test_in_pipeline(self):
+        session = mock.Mock()
+        session.player.num_listeners.return_value = 0
+        spotifyconnect._session_instance = session
+        self.addCleanup(setattr, spotifyconnect, '_session_instance', None)
+        sink = mock.Mock(spec=spotifyconnect.Sink)
+        sink.zero_copy = True
+        sink.numpy_frames = False
+        sink._on_music_delivery.return_value = 1
+        pipeline = spotifyconnect.Pipeline(
+            [spotifyconnect.FormatConverter(
+                spotifyconnect.SampleType.S24_3LE)], sink)
+        pipeline.on()
+
+        pipeline._on_music_delivery(
+            self.s16, struct.pack('=2h', 1, -1), 1, None, session)
+
+        audio_format, frames, num_frames = sink._on_music_delivery.call_args[
+            0][:3]
+        self.assertEqual(audio_format.frame_size, 6)
+        self.assertEqual(bytes(frames), b'\x00\x01\x00\x00\xff\xff')
+        self.assertEqual(num_frames, 1)
@@ -0,0 +1,246 @@
+from __future__ import division, unicode_literals
+
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+
+class SimulatedSink(object):
+
+    """A sink whose audio device plays ``rate`` frames per second of
+    simulated time, written in periods of ``period_size`` frames."""
+
+    frames_buffered = 0
+
+    def __init__(self, rate, period_size=1024):
+        self.rate = rate
+        self.period_size = period_size
+        self.frames_accepted = 0
+
+    def run_until(self, seconds):
+        frames = int(seconds * self.rate)
+        self.frames_accepted = frames - frames % self.period_size
+
+
+class DriftEstimatorTest(unittest.TestCase):
+
+    def simulate(self, sink, seconds, reference, interval=1.0):
+        self.now = 0.0
+        estimator = spotifyconnect.DriftEstimator(
+            sink, 44100, window=300.0, reference=lambda: reference(self.now))
+        for i in range(int(seconds / interval)):
+            self.now = i * interval
+            sink.run_until(self.now)
+            estimator.update()
+        return estimator
+
+    def test_no_estimate_without_measurements(self):
+        estimator = spotifyconnect.DriftEstimator(SimulatedSink(44100), 44100)
+
+        self.assertEqual(estimator.drift_ppm, 0.0)
+        self.assertEqual(estimator.num_measurements, 0)
+
+    def test_fast_device(self):
+        sink = SimulatedSink(44100 * (1 + 150e-6))
+
+        estimator = self.simulate(sink, 600, lambda now: now)
+
+        self.assertAlmostEqual(estimator.drift_ppm, 150, delta=5)
+
+    def test_slow_device(self):
+        sink = SimulatedSink(44100 * (1 - 80e-6))
+
+        estimator = self.simulate(sink, 600, lambda now: now)
+
+        self.assertAlmostEqual(estimator.drift_ppm, -80, delta=5)
+
+    def test_peer_timestamps(self):
+        # The local device is exact, but the peer's clock runs slow.
+        sink = SimulatedSink(44100)
+
+        estimator = self.simulate(
+            sink, 600, lambda now: 1000 + now * (1 - 100e-6))
+
+        self.assertAlmostEqual(estimator.drift_ppm, 100, delta=5)
+
+    def test_update_takes_reference_time(self):
+        sink = SimulatedSink(44100 * (1 + 200e-6))
+        estimator = spotifyconnect.DriftEstimator(sink, 44100)
+
+        for i in range(300):
+            sink.run_until(i)
+            estimator.update(reference_time=i)
+
+        self.assertAlmostEqual(estimator.drift_ppm, 200, delta=10)
+
+    def test_window(self):
+        sink = SimulatedSink(44100)
+
+        estimator = self.simulate(sink, 600, lambda now: now, interval=2.0)
+
+        self.assertEqual(estimator.num_measurements, 151)
+        self.assertEqual(estimator.span, 300)
+
+    def test_reset(self):
+        estimator = self.simulate(
+            SimulatedSink(44100 * (1 + 150e-6)), 60, lambda now: now)
+
+        estimator.reset()
+
+        self.assertEqual(estimator.drift_ppm, 0.0)
+        self.assertEqual(estimator.num_measurements, 0)
+
+
+class DriftCorrectorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.f32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        self.corrector = spotifyconnect.DriftCorrector()
+        self.corrector.negotiate(self.f32)
+
+    def process(self, frames, audio_format=None, block_size=4096):
+        audio_format = audio_format or self.f32
+        blocks = []
+        for i in range(0, len(frames), block_size):
+            block = frames[i:i + block_size]
+            out = numpy.empty(
+                (self.corrector.max_output_frames(len(block)),
+                 block.shape[1]), dtype=block.dtype)
+            blocks.append(
+                self.corrector.process(audio_format, block, out).copy())
+        return numpy.concatenate(blocks)
+
+    def sine(self, frequency, num_frames, step=1.0, delay=0):
+        t = (numpy.arange(num_frames) - delay) * step
+        samples = numpy.sin(2 * numpy.pi * frequency * t / 44100)
+        samples[t < 0] = 0
+        return samples.astype('float32')[:, None]
+
+    def test_unchanged_without_correction(self):
+        frames = self.sine(1000, 10000)
+
+        result = self.process(frames)
+
+        self.assertEqual(len(result), 10000)
+        self.assertTrue(numpy.allclose(result[2:], frames[:-2], atol=1e-6))
+
+    def test_latency(self):
+        self.assertEqual(self.corrector.latency, 2)
+
+    def test_stretches_the_audio(self):
+        self.corrector.correction_ppm = 1000
+        frames = self.sine(100, 88200)
+
+        result = self.process(frames)
+
+        self.assertAlmostEqual(len(result), 88200 * 1.001, delta=3)
+        self.assertAlmostEqual(
+            self.corrector.frames_adjusted, 88.2, delta=3)
+        expected = self.sine(100, len(result), step=1 / 1.001, delay=2)
+        self.assertLess(numpy.abs(result - expected).max(), 1e-4)
+
+    def test_shrinks_the_audio(self):
+        self.corrector.correction_ppm = -500
+        frames = self.sine(100, 88200)
+
+        result = self.process(frames)
+
+        self.assertAlmostEqual(len(result), 88200 * 0.9995, delta=3)
+        self.assertLess(self.corrector.frames_adjusted, -40)
+
+    def test_no_discontinuities_at_block_boundaries(self):
+        self.corrector.correction_ppm = 700
+        frames = self.sine(1000, 44100)
+
+        result = self.process(frames, block_size=333)
+
+        expected = self.sine(1000, len(result), step=1 / 1.0007, delay=2)
+        self.assertLess(numpy.abs(result - expected).max(), 1e-3)
+
+    def test_correction_is_limited(self):
+        self.corrector.correction_ppm = 5000
+
+        self.assertEqual(self.corrector.correction_ppm, 1000)
+
+    def test_follows_estimator(self):
+        estimator = spotifyconnect.DriftEstimator(SimulatedSink(44100), 44100)
+        estimator._drift_ppm = 250
+        self.corrector = spotifyconnect.DriftCorrector(estimator)
+        self.corrector.negotiate(self.f32)
+
+        self.process(self.sine(100, 100))
+
+        self.assertEqual(self.corrector.correction_ppm, 250)
+
+    def test_int16(self):
+        s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.corrector.negotiate(s16)
+        self.corrector.correction_ppm = 1000
+        frames = numpy.repeat(
+            (self.sine(100, 44100) * 30000).astype('int16'), 2, axis=1)
+
+        result = self.process(frames, s16)
+
+        self.assertEqual(result.dtype, numpy.int16)
+        self.assertEqual(result.shape[1], 2)
+        expected = self.sine(100, len(result), step=1 / 1.001, delay=2)
+        self.assertLess(
+            numpy.abs(result[:, 0] - expected[:, 0] * 30000).max(), 3)
+
+    def test_reset_clears_history(self):
+        self.process(numpy.ones((100, 1), dtype='float32'))
+
+        self.corrector.reset()
+        result = self.process(numpy.zeros((100, 1), dtype='float32'))
+
+        self.assertEqual(numpy.abs(result).max(), 0)
+
+    def test_negotiate_fails_for_other_sample_types(self):
+        with self.assertRaises(ValueError):
+            self.corrector.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S24_3LE, 44100))
+
+
+class DriftSimulationTest(unittest.TestCase):
+
+    def run_zone(self, drift_ppm, correct, seconds=600):
+        # The device plays the corrector's output at its own skewed rate.
+        # Returns how far, in ms, the audio ends up behind or ahead of the
+        # reference clock.
+        device_rate = 44100 * (1 + drift_ppm * 1e-6)
+        audio_format = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        sink = SimulatedSink(device_rate, period_size=1)
+        estimator = spotifyconnect.DriftEstimator(sink, 44100, window=60.0)
+        corrector = spotifyconnect.DriftCorrector(
+            estimator if correct else None)
+        corrector.negotiate(audio_format)
+        block = numpy.zeros((8192, 1), dtype='float32')
+        out = numpy.empty(
+            (corrector.max_output_frames(8192), 1), dtype='float32')
+        now = next_update = 0.0
+        content_frames = 0
+        while now < seconds:
+            num_frames = len(corrector.process(audio_format, block, out))
+            content_frames += len(block)
+            sink.frames_accepted += num_frames
+            now += num_frames / device_rate
+            if now >= next_update:
+                estimator.update(reference_time=now)
+                next_update += 1.0
+        return (content_frames / 44100 - now) * 1000
+
+    def test_uncorrected_zones_drift_apart(self):
+        offset = self.run_zone(200, correct=False)
+
+        self.assertAlmostEqual(offset, 120, delta=5)
+
+    def test_corrected_zones_stay_in_sync(self):
+        offset = self.run_zone(200, correct=True)
+
+        # Only the audio played before the first estimates is off.
+        self.assertLess(abs(offset), 5)
@@ -0,0 +1,186 @@
+from __future__ import division, unicode_literals
+
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class CompressorTest(unittest.TestCase):
+
+    def setUp(self):
+        self.float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        self.s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def burst(self, num_frames=4410, start=2205, quiet=0.01, loud=1.0):
+        # A 1 kHz tone that gets loud at frame ``start``.
+        t = numpy.arange(num_frames) / 44100
+        samples = numpy.sin(2 * numpy.pi * 1000 * t)
+        samples *= numpy.where(numpy.arange(num_frames) < start, quiet, loud)
+        return numpy.stack([samples, samples], 1).astype('float32')
+
+    def process(self, compressor, frames, block_size=512):
+        for i in range(0, len(frames), block_size):
+            compressor.process(
+                self.float32, frames[i:i + block_size], None)
+        return frames
+
+    def test_processes_in_place(self):
+        self.assertTrue(spotifyconnect.Compressor.in_place)
+
+    def test_latency_is_the_lookahead(self):
+        compressor = spotifyconnect.Compressor(lookahead_ms=5)
+        compressor.negotiate(self.float32)
+
+        self.assertEqual(compressor.latency, 220)
+
+    def test_audio_is_delayed_by_the_latency(self):
+        compressor = spotifyconnect.Compressor(threshold=0, lookahead_ms=1)
+        compressor.negotiate(self.float32)
+        frames = self.burst(quiet=0.5, loud=0.5)
+        expected = frames.copy()
+
+        self.process(compressor, frames)
+
+        latency = compressor.latency
+        self.assertTrue(numpy.array_equal(frames[:latency], 0 * frames[:44]))
+        self.assertTrue(numpy.allclose(frames[latency:], expected[:-latency]))
+
+    def test_quiet_audio_is_unchanged(self):
+        compressor = spotifyconnect.Compressor(threshold=-20, lookahead_ms=0)
+        compressor.negotiate(self.float32)
+        frames = self.burst(loud=0.01)
+        expected = frames.copy()
+
+        self.process(compressor, frames)
+
+        self.assertTrue(numpy.allclose(frames, expected))
+        self.assertEqual(compressor.gain_reduction, 0)
+
+    def test_loud_audio_is_compressed_by_the_ratio(self):
+        compressor = spotifyconnect.Compressor(
+            threshold=-20, ratio=4, attack_ms=1, release_ms=1000)
+        compressor.negotiate(self.float32)
+
+        frames = self.process(compressor, self.burst(num_frames=22050))
+
+        # 20 dB above the threshold is compressed to 5 dB.
+        self.assertAlmostEqual(compressor.gain_reduction, 15, places=1)
+        peak = numpy.abs(frames[-4410:]).max()
+        self.assertAlmostEqual(20 * numpy.log10(peak), -15, places=1)
+
+    def test_makeup_gain(self):
+        compressor = spotifyconnect.Compressor(
+            threshold=0, lookahead_ms=0, makeup=6)
+        compressor.negotiate(self.float32)
+
+        frames = self.process(compressor, self.burst(loud=0.1))
+
+        peak = numpy.abs(frames[-441:]).max()
+        self.assertAlmostEqual(peak, 0.1 * 10 ** (6 / 20), places=3)
+
+    def test_limiter_keeps_peaks_below_ceiling(self):
+        limiter = spotifyconnect.Compressor.limiter(ceiling=-6)
+        limiter.negotiate(self.float32)
+
+        frames = self.process(limiter, self.burst())
+
+        self.assertLessEqual(numpy.abs(frames).max(), 10 ** (-6 / 20))
+        self.assertAlmostEqual(limiter.gain_reduction, 6, places=1)
+
+    def test_gain_is_reduced_before_the_peak_is_output(self):
+        # No clipping, so the look-ahead alone must catch the peak.
+        compressor = spotifyconnect.Compressor(
+            threshold=-6, ratio=1000, attack_ms=1, lookahead_ms=5)
+        compressor.negotiate(self.float32)
+
+        frames = self.process(compressor, self.burst())
+
+        self.assertLess(20 * numpy.log10(numpy.abs(frames).max()), -5.9)
+
+    def test_gain_recovers_after_release(self):
+        compressor = spotifyconnect.Compressor(
+            threshold=-20, attack_ms=1, release_ms=5, lookahead_ms=0)
+        compressor.negotiate(self.float32)
+
+        self.process(compressor, self.burst(quiet=1.0, loud=0.01))
+
+        self.assertAlmostEqual(compressor.gain_reduction, 0, places=2)
+
+    def test_s16_audio(self):
+        limiter = spotifyconnect.Compressor.limiter(ceiling=-6)
+        limiter.negotiate(self.s16)
+        frames = (self.burst() * 32767).astype('int16')
+
+        for i in range(0, len(frames), 512):
+            limiter.process(self.s16, frames[i:i + 512], None)
+
+        self.assertLessEqual(numpy.abs(frames).max(), 16423)
+        self.assertGreater(numpy.abs(frames).max(), 16000)
+
+    def test_reset_clears_delay_line_and_gain(self):
+        compressor = spotifyconnect.Compressor(lookahead_ms=1)
+        compressor.negotiate(self.float32)
+        self.process(compressor, self.burst())
+
+        compressor.reset()
+
+        frames = self.process(compressor, numpy.zeros((100, 2), 'float32'))
+        self.assertFalse(frames.any())
+        self.assertEqual(compressor.gain_reduction, 0)
+
+    def test_block_size_does_not_change_output(self):
+        compressor = spotifyconnect.Compressor(lookahead_ms=2)
+        compressor.negotiate(self.float32)
+        expected = self.process(compressor, self.burst(), 4410)
+
+        compressor.reset()
+        frames = self.process(compressor, self.burst(), 100)
+
+        self.assertTrue(numpy.allclose(frames, expected))
+
+    def test_larger_blocks_keep_the_delay_line(self):
+        compressor = spotifyconnect.Compressor(threshold=0, lookahead_ms=1)
+        compressor.negotiate(self.float32)
+        frames = self.burst(quiet=0.5, loud=0.5)
+        expected = frames.copy()
+
+        compressor.process(self.float32, frames[:100], None)
+        compressor.process(self.float32, frames[100:], None)
+
+        self.assertTrue(numpy.allclose(frames[44:], expected[:-44]))
+
+    def test_invalid_settings(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.Compressor(ratio=0.5)
+        with self.assertRaises(ValueError):
+            spotifyconnect.Compressor(lookahead_ms=1000)
+
+    def test_negotiate_fails_for_unsupported_sample_type(self):
+        compressor = spotifyconnect.Compressor()
+
+        with self.assertRaises(ValueError):
+            compressor.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S32NativeEndian, 44100))
+
+    def test_latency_is_counted_in_pipeline_frames_buffered(self):
+        session = mock.Mock()
+        spotifyconnect._session_instance = self.session = session
+        self.addCleanup(setattr, spotifyconnect, '_session_instance', None)
+        sink = mock.Mock(spec=spotifyconnect.Sink)
+        sink.zero_copy = True
+        sink.frames_buffered = 100
+        sink._on_music_delivery.side_effect = (
+            lambda audio_format, frames, num_frames, *args: num_frames)
+        compressor = spotifyconnect.Compressor(lookahead_ms=5)
+        pipeline = spotifyconnect.Pipeline([compressor], sink)
+
+        pipeline._on_music_delivery(
+            self.s16, b'\0' * 400, 100, None, session)
+
+        self.assertEqual(pipeline.frames_buffered, 320)
@@ -0,0 +1,220 @@
+from __future__ import division, unicode_literals
+
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class EqualizerBandTest(unittest.TestCase):
+
+    def test_defaults(self):
+        band = spotifyconnect.EqualizerBand(
+            spotifyconnect.FilterType.LOW_PASS, 1000)
+
+        self.assertIs(band.filter_type, spotifyconnect.FilterType.LOW_PASS)
+        self.assertEqual(band.gain, 0.0)
+        self.assertAlmostEqual(band.q, 0.7071, places=4)
+
+    def test_flat_peaking_filter_is_identity(self):
+        band = spotifyconnect.EqualizerBand(
+            spotifyconnect.FilterType.PEAKING, 1000, 0.0)
+
+        b0, b1, b2, a1, a2 = band.coefficients(44100)
+
+        self.assertAlmostEqual(b0, 1)
+        self.assertAlmostEqual(b1, a1)
+        self.assertAlmostEqual(b2, a2)
+
+    def test_pass_filters_have_unity_gain_in_pass_band(self):
+        low_pass = spotifyconnect.EqualizerBand(
+            spotifyconnect.FilterType.LOW_PASS, 1000)
+        high_pass = spotifyconnect.EqualizerBand(
+            spotifyconnect.FilterType.HIGH_PASS, 1000)
+
+        # Gain at DC is sum(b) / (1 + sum(a)), at Nyquist the alternating
+        # sums.
+        b0, b1, b2, a1, a2 = low_pass.coefficients(44100)
+        self.assertAlmostEqual((b0 + b1 + b2) / (1 + a1 + a2), 1)
+        b0, b1, b2, a1, a2 = high_pass.coefficients(44100)
+        self.assertAlmostEqual((b0 - b1 + b2) / (1 - a1 + a2), 1)
+
+    def test_shelf_gain(self):
+        low_shelf = spotifyconnect.EqualizerBand(
+            spotifyconnect.FilterType.LOW_SHELF, 200, 6.0)
+        high_shelf = spotifyconnect.EqualizerBand(
+            spotifyconnect.FilterType.HIGH_SHELF, 5000, -6.0)
+
+        b0, b1, b2, a1, a2 = low_shelf.coefficients(44100)
+        self.assertAlmostEqual(
+            (b0 + b1 + b2) / (1 + a1 + a2), 10 ** (6 / 20))
+        b0, b1, b2, a1, a2 = high_shelf.coefficients(44100)
+        self.assertAlmostEqual(
+            (b0 - b1 + b2) / (1 - a1 + a2), 10 ** (-6 / 20))
+
+
+class EqualizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        self.s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.bands = [
+            spotifyconnect.EqualizerBand(
+                spotifyconnect.FilterType.PEAKING, 1000, 6.0, 1.0),
+            spotifyconnect.EqualizerBand(
+                spotifyconnect.FilterType.HIGH_PASS, 40),
+        ]
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def sine(self, frequency, num_frames=44100, amplitude=0.1):
+        t = numpy.arange(num_frames) / 44100
+        samples = numpy.sin(2 * numpy.pi * frequency * t) * amplitude
+        return numpy.stack([samples, samples], 1).astype('float32')
+
+    def process(self, equalizer, frames, block_size=None):
+        block_size = block_size or len(frames)
+        for i in range(0, len(frames), block_size):
+            result = equalizer.process(
+                self.float32, frames[i:i + block_size], None)
+            self.assertIs(result.base, frames)
+        return frames
+
+    def test_processes_in_place(self):
+        self.assertTrue(spotifyconnect.Equalizer.in_place)
+
+    def test_peaking_band_boosts_center_frequency(self):
+        equalizer = spotifyconnect.Equalizer(self.bands)
+        equalizer.negotiate(self.float32)
+
+        frames = self.process(equalizer, self.sine(1000))
+
+        gain = numpy.abs(frames[22050:]).max() / 0.1
+        self.assertAlmostEqual(gain, 10 ** (6 / 20), places=2)
+
+    def test_without_bands_audio_is_unchanged(self):
+        equalizer = spotifyconnect.Equalizer()
+        equalizer.negotiate(self.float32)
+        frames = self.sine(1000, 100)
+        expected = frames.copy()
+
+        self.process(equalizer, frames)
+
+        self.assertTrue(numpy.array_equal(frames, expected))
+
+    def test_s16_audio_is_rounded_and_clipped(self):
+        equalizer = spotifyconnect.Equalizer([
+            spotifyconnect.EqualizerBand(
+                spotifyconnect.FilterType.LOW_SHELF, 20000, 12.0)])
+        equalizer.negotiate(self.s16)
+        frames = numpy.array([[30000, -30000], [10, -10]], dtype='int16')
+
+        equalizer.process(self.s16, frames, None)
+
+        self.assertEqual(frames[0].tolist(), [32767, -32768])
+
+    def test_state_is_carried_across_blocks(self):
+        equalizer = spotifyconnect.Equalizer(self.bands)
+        equalizer.negotiate(self.float32)
+        expected = self.process(equalizer, self.sine(1000, 5000))
+
+        for block_size in [1, 100, 1024]:
+            equalizer = spotifyconnect.Equalizer(self.bands)
+            equalizer.negotiate(self.float32)
+
+            frames = self.process(equalizer, self.sine(1000, 5000), block_size)
+
+            self.assertTrue(numpy.array_equal(frames, expected))
+
+    def test_reset_clears_state(self):
+        equalizer = spotifyconnect.Equalizer(self.bands)
+        equalizer.negotiate(self.float32)
+        expected = self.process(equalizer, self.sine(1000, 1000))
+        self.process(equalizer, self.sine(300, 1000))
+
+        equalizer.reset()
+
+        frames = self.process(equalizer, self.sine(1000, 1000))
+        self.assertTrue(numpy.array_equal(frames, expected))
+
+    def test_track_change_clears_state_on_next_block(self):
+        equalizer = spotifyconnect.Equalizer(self.bands)
+        equalizer.negotiate(self.float32)
+        expected = self.process(equalizer, self.sine(1000, 1000))
+        self.process(equalizer, self.sine(300, 1000))
+
+        equalizer._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+
+        frames = self.process(equalizer, self.sine(1000, 1000))
+        self.assertTrue(numpy.array_equal(frames, expected))
+
+    def test_other_notifications_keep_state(self):
+        equalizer = spotifyconnect.Equalizer(self.bands)
+
+        equalizer._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Play, self.session)
+
+        self.assertFalse(equalizer._reset_requested)
+
+    def test_coefficients_are_only_computed_when_bands_change(self):
+        equalizer = spotifyconnect.Equalizer(self.bands)
+        equalizer.negotiate(self.float32)
+        sos = equalizer._sos
+
+        self.process(equalizer, self.sine(1000, 100))
+        self.assertIs(equalizer._sos, sos)
+
+        equalizer.bands = [self.bands[0]._replace(gain=3.0), self.bands[1]]
+        state = equalizer._state
+        self.process(equalizer, self.sine(1000, 100))
+
+        self.assertIsNot(equalizer._sos, sos)
+        self.assertEqual(equalizer._sos[0], equalizer.bands[0].coefficients(
+            44100)[0])
+        # Changing a band doesn't reset the filters.
+        self.assertIs(equalizer._state, state)
+
+    def test_adding_bands_resets_state(self):
+        equalizer = spotifyconnect.Equalizer(self.bands[:1])
+        equalizer.negotiate(self.float32)
+        state = equalizer._state
+
+        equalizer.bands = self.bands
+        self.process(equalizer, self.sine(1000, 100))
+
+        self.assertIsNot(equalizer._state, state)
+        self.assertEqual(len(equalizer._state), 8)
+
+    def test_negotiate_fails_for_unsupported_sample_type(self):
+        equalizer = spotifyconnect.Equalizer()
+
+        with self.assertRaises(ValueError):
+            equalizer.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S32NativeEndian, 44100))
+
+    def test_open_connects_to_playback_notify_event(self):
+        equalizer = spotifyconnect.Equalizer()
+
+        equalizer._open()
+
+        self.session.player.on.assert_called_with(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            equalizer._on_playback_notify)
+
+    def test_close_disconnects_from_playback_notify_event(self):
+        equalizer = spotifyconnect.Equalizer()
+
+        equalizer._close()
+
+        self.session.player.off.assert_called_with(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            equalizer._on_playback_notify)
@@ -0,0 +1,306 @@
+from __future__ import unicode_literals
+
+import socket
+import struct
+import time
+import unittest
+
+import spotifyconnect
+
+from tests import mock
+
+try:
+    import selectors
+except ImportError:
+    selectors = None
+
+
+@unittest.skipIf(selectors is None, 'Requires Python 3.4')
+class HTTPStreamSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.sink = spotifyconnect.HTTPStreamSink(
+            host='127.0.0.1', port=0, buffer_ms=100)
+        self.sink.on()
+
+    def tearDown(self):
+        self.sink.off()
+        spotifyconnect._session_instance = None
+
+    def connect(self, path='/'):
+        client = socket.create_connection(self.sink.address, timeout=5)
+        self.addCleanup(client.close)
+        client.sendall(
+            ('GET %s HTTP/1.1\r\nHost: localhost\r\n\r\n' % path).encode(
+                'ascii'))
+        # Wait for the server to see the request.
+        deadline = time.time() + 5
+        while self.sink.num_clients == 0 and time.time() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        return client
+
+    def deliver_until(self, frames, condition):
+        # Keep delivering until the server notices the client falling
+        # behind, however much audio the socket buffers take.
+        num_frames = len(frames) // 4
+        deadline = time.time() + 10
+        with mock.patch.object(spotifyconnect.httpstream, '_clock') as clock:
+            i = 0
+            while not condition() and time.time() < deadline:
+                clock.return_value = i * 0.1
+                self.sink._on_music_delivery(
+                    self.audio_format, frames, num_frames, None, self.session)
+                i += 1
+                if i % 100 == 0:
+                    time.sleep(0.01)
+
+    def read_response(self, client, size):
+        data = b''
+        while b'\r\n\r\n' not in data:
+            data += client.recv(4096)
+        header, body = data.split(b'\r\n\r\n', 1)
+        while len(body) < size:
+            chunk = client.recv(4096)
+            if not chunk:
+                break
+            body += chunk
+        return header.decode('latin-1'), body
+
+    def deliver(self, *samples):
+        return self.sink._on_music_delivery(
+            self.audio_format, struct.pack('=%dh' % len(samples), *samples),
+            len(samples) // 2, None, self.session)
+
+    def test_address(self):
+        host, port = self.sink.address
+
+        self.assertEqual(host, '127.0.0.1')
+        self.assertNotEqual(port, 0)
+
+    def test_address_is_none_when_off(self):
+        self.sink.off()
+
+        self.assertIsNone(self.sink.address)
+
+        self.sink.on()
+
+    def test_wav_stream(self):
+        client = self.connect('/stream.wav')
+
+        self.deliver(1, 2, 3, 4)
+        header, body = self.read_response(client, 48)
+
+        self.assertTrue(header.startswith('HTTP/1.0 200 OK'))
+        self.assertIn('Content-Type: audio/wav', header)
+        self.assertEqual(body[:4], b'RIFF')
+        self.assertEqual(
+            struct.unpack('<HHIIHH', body[20:36]),
+            (1, 2, 44100, 44100 * 4, 4, 16))
+        self.assertEqual(body[36:40], b'data')
+        self.assertEqual(body[44:], struct.pack('=4h', 1, 2, 3, 4))
+
+    def test_float_wav_stream(self):
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 48000)
+        client = self.connect()
+
+        self.sink._on_music_delivery(
+            self.audio_format, struct.pack('=2f', 0.5, -0.5), 1, None,
+            self.session)
+        header, body = self.read_response(client, 52)
+
+        self.assertEqual(
+            struct.unpack('<HHIIHH', body[20:36]),
+            (3, 2, 48000, 48000 * 8, 8, 32))
+        self.assertEqual(body[44:], struct.pack('=2f', 0.5, -0.5))
+
+    def test_pcm_stream(self):
+        client = self.connect('/stream.pcm')
+
+        self.deliver(1, 2)
+        header, body = self.read_response(client, 4)
+
+        self.assertIn('Content-Type: application/octet-stream', header)
+        self.assertEqual(body, struct.pack('=2h', 1, 2))
+
+    def test_new_clients_get_buffered_audio(self):
+        self.deliver(1, 2, 3, 4)
+
+        client = self.connect('/stream.pcm')
+        self.deliver(5, 6)
+        header, body = self.read_response(client, 12)
+
+        self.assertEqual(body, struct.pack('=6h', 1, 2, 3, 4, 5, 6))
+
+    def test_new_clients_skip_audio_from_before_a_seek(self):
+        self.deliver(1, 2, 3, 4)
+        self.sink._on_playback_seek(1000, self.session)
+        self.deliver(5, 6)
+
+        client = self.connect('/stream.pcm')
+        self.deliver(7, 8)
+        header, body = self.read_response(client, 8)
+
+        self.assertEqual(body, struct.pack('=4h', 5, 6, 7, 8))
+
+    def test_audio_flush_skips_clients_past_unsent_audio(self):
+        self.deliver(1, 2)
+        self.sink.off()
+        client = spotifyconnect.httpstream._Client(None, None)
+        client.generation = self.sink._stream[1]
+        self.sink._clients.append(client)
+        self.deliver(3, 4)
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+        self.sink._drop_flushed()
+
+        self.assertEqual(client.position, 8)
+
+    def test_audio_flush_keeps_clients_frame_aligned(self):
+        self.deliver(1, 2)
+        self.sink.off()
+        client = spotifyconnect.httpstream._Client(None, None)
+        client.generation = self.sink._stream[1]
+        # A partial send left the client one byte into the second frame.
+        client.position = 5
+        self.sink._clients.append(client)
+        self.deliver(3, 4)
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+        self.sink._drop_flushed()
+
+        self.assertEqual(client.position, 9)
+
+    @mock.patch('spotifyconnect.httpstream._clock')
+    def test_seek_takes_new_audio_right_away(self, clock_mock):
+        frames = b'\0' * 4 * 44100
+        clock_mock.return_value = 10.0
+        self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session)
+
+        self.sink._on_playback_seek(1000, self.session)
+
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 4410)
+        self.assertEqual(self.sink.frames_buffered, 4410)
+
+    def test_on_connects_to_playback_events(self):
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.sink._on_playback_seek)
+
+    def test_unknown_path(self):
+        client = self.connect('/foo')
+
+        header, body = self.read_response(client, 0)
+
+        self.assertTrue(header.startswith('HTTP/1.0 404 Not Found'))
+
+    def test_many_clients(self):
+        clients = [self.connect('/stream.pcm') for i in range(10)]
+
+        self.deliver(1, 2)
+
+        for client in clients:
+            header, body = self.read_response(client, 4)
+            self.assertEqual(body, struct.pack('=2h', 1, 2))
+        self.assertEqual(self.sink.num_clients, 10)
+
+    @mock.patch('spotifyconnect.httpstream._clock')
+    def test_takes_audio_at_the_speed_it_plays(self, clock_mock):
+        # 100 ms of audio are accepted, then no more until it has played.
+        frames = b'\0' * 4 * 44100
+        clock_mock.return_value = 10.0
+
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 4410)
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 0)
+        self.assertEqual(self.sink.frames_buffered, 4410)
+
+        clock_mock.return_value = 10.05
+
+        self.assertEqual(self.sink.frames_buffered, 2205)
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 2205)
+
+    @mock.patch('spotifyconnect.httpstream._clock')
+    def test_clock_restarts_after_running_out_of_audio(self, clock_mock):
+        frames = b'\0' * 4 * 44100
+        clock_mock.return_value = 10.0
+        self.sink._on_music_delivery(
+            self.audio_format, frames, 4410, None, self.session)
+
+        clock_mock.return_value = 20.0
+
+        self.assertEqual(self.sink.frames_buffered, 0)
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 4410)
+
+    def test_slow_client_is_skipped_forward(self):
+        client = self.connect('/stream.pcm')
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        frames = b'\0' * 4 * 4410
+
+        self.deliver_until(frames, lambda: self.sink.skips)
+
+        self.assertGreater(self.sink.skips, 0)
+        self.assertEqual(self.sink.num_clients, 1)
+
+    def test_slow_client_is_skipped_by_whole_frames(self):
+        # A partial send left the client one byte into a frame.
+        client = spotifyconnect.httpstream._Client(mock.Mock(), None)
+        client.sock.send.side_effect = len
+        client.position = 1
+        stream = (self.audio_format, 1, memoryview(bytearray(32)), 8, 32)
+
+        self.sink._send_audio(client, stream)
+
+        self.assertEqual(self.sink.skips, 1)
+        # It skipped from 1 to 29, one byte into the frame at 28, and sent
+        # the rest of that frame.
+        self.assertEqual(len(client.sock.send.call_args[0][0]), 3)
+        self.assertEqual(client.position, 32)
+
+    def test_slow_client_can_be_dropped(self):
+        self.sink.off()
+        self.sink = spotifyconnect.HTTPStreamSink(
+            host='127.0.0.1', port=0, buffer_ms=100, drop_slow_clients=True)
+        self.sink.on()
+        client = self.connect('/stream.pcm')
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+        frames = b'\0' * 4 * 4410
+
+        self.deliver_until(frames, lambda: not self.sink.num_clients)
+
+        self.assertGreater(self.sink.clients_dropped, 0)
+        self.assertEqual(self.sink.num_clients, 0)
+
+    def test_format_change_disconnects_clients(self):
+        client = self.connect('/stream.pcm')
+        self.deliver(1, 2)
+        self.read_response(client, 4)
+
+        self.sink._on_music_delivery(
+            spotifyconnect.SampleFormat(
+                1, spotifyconnect.SampleType.S16NativeEndian, 44100),
+            struct.pack('=h', 3), 1, None, self.session)
+        time.sleep(0.1)
+
+        self.assertEqual(client.recv(4096), b'')
+        self.assertEqual(self.sink.num_clients, 0)
+
+    def test_unsupported_sample_type(self):
+        with self.assertRaises(ValueError):
+            self.sink._on_music_delivery(
+                spotifyconnect.SampleFormat(
+                    2, spotifyconnect.SampleType.S24NativeEndian, 44100),
+                b'\0' * 8, 1, None, self.session)
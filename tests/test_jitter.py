@@ -0,0 +1,81 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import spotifyconnect
+
+from tests import mock
+
+
+@mock.patch('spotifyconnect.jitter._clock')
+class JitterBufferTest(unittest.TestCase):
+
+    def create_jitter_buffer(self, clock_mock, **kwargs):
+        clock_mock.return_value = 100.0
+        return spotifyconnect.JitterBuffer(**kwargs)
+
+    def test_starts_at_target(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(clock_mock, target_ms=150)
+
+        self.assertEqual(jitter_buffer.target_ms, 150)
+        self.assertEqual(jitter_buffer.min_target_ms, 150)
+
+    def test_target_frames(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(clock_mock, target_ms=150)
+
+        self.assertEqual(jitter_buffer.target_frames(44100), 6615)
+
+    def test_underrun_raises_target(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(
+            clock_mock, target_ms=100, step_ms=50)
+
+        jitter_buffer._on_underrun()
+        jitter_buffer._on_underrun()
+
+        self.assertEqual(jitter_buffer.target_ms, 200)
+        self.assertEqual(jitter_buffer.underruns, 2)
+
+    def test_target_is_limited(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(
+            clock_mock, target_ms=100, max_target_ms=300, step_ms=150)
+
+        for _ in range(3):
+            jitter_buffer._on_underrun()
+
+        self.assertEqual(jitter_buffer.target_ms, 300)
+
+    def test_target_decays(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(
+            clock_mock, target_ms=100, step_ms=200, decay_rate=4)
+        jitter_buffer._on_underrun()
+
+        clock_mock.return_value = 125.0
+
+        self.assertEqual(jitter_buffer.target_ms, 200)
+
+    def test_target_never_decays_below_the_minimum(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(
+            clock_mock, target_ms=100, step_ms=200, decay_rate=4)
+        jitter_buffer._on_underrun()
+
+        clock_mock.return_value = 1000.0
+
+        self.assertEqual(jitter_buffer.target_ms, 100)
+
+    def test_underrun_raises_the_decayed_target(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(
+            clock_mock, target_ms=100, step_ms=200, decay_rate=4)
+        jitter_buffer._on_underrun()
+        clock_mock.return_value = 125.0
+
+        jitter_buffer._on_underrun()
+
+        self.assertEqual(jitter_buffer.target_ms, 400)
+
+    def test_reset(self, clock_mock):
+        jitter_buffer = self.create_jitter_buffer(clock_mock, target_ms=100)
+        jitter_buffer._on_underrun()
+
+        jitter_buffer.reset()
+
+        self.assertEqual(jitter_buffer.target_ms, 100)
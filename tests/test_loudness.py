@@ -0,0 +1,343 @@
+from __future__ import division, unicode_literals
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+def tone(seconds, amplitude, sample_rate=44100):
+    # A stereo 1 kHz tone, which K-weighting leaves at almost the same
+    # level, so a tone at -20 dBFS measures -20 LUFS.
+    t = numpy.arange(int(seconds * sample_rate)) / sample_rate
+    samples = numpy.sin(2 * numpy.pi * 1000 * t) * amplitude
+    return numpy.stack([samples, samples], 1).astype('float32')
+
+
+def feed(stage, audio_format, frames, block_size=1024):
+    for i in range(0, len(frames), block_size):
+        stage.process(audio_format, frames[i:i + block_size], None)
+    return frames
+
+
+class LoudnessMeterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        self.meter = spotifyconnect.LoudnessMeter()
+        self.meter.negotiate(self.float32)
+
+    def test_k_weighting_matches_the_standard_at_48khz(self):
+        from spotifyconnect.loudness import _k_weighting
+
+        sos = _k_weighting(48000)
+
+        self.assertEqual(
+            [round(c, 8) for c in sos],
+            [1.53512486, -2.69169619, 1.19839281, -1.69065929, 0.73248077,
+             1.0, -2.0, 1.0, -1.99004745, 0.99007225])
+
+    def test_tone_loudness(self):
+        feed(self.meter, self.float32, tone(5, 0.1))
+
+        self.assertAlmostEqual(self.meter.integrated, -20, places=1)
+        self.assertAlmostEqual(self.meter.momentary, -20, places=1)
+        self.assertAlmostEqual(self.meter.short_term, -20, places=1)
+
+    def test_s16_audio(self):
+        s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.meter.negotiate(s16)
+
+        feed(self.meter, s16, (tone(1, 0.1) * 32768).astype('int16'))
+
+        self.assertAlmostEqual(self.meter.integrated, -20, places=1)
+
+    def test_audio_is_unchanged(self):
+        frames = tone(0.1, 0.1)
+        expected = frames.copy()
+
+        feed(self.meter, self.float32, frames)
+
+        self.assertTrue(numpy.array_equal(frames, expected))
+
+    def test_nothing_measured(self):
+        self.assertIsNone(self.meter.integrated)
+        self.assertIsNone(self.meter.momentary)
+        self.assertIsNone(self.meter.short_term)
+        self.assertEqual(self.meter.duration, 0)
+
+    def test_short_term_needs_three_seconds(self):
+        feed(self.meter, self.float32, tone(2.9, 0.1))
+
+        self.assertIsNotNone(self.meter.momentary)
+        self.assertIsNone(self.meter.short_term)
+
+    def test_silence_is_gated(self):
+        feed(self.meter, self.float32, tone(5, 0.1))
+        feed(self.meter, self.float32, numpy.zeros((44100 * 5, 2), 'float32'))
+
+        # Only the gating blocks overlapping the end of the tone count.
+        self.assertAlmostEqual(self.meter.integrated, -20, delta=0.2)
+        self.assertEqual(self.meter.momentary, float('-inf'))
+        self.assertEqual(self.meter.duration, 10)
+
+    def test_quiet_passages_are_gated_relative_to_the_loudness(self):
+        feed(self.meter, self.float32, tone(5, 0.1))
+        # 30 LU below, well under the relative gate.
+        feed(self.meter, self.float32, tone(5, 0.1 * 10 ** (-30 / 20)))
+
+        self.assertAlmostEqual(self.meter.integrated, -20, delta=0.2)
+
+    def test_reset_starts_a_new_measurement(self):
+        feed(self.meter, self.float32, tone(1, 0.1))
+
+        self.meter.reset()
+        feed(self.meter, self.float32, tone(1, 0.01))
+
+        self.assertAlmostEqual(self.meter.integrated, -40, places=1)
+        self.assertEqual(self.meter.duration, 1)
+
+    def test_negotiate_fails_for_unsupported_sample_type(self):
+        with self.assertRaises(ValueError):
+            self.meter.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S32NativeEndian, 44100))
+
+
+class LoudnessCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.filename = os.path.join(self.directory, 'loudness.json')
+
+    def test_get_unknown_track(self):
+        cache = spotifyconnect.LoudnessCache(self.filename)
+
+        self.assertIsNone(cache.get('spotify:track:a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_put_and_get(self):
+        cache = spotifyconnect.LoudnessCache(self.filename)
+
+        cache.put('spotify:track:a', -9.5)
+
+        self.assertEqual(cache.get('spotify:track:a'), -9.5)
+        self.assertIn('spotify:track:a', cache)
+
+    def test_save_and_load(self):
+        cache = spotifyconnect.LoudnessCache(self.filename)
+        cache.put('spotify:track:a', -9.5)
+        cache.put('spotify:track:b', -12.0)
+
+        cache.save()
+
+        cache = spotifyconnect.LoudnessCache(self.filename)
+        self.assertEqual(cache.get('spotify:track:a'), -9.5)
+        self.assertEqual(cache.get('spotify:track:b'), -12.0)
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+    def test_least_recently_used_tracks_are_dropped(self):
+        cache = spotifyconnect.LoudnessCache(self.filename, max_entries=2)
+        cache.put('spotify:track:a', -1.0)
+        cache.put('spotify:track:b', -2.0)
+        cache.get('spotify:track:a')
+
+        cache.put('spotify:track:c', -3.0)
+
+        self.assertIn('spotify:track:a', cache)
+        self.assertNotIn('spotify:track:b', cache)
+        self.assertIn('spotify:track:c', cache)
+
+    def test_load_keeps_max_entries(self):
+        with open(self.filename, 'w') as fh:
+            json.dump([['a', -1.0], ['b', -2.0], ['c', -3.0]], fh)
+
+        cache = spotifyconnect.LoudnessCache(self.filename, max_entries=2)
+
+        self.assertEqual(len(cache), 2)
+        self.assertNotIn('a', cache)
+
+    def test_unreadable_file_is_ignored(self):
+        with open(self.filename, 'w') as fh:
+            fh.write('{not json')
+
+        cache = spotifyconnect.LoudnessCache(self.filename)
+
+        self.assertEqual(len(cache), 0)
+
+    def test_file_of_the_wrong_shape_is_ignored(self):
+        for entries in [
+                {'a': -1.0}, [['a', -1.0], 'b'], [['a', -1.0, 2]],
+                [['a', 'loud']], [[1, -1.0]], [['a', True]]]:
+            with open(self.filename, 'w') as fh:
+                json.dump(entries, fh)
+
+            cache = spotifyconnect.LoudnessCache(self.filename)
+
+            self.assertEqual(len(cache), 0)
+
+    def test_save_only_writes_changes(self):
+        cache = spotifyconnect.LoudnessCache(self.filename)
+        cache.put('spotify:track:a', -9.5)
+        cache.save()
+        os.remove(self.filename)
+
+        cache.put('spotify:track:a', -9.5)
+        cache.save()
+
+        self.assertFalse(os.path.exists(self.filename))
+
+        cache.put('spotify:track:a', -8.0)
+        cache.save()
+
+        self.assertTrue(os.path.exists(self.filename))
+
+
+class LoudnessNormalizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.float32 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.Float32NativeEndian, 44100)
+        self.cache = mock.Mock(spec=spotifyconnect.LoudnessCache)
+        self.cache.get.return_value = None
+        self.normalizer = spotifyconnect.LoudnessNormalizer(
+            self.cache, target=-14, min_duration=1)
+        self.normalizer.negotiate(self.float32)
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def change_track(self, track_uri):
+        self.session.player.current_track.track_uri = track_uri
+        self.normalizer._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+
+    def test_known_track_is_normalized_from_the_first_block(self):
+        self.cache.get.return_value = -20.0
+        self.change_track('spotify:track:a')
+
+        frames = feed(self.normalizer, self.float32, tone(0.1, 0.1))
+
+        self.cache.get.assert_called_once_with('spotify:track:a')
+        self.assertEqual(self.normalizer.gain, 6)
+        # The gain ramps up over the first block only.
+        peak = numpy.abs(frames[1024:]).max()
+        self.assertAlmostEqual(peak, 0.1 * 10 ** (6 / 20), places=3)
+
+    def test_unknown_track_converges_slowly(self):
+        self.change_track('spotify:track:a')
+
+        feed(self.normalizer, self.float32, tone(2, 0.1))
+
+        # At most 1 dB per second towards the 6 dB needed.
+        self.assertGreater(self.normalizer.gain, 1)
+        self.assertLessEqual(self.normalizer.gain, 2)
+
+    def test_gain_is_limited(self):
+        self.cache.get.return_value = -60.0
+        self.change_track('spotify:track:a')
+
+        feed(self.normalizer, self.float32, tone(0.1, 0.001))
+
+        self.assertEqual(self.normalizer.gain, 12)
+
+    def test_s16_audio_is_clipped(self):
+        s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.normalizer.negotiate(s16)
+        self.cache.get.return_value = -30.0
+        self.change_track('spotify:track:a')
+
+        frames = feed(
+            self.normalizer, s16, (tone(0.1, 0.9) * 32767).astype('int16'))
+
+        self.assertEqual(frames.max(), 32767)
+        self.assertEqual(frames.min(), -32768)
+
+    def test_loudness_of_previous_track_is_cached(self):
+        self.change_track('spotify:track:a')
+        feed(self.normalizer, self.float32, tone(1, 0.1))
+        self.change_track('spotify:track:b')
+        feed(self.normalizer, self.float32, tone(0.1, 0.01))
+
+        self.change_track('spotify:track:c')
+
+        self.assertEqual(self.cache.put.call_args[0][0], 'spotify:track:a')
+        self.assertAlmostEqual(self.cache.put.call_args[0][1], -20, places=1)
+        self.assertEqual(self.cache.save.call_count, 0)
+
+    def test_cache_is_saved_every_few_tracks(self):
+        for i in range(12):
+            self.change_track('spotify:track:%d' % i)
+            feed(self.normalizer, self.float32, tone(1, 0.1))
+
+        self.assertEqual(self.cache.put.call_count, 10)
+        self.cache.save.assert_called_once_with()
+
+    def test_cache_is_saved_on_close(self):
+        self.change_track('spotify:track:a')
+        feed(self.normalizer, self.float32, tone(1, 0.1))
+        self.change_track('spotify:track:b')
+        feed(self.normalizer, self.float32, tone(2, 0.01))
+
+        self.normalizer._close()
+
+        # Taken when the audio of the next track started.
+        self.cache.put.assert_called_once_with('spotify:track:a', mock.ANY)
+        self.assertAlmostEqual(self.cache.put.call_args[0][1], -20, places=1)
+        self.cache.save.assert_called_once_with()
+
+    def test_tracks_played_briefly_are_not_cached(self):
+        self.change_track('spotify:track:a')
+        feed(self.normalizer, self.float32, tone(0.5, 0.1))
+        self.change_track('spotify:track:b')
+        feed(self.normalizer, self.float32, tone(0.1, 0.01))
+
+        self.normalizer._close()
+
+        self.assertEqual(self.cache.put.call_count, 0)
+        self.assertEqual(self.cache.save.call_count, 0)
+
+    def test_meter_is_reset_for_the_new_track(self):
+        self.change_track('spotify:track:a')
+        feed(self.normalizer, self.float32, tone(1, 0.1))
+
+        self.change_track('spotify:track:b')
+        feed(self.normalizer, self.float32, tone(1, 0.01))
+
+        self.assertAlmostEqual(
+            self.normalizer.meter.integrated, -40, places=1)
+
+    def test_without_metadata(self):
+        type(self.session.player).current_track = mock.PropertyMock(
+            side_effect=spotifyconnect.Error(1))
+
+        self.normalizer._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+
+        self.assertEqual(self.cache.get.call_count, 0)
+
+    def test_open_connects_to_playback_notify_event(self):
+        self.normalizer._open()
+
+        self.session.player.on.assert_called_with(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self.normalizer._on_playback_notify)
+
+    def test_close_disconnects_from_playback_notify_event(self):
+        self.normalizer._close()
+
+        self.session.player.off.assert_called_with(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self.normalizer._on_playback_notify)
@@ -0,0 +1,140 @@
+from __future__ import division, unicode_literals
+
+import unittest
+
+import numpy
+
+import spotifyconnect
+from spotifyconnect import utils
+
+from tests import mock
+
+
+class LevelMeterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.player = utils.EventEmitter()
+        spotifyconnect._session_instance = self.session
+        self.s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.meter = spotifyconnect.LevelMeter(rate=30)
+        self.meter.negotiate(self.s16)
+        self.levels = []
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def listen(self):
+        def callback(levels, session):
+            self.levels.append(levels)
+
+        self.session.player.on(
+            spotifyconnect.PlayerEvent.PLAYBACK_LEVELS, callback)
+
+    def test_emits_levels_at_the_rate(self):
+        self.listen()
+        frames = numpy.zeros((4096, 2), dtype='int16')
+
+        for i in range(11):
+            self.meter.process(self.s16, frames, None)
+
+        # 11 * 4096 frames is a little over a second.
+        self.assertEqual(len(self.levels), 30)
+
+    def test_levels_per_channel(self):
+        self.listen()
+        frames = numpy.zeros((1470, 2), dtype='int16')
+        frames[::2, 0] = 16384
+        frames[1::2, 0] = -16384
+        frames[0, 1] = -32768
+
+        self.meter.process(self.s16, frames, None)
+
+        self.assertEqual(len(self.levels), 1)
+        self.assertEqual(self.levels[0].peak, [0.5, 1.0])
+        self.assertAlmostEqual(self.levels[0].rms[0], 0.5)
+        self.assertAlmostEqual(self.levels[0].rms[1], (1 / 1470) ** 0.5)
+
+    def test_levels_span_blocks(self):
+        self.listen()
+        frames = numpy.zeros((1000, 2), dtype='int16')
+        frames[999] = 100
+        self.meter.process(self.s16, frames, None)
+        self.assertEqual(self.levels, [])
+
+        frames[:] = 0
+        self.meter.process(self.s16, frames, None)
+
+        self.assertEqual(len(self.levels), 1)
+        self.assertEqual(self.levels[0].peak, [100 / 32768] * 2)
+
+    def test_each_interval_starts_over(self):
+        self.listen()
+        frames = numpy.zeros((2940, 2), dtype='int16')
+        frames[0] = 1000
+
+        self.meter.process(self.s16, frames, None)
+
+        self.assertEqual(self.levels[0].peak, [1000 / 32768] * 2)
+        self.assertEqual(self.levels[1].peak, [0.0, 0.0])
+
+    def test_audio_is_unchanged(self):
+        self.listen()
+        frames = numpy.arange(200, dtype='int16').reshape(100, 2)
+
+        self.meter.process(self.s16, frames, None)
+
+        self.assertEqual(frames.ravel().tolist(), list(range(200)))
+
+    def test_audio_is_passed_through_uncopied(self):
+        self.listen()
+        sink = mock.Mock(spec=spotifyconnect.Sink)
+        sink.zero_copy = True
+        sink.numpy_frames = False
+        sink._on_music_delivery.return_value = 100
+        pipeline = spotifyconnect.Pipeline([self.meter], sink)
+        data = numpy.arange(200, dtype='int16').tobytes()
+
+        pipeline._on_music_delivery(self.s16, data, 100, None, self.session)
+
+        output = sink._on_music_delivery.call_args[0][1]
+        self.assertTrue(numpy.shares_memory(
+            numpy.frombuffer(output, dtype='int16'),
+            numpy.frombuffer(data, dtype='int16')))
+
+    def test_nothing_is_computed_without_listeners(self):
+        frames = mock.Mock()
+
+        self.assertIs(self.meter.process(self.s16, frames, None), frames)
+        self.assertEqual(frames.mock_calls, [])
+
+    def test_levels_are_dropped_while_nobody_listens(self):
+        self.listen()
+        frames = numpy.full((1000, 2), 100, dtype='int16')
+        self.meter.process(self.s16, frames, None)
+        self.session.player.off(spotifyconnect.PlayerEvent.PLAYBACK_LEVELS)
+        self.meter.process(self.s16, frames, None)
+
+        self.listen()
+        frames[:] = 0
+        self.meter.process(self.s16, frames, None)
+        self.meter.process(self.s16, frames, None)
+
+        self.assertEqual(self.levels[0].peak, [0.0, 0.0])
+
+    def test_float_audio(self):
+        self.listen()
+        float32 = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.Float32NativeEndian, 48000)
+        meter = spotifyconnect.LevelMeter(rate=100)
+        meter.negotiate(float32)
+
+        meter.process(float32, numpy.full((480, 1), -0.25, 'float32'), None)
+
+        self.assertEqual(self.levels, [spotifyconnect.Levels([0.25], [0.25])])
+
+    def test_negotiate_fails_for_packed_samples(self):
+        with self.assertRaises(ValueError):
+            self.meter.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S24_3LE, 44100))
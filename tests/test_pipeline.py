@@ -0,0 +1,373 @@
+from __future__ import unicode_literals
+
+import struct
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class Invert(spotifyconnect.Stage):
+
+    def process(self, audio_format, frames, out):
+        numpy.negative(frames, out=frames)
+        return frames
+
+
+class Downmix(spotifyconnect.Stage):
+
+    """Not in place stage mixing stereo down to mono."""
+
+    in_place = False
+
+    def __init__(self):
+        self.outputs = []
+
+    def negotiate(self, audio_format):
+        return spotifyconnect.SampleFormat(
+            1, audio_format.sample_type, audio_format.sample_rate)
+
+    def process(self, audio_format, frames, out):
+        out = out[:len(frames)]
+        out[:, 0] = frames[:, 0] // 2 + frames[:, 1] // 2
+        self.outputs.append(out)
+        return out
+
+
+class Decimate(spotifyconnect.Stage):
+
+    """Not in place stage halving the sample rate."""
+
+    in_place = False
+
+    def negotiate(self, audio_format):
+        return spotifyconnect.SampleFormat(
+            audio_format.channels, audio_format.sample_type,
+            audio_format.sample_rate // 2)
+
+    def max_output_frames(self, num_frames):
+        return (num_frames + 1) // 2
+
+    def process(self, audio_format, frames, out):
+        out = out[:(len(frames) + 1) // 2]
+        out[...] = frames[::2]
+        return out
+
+
+class Peek(spotifyconnect.Stage):
+
+    """Stage that only reads the audio."""
+
+    reads_only = True
+
+    def __init__(self):
+        self.inputs = []
+
+    def process(self, audio_format, frames, out):
+        self.inputs.append(frames)
+        return frames
+
+
+def pack(*samples):
+    return struct.pack('=%dh' % len(samples), *samples)
+
+
+class StageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.stage = spotifyconnect.Stage()
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def test_defaults(self):
+        self.assertTrue(self.stage.in_place)
+        self.assertFalse(self.stage.reads_only)
+        self.assertEqual(self.stage.latency, 0)
+        self.assertIs(
+            self.stage.negotiate(self.audio_format), self.audio_format)
+        self.assertEqual(self.stage.max_output_frames(10), 10)
+
+    def test_process_not_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            self.stage.process(self.audio_format, mock.ANY, None)
+
+
+class PipelineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.downstream = mock.Mock(spec=spotifyconnect.Sink)
+        self.downstream.zero_copy = True
+        self.downstream.numpy_frames = False
+        self.downstream.frames_buffered = 0
+        self.output = []
+
+        def on_music_delivery(audio_format, frames, num_frames, *args):
+            self.output.append((audio_format, bytes(frames)))
+            return num_frames
+
+        self.downstream._on_music_delivery.side_effect = on_music_delivery
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def create(self, stages, **kwargs):
+        pipeline = spotifyconnect.Pipeline(stages, self.downstream, **kwargs)
+        pipeline.on()
+        return pipeline
+
+    def deliver(self, pipeline, frames, audio_format=None):
+        audio_format = audio_format or self.audio_format
+        return pipeline._on_music_delivery(
+            audio_format, frames, len(frames) // audio_format.frame_size,
+            None, self.session)
+
+    def test_on_opens_stages_and_downstream_sink(self):
+        stage = mock.Mock(spec=spotifyconnect.Stage)
+
+        self.create([stage])
+
+        stage._open.assert_called_once_with()
+        self.downstream._open.assert_called_once_with()
+
+    def test_off_closes_stages_and_downstream_sink(self):
+        stage = mock.Mock(spec=spotifyconnect.Stage)
+        pipeline = self.create([stage])
+
+        pipeline.off()
+
+        stage._close.assert_called_once_with()
+        self.downstream._close.assert_called_once_with()
+
+    def test_on_connects_to_playback_events(self):
+        pipeline = self.create([])
+
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            pipeline._on_playback_notify)
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            pipeline._on_playback_seek)
+
+    def test_off_disconnects_from_playback_events(self):
+        pipeline = self.create([])
+
+        pipeline.off()
+
+        self.session.player.off.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            pipeline._on_playback_notify)
+        self.session.player.off.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            pipeline._on_playback_seek)
+
+    def test_seek_resets_stages_and_drops_backlog(self):
+        stage = Invert()
+        stage.reset = mock.Mock()
+        self.downstream._on_music_delivery.side_effect = None
+        self.downstream._on_music_delivery.return_value = 0
+        pipeline = self.create([stage])
+        self.deliver(pipeline, pack(1, 2, 3, 4))
+        stage.reset.reset_mock()
+
+        pipeline._on_playback_seek(1000, self.session)
+        self.assertEqual(stage.reset.call_count, 0)
+        self.downstream._on_music_delivery.return_value = 1
+        self.deliver(pipeline, pack(5, 6))
+
+        stage.reset.assert_called_once_with()
+        self.assertEqual(
+            self.downstream._on_music_delivery.call_count, 2)
+        self.assertEqual(
+            bytes(self.downstream._on_music_delivery.call_args[0][1]),
+            pack(-5, -6))
+
+    def test_audio_flush_resets_stages(self):
+        stage = Invert()
+        stage.reset = mock.Mock()
+        pipeline = self.create([stage])
+        self.deliver(pipeline, pack(1, 2))
+        stage.reset.reset_mock()
+
+        pipeline._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Pause, self.session)
+        self.deliver(pipeline, pack(1, 2))
+        self.assertEqual(stage.reset.call_count, 0)
+
+        pipeline._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+        self.deliver(pipeline, pack(1, 2))
+        stage.reset.assert_called_once_with()
+
+    def test_without_stages_audio_is_passed_on(self):
+        pipeline = self.create([])
+
+        self.assertEqual(self.deliver(pipeline, pack(1, 2, 3, 4)), 2)
+
+        self.assertEqual(self.output, [(self.audio_format, pack(1, 2, 3, 4))])
+
+    def test_in_place_stage_does_not_change_delivered_audio(self):
+        pipeline = self.create([Invert()])
+        frames = bytearray(pack(1, 2, 3, 4))
+
+        self.deliver(pipeline, frames)
+
+        self.assertEqual(self.output[0][1], pack(-1, -2, -3, -4))
+        self.assertEqual(bytes(frames), pack(1, 2, 3, 4))
+
+    def test_reads_only_stage_gets_audio_without_copy(self):
+        peek = Peek()
+        pipeline = self.create([peek])
+        frames = pack(1, 2, 3, 4)
+
+        self.deliver(pipeline, frames)
+
+        self.assertTrue(numpy.shares_memory(
+            peek.inputs[0], numpy.frombuffer(frames, dtype='int16')))
+        self.assertEqual(self.output[0][1], pack(1, 2, 3, 4))
+
+    def test_reads_only_stage_sees_output_of_earlier_stages(self):
+        peek = Peek()
+        pipeline = self.create([Invert(), peek])
+
+        self.deliver(pipeline, pack(1, 2))
+
+        self.assertEqual(peek.inputs[0].tolist(), [[-1, -2]])
+
+    def test_stages_are_chained(self):
+        pipeline = self.create([Invert(), Downmix(), Invert(), Decimate()])
+
+        self.deliver(pipeline, pack(2, 4, 6, 8, 10, 12))
+
+        audio_format, frames = self.output[0]
+        self.assertEqual(frames, pack(3, 11))
+        self.assertEqual(audio_format.channels, 1)
+        self.assertEqual(audio_format.sample_rate, 22050)
+        self.assertIs(pipeline.input_format, self.audio_format)
+        self.assertIs(pipeline.output_format, audio_format)
+
+    def test_negotiates_once_per_format(self):
+        stage = Invert()
+        stage.negotiate = mock.Mock(side_effect=lambda fmt: fmt)
+        stage.reset = mock.Mock()
+        pipeline = self.create([stage])
+
+        self.deliver(pipeline, pack(1, 2))
+        self.deliver(pipeline, pack(1, 2))
+        self.assertEqual(stage.negotiate.call_count, 1)
+        self.assertEqual(stage.reset.call_count, 1)
+
+        mono = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.deliver(pipeline, pack(1, 2), mono)
+        self.assertEqual(stage.negotiate.call_count, 2)
+        stage.negotiate.assert_called_with(mono)
+
+    def test_scratch_buffers_are_reused(self):
+        downmix = Downmix()
+        pipeline = self.create([downmix])
+
+        self.deliver(pipeline, pack(1, 2, 3, 4))
+        self.deliver(pipeline, pack(5, 6))
+
+        self.assertTrue(numpy.shares_memory(*downmix.outputs))
+
+    def test_large_deliveries_are_processed_in_blocks(self):
+        pipeline = self.create([Invert()], max_frames=2)
+
+        self.assertEqual(self.deliver(pipeline, pack(*range(10))), 5)
+
+        self.assertEqual(
+            [frames for audio_format, frames in self.output],
+            [pack(0, -1, -2, -3), pack(-4, -5, -6, -7), pack(-8, -9)])
+
+    def test_keeps_what_downstream_does_not_consume(self):
+        self.downstream._on_music_delivery.side_effect = None
+        self.downstream._on_music_delivery.return_value = 1
+        pipeline = self.create([Invert()])
+
+        self.assertEqual(self.deliver(pipeline, pack(1, 2, 3, 4, 5, 6)), 3)
+        self.assertEqual(pipeline.frames_buffered, 2)
+
+        self.downstream._on_music_delivery.return_value = 0
+        self.assertEqual(self.deliver(pipeline, pack(7, 8)), 0)
+
+        self.downstream._on_music_delivery.side_effect = (
+            lambda fmt, frames, num_frames, *args: num_frames)
+        self.assertEqual(self.deliver(pipeline, pack(7, 8)), 1)
+        self.assertEqual(
+            self.downstream._on_music_delivery.call_args_list[-2][0][1],
+            pack(-3, -4, -5, -6))
+        self.assertEqual(pipeline.frames_buffered, 0)
+
+    def test_delivers_bytes_to_sinks_without_zero_copy(self):
+        self.downstream.zero_copy = False
+        pipeline = self.create([Invert()])
+
+        self.deliver(pipeline, pack(1, 2))
+
+        frames = self.downstream._on_music_delivery.call_args[0][1]
+        self.assertIsInstance(frames, bytes)
+
+    def test_frames_buffered_includes_latency_and_downstream(self):
+        stage = mock.Mock(spec=spotifyconnect.Stage, in_place=True, latency=10)
+        stage.negotiate.side_effect = lambda fmt: fmt
+        stage.max_output_frames.side_effect = lambda num_frames: num_frames
+        stage.process.side_effect = lambda fmt, frames, out: frames
+        self.downstream.frames_buffered = 100
+        pipeline = self.create([stage, Decimate()])
+
+        self.assertEqual(pipeline.frames_buffered, 0)
+        self.deliver(pipeline, pack(1, 2))
+
+        self.assertEqual(pipeline.latency, 10)
+        self.assertEqual(pipeline.frames_buffered, 210)
+
+    def test_timings(self):
+        stages = [Invert(), Downmix()]
+        pipeline = self.create(stages)
+        pipeline.profile = True
+
+        self.deliver(pipeline, pack(1, 2, 3, 4))
+
+        timings = pipeline.timings
+        self.assertEqual([timing.stage for timing in timings], stages)
+        self.assertEqual(timings[0].calls, 1)
+        self.assertEqual(timings[0].frames, 2)
+        self.assertGreater(timings[1].seconds, 0)
+
+        pipeline.reset_timings()
+
+        self.assertEqual(pipeline.timings[0].calls, 0)
+
+    def test_no_timings_without_profile(self):
+        pipeline = self.create([Invert()])
+
+        self.deliver(pipeline, pack(1, 2))
+
+        self.assertEqual(pipeline.timings[0].calls, 0)
+
+    def test_write_output_not_implemented_without_sink(self):
+        pipeline = spotifyconnect.Pipeline([])
+
+        with self.assertRaises(NotImplementedError):
+            pipeline._write_output(mock.ANY, mock.ANY, mock.ANY)
+
+    def test_software_volume_stage(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR, volume=50)
+        pipeline = self.create([volume])
+
+        self.deliver(pipeline, pack(100, -100))
+
+        self.assertEqual(self.output[0][1], pack(50, -50))
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_VOLUME,
+            volume._on_playback_volume)
@@ -286,6 +286,47 @@ class PlayerTest(unittest.TestCase):
         with self.assertRaises(spotifyconnect.Error):
             session.player.set_bitrate(17)
 
+    def test_player_set_native_audio(self, lib_mock):
+        session = tests.create_real_player(lib_mock)
+        lib_mock.SpRegisterPlaybackCallbacks.reset_mock()
+
+        with mock.patch.object(_PlayerCallbacks, 'get_struct') as struct_mock:
+            session.player.set_native_audio(True)
+
+        struct_mock.assert_called_once_with(native_audio=True)
+        lib_mock.SpRegisterPlaybackCallbacks.assert_called_once_with(
+            struct_mock.return_value, session)
+        self.assertTrue(session.player.native_audio)
+        lib_mock.spc_ring_set_enabled.assert_called_with(True)
+
+    def test_player_unset_native_audio_releases_ring(self, lib_mock):
+        session = tests.create_real_player(lib_mock)
+        session.player.native_audio = True
+        calls = []
+        lib_mock.spc_ring_set_enabled.side_effect = (
+            lambda enabled: calls.append(('enabled', enabled)))
+        lib_mock.SpRegisterPlaybackCallbacks.side_effect = (
+            lambda *args: calls.append('register') or 0)
+
+        with mock.patch.object(_PlayerCallbacks, 'get_struct'):
+            session.player.set_native_audio(False)
+
+        self.assertEqual(
+            calls, [('enabled', True), 'register', ('enabled', False)])
+        self.assertFalse(session.player.native_audio)
+
+    def test_player_set_native_audio_fail_raises_error(self, lib_mock):
+        session = tests.create_real_player(lib_mock)
+        lib_mock.SpRegisterPlaybackCallbacks.return_value = (
+            spotifyconnect.ErrorType.WrongAPIVersion)
+
+        with mock.patch.object(_PlayerCallbacks, 'get_struct'):
+            with self.assertRaises(spotifyconnect.Error):
+                session.player.set_native_audio(True)
+
+        self.assertFalse(session.player.native_audio)
+        lib_mock.spc_ring_set_enabled.assert_called_with(False)
+
 
 @mock.patch('spotifyconnect.player.lib', spec=spotifyconnect.lib)
 class ConnectionCallbacksTest(unittest.TestCase):
@@ -305,6 +346,15 @@ class ConnectionCallbacksTest(unittest.TestCase):
 
         callback.assert_called_once_with(notify, session)
 
+    def test_playback_notify_callback_updates_clock(self, lib_mock):
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+
+        _PlayerCallbacks.playback_notify(
+            spotifyconnect.PlaybackNotify.Pause, session_handle)
+
+        self.assertFalse(session.player.clock.running)
+
     def test_playback_notify_callback_when_no_instance(self, lib_mock):
         callback = mock.Mock()
         session = tests.create_real_player(lib_mock)
@@ -322,8 +372,9 @@ class ConnectionCallbacksTest(unittest.TestCase):
         sp_audioformat.channels = 2
         audio_format = spotifyconnect.AudioFormat(sp_audioformat)
 
-        num_samples = 10
-        expected_samples = 8  # 2 samples of 4 bytes each
+        num_samples = 11
+        expected_frames = 5  # 5 frames of 2 samples each
+        consumed_frames = 4
         samples_size = audio_format.sample_size * num_samples
         samples = spotifyconnect.ffi.new('char[]', samples_size)
         samples[0:3] = [b'a', b'b', b'c']
@@ -332,7 +383,7 @@ class ConnectionCallbacksTest(unittest.TestCase):
         pending = spotifyconnect.ffi.new('unsigned int *', 8)
 
         callback = mock.Mock()
-        callback.return_value = expected_samples
+        callback.return_value = consumed_frames
         session = tests.create_real_player(lib_mock)
         session_handle = spotifyconnect.ffi.new_handle(session)
         session.player.on(spotifyconnect.PlayerEvent.MUSIC_DELIVERY, callback)
@@ -342,11 +393,135 @@ class ConnectionCallbacksTest(unittest.TestCase):
             pending, session_handle)
 
         callback.assert_called_once_with(
-            mock.ANY, mock.ANY, expected_samples, pending, session)
+            mock.ANY, mock.ANY, expected_frames, pending, session)
         self.assertEqual(
             callback.call_args[0][0]._sp_audioformat, sp_audioformat)
         self.assertEqual(callback.call_args[0][1][:5], b'abc\x00\x00')
-        self.assertEqual(result, expected_samples)
+        self.assertEqual(len(callback.call_args[0][1]), 20)
+        self.assertEqual(result, 8)  # libspotify counts samples
+
+    def test_music_delivery_callback_moves_clock_on(self, lib_mock):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.channels = 2
+        sp_audioformat.sample_rate = 1000
+        samples = spotifyconnect.ffi.new('int16_t[]', 200)
+        samples_void_ptr = spotifyconnect.ffi.cast('void *', samples)
+        pending = spotifyconnect.ffi.new('unsigned int *', 0)
+
+        def callback(audio_format, frames, num_frames, pending, session):
+            pending[0] = 40  # 20 frames not played yet
+            return 80
+
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+        session.player.on(spotifyconnect.PlayerEvent.MUSIC_DELIVERY, callback)
+        clock = session.player.clock
+
+        with mock.patch.object(clock, '_on_frames') as on_frames_mock:
+            _PlayerCallbacks.playback_data(
+                samples_void_ptr, 200, sp_audioformat, pending,
+                session_handle)
+
+        on_frames_mock.assert_called_once_with(80, 20, 1000)
+
+    def test_music_delivery_callback_with_zero_copy(self, lib_mock):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.channels = 2
+        num_samples = 8
+        samples = spotifyconnect.ffi.new('char[]', 2 * num_samples)
+        samples[0:3] = [b'a', b'b', b'c']
+        samples_void_ptr = spotifyconnect.ffi.cast('void *', samples)
+        pending = spotifyconnect.ffi.new('unsigned int *', 8)
+
+        callback = mock.Mock()
+        callback.return_value = num_samples // 2
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+        session.player.zero_copy = True
+        session.player.on(spotifyconnect.PlayerEvent.MUSIC_DELIVERY, callback)
+
+        result = _PlayerCallbacks.playback_data(
+            samples_void_ptr, num_samples, sp_audioformat,
+            pending, session_handle)
+
+        frames = callback.call_args[0][1]
+        self.assertNotIsInstance(frames, bytes)
+        self.assertEqual(len(frames), 2 * num_samples)
+        self.assertEqual(frames[:5], b'abc\x00\x00')
+        self.assertEqual(result, num_samples)
+
+    def test_music_delivery_callback_with_numpy_frames(self, lib_mock):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.channels = 2
+        samples = spotifyconnect.ffi.new('int16_t[]', [1, 2, 3, 4])
+        samples_void_ptr = spotifyconnect.ffi.cast('void *', samples)
+        pending = spotifyconnect.ffi.new('unsigned int *', 8)
+
+        callback = mock.Mock()
+        callback.return_value = 2
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+        session.player.numpy_frames = True
+        session.player.on(spotifyconnect.PlayerEvent.MUSIC_DELIVERY, callback)
+
+        result = _PlayerCallbacks.playback_data(
+            samples_void_ptr, 4, sp_audioformat, pending, session_handle)
+
+        frames = callback.call_args[0][1]
+        self.assertEqual(frames.shape, (2, 2))
+        self.assertEqual(frames.tolist(), [[1, 2], [3, 4]])
+        self.assertEqual(result, 4)
+
+    def test_music_delivery_to_audio_consumer(self, lib_mock):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.channels = 2
+        sp_audioformat.sample_rate = 44100
+        num_samples = 8
+        samples = spotifyconnect.ffi.new('char[]', 2 * num_samples)
+        samples[0:3] = [b'a', b'b', b'c']
+        samples_void_ptr = spotifyconnect.ffi.cast('void *', samples)
+        pending = spotifyconnect.ffi.new('unsigned int *', 8)
+
+        listener = mock.Mock()
+        consumer = mock.Mock()
+        consumer.return_value = num_samples // 2
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+        session.player.on(spotifyconnect.PlayerEvent.MUSIC_DELIVERY, listener)
+        session.player.set_audio_consumer(consumer)
+
+        result = _PlayerCallbacks.playback_data(
+            samples_void_ptr, num_samples, sp_audioformat,
+            pending, session_handle)
+
+        consumer.assert_called_once_with(
+            spotifyconnect.SampleFormat(2, 0, 44100), mock.ANY,
+            num_samples // 2, pending, session)
+        self.assertEqual(consumer.call_args[0][1][:5], b'abc\x00\x00')
+        self.assertEqual(result, num_samples)
+        self.assertFalse(listener.called)
+
+    def test_music_delivery_after_audio_consumer_is_removed(self, lib_mock):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.channels = 2
+        samples = spotifyconnect.ffi.new('char[]', 16)
+        samples_void_ptr = spotifyconnect.ffi.cast('void *', samples)
+        pending = spotifyconnect.ffi.new('unsigned int *', 8)
+
+        listener = mock.Mock()
+        listener.return_value = 4
+        consumer = mock.Mock()
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+        session.player.on(spotifyconnect.PlayerEvent.MUSIC_DELIVERY, listener)
+        session.player.set_audio_consumer(consumer)
+        session.player.set_audio_consumer(None)
+
+        _PlayerCallbacks.playback_data(
+            samples_void_ptr, 8, sp_audioformat, pending, session_handle)
+
+        self.assertFalse(consumer.called)
+        self.assertTrue(listener.called)
 
     def test_music_delivery_without_callback_does_not_consume(self, lib_mock):
         session = tests.create_real_player(lib_mock)
@@ -398,6 +573,14 @@ class ConnectionCallbacksTest(unittest.TestCase):
 
         callback.assert_called_once_with(seek, session)
 
+    def test_playback_seek_callback_rebases_clock(self, lib_mock):
+        session = tests.create_real_player(lib_mock)
+        session_handle = spotifyconnect.ffi.new_handle(session)
+
+        _PlayerCallbacks.playback_seek(45879, session_handle)
+
+        self.assertEqual(session.player.clock.position_ms, 45879)
+
     def test_playback_seek_callback_when_no_instance(self, lib_mock):
         callback = mock.Mock()
         session = tests.create_real_player(lib_mock)
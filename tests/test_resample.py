@@ -0,0 +1,147 @@
+from __future__ import division, unicode_literals
+
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class ResamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def sine(self, num_frames, frequency=1000, amplitude=10000):
+        t = numpy.arange(num_frames) / 44100
+        samples = numpy.sin(2 * numpy.pi * frequency * t) * amplitude
+        return numpy.stack([samples, -samples], 1).astype('int16')
+
+    def resample(self, resampler, frames, block_size):
+        out = numpy.empty(
+            (resampler.max_output_frames(block_size), 2), dtype='int16')
+        output = []
+        for i in range(0, len(frames), block_size):
+            output.append(resampler.process(
+                self.audio_format, frames[i:i + block_size], out).copy())
+        return numpy.concatenate(output)
+
+    def test_defaults(self):
+        resampler = spotifyconnect.Resampler()
+
+        self.assertEqual(resampler.rate, 48000)
+        self.assertEqual(
+            resampler.quality, spotifyconnect.ResampleQuality.MEDIUM)
+        self.assertFalse(resampler.in_place)
+
+    def test_negotiate_returns_output_format(self):
+        resampler = spotifyconnect.Resampler(96000)
+
+        output_format = resampler.negotiate(self.audio_format)
+
+        self.assertIs(
+            output_format,
+            spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S16NativeEndian, 96000))
+
+    def test_negotiate_fails_for_unsupported_sample_type(self):
+        resampler = spotifyconnect.Resampler()
+
+        with self.assertRaises(ValueError):
+            resampler.negotiate(mock.Mock(sample_type=666))
+
+    def test_output_length(self):
+        resampler = spotifyconnect.Resampler()
+        resampler.negotiate(self.audio_format)
+
+        output = self.resample(resampler, self.sine(44100), 1000)
+
+        self.assertEqual(len(output), 48000)
+
+    def test_output_fits_max_output_frames(self):
+        resampler = spotifyconnect.Resampler(96000)
+        resampler.negotiate(self.audio_format)
+
+        for num_frames in [1, 2, 147, 1000]:
+            output = self.resample(resampler, self.sine(10000), num_frames)
+
+            self.assertLessEqual(
+                len(output), 10000 * 96000 // 44100 + 1)
+
+    def test_resamples_sine(self):
+        for quality in [
+                spotifyconnect.ResampleQuality.LOW,
+                spotifyconnect.ResampleQuality.MEDIUM,
+                spotifyconnect.ResampleQuality.HIGH]:
+            resampler = spotifyconnect.Resampler(quality=quality)
+            resampler.negotiate(self.audio_format)
+
+            output = self.resample(resampler, self.sine(4410), 512)
+
+            t = numpy.arange(len(output)) / 48000
+            t -= resampler.latency / 44100
+            expected = numpy.sin(2 * numpy.pi * 1000 * t) * 10000
+            error = numpy.abs(output[200:, 0] - expected[200:]).max()
+            self.assertLess(error, 20)
+            self.assertTrue((output[:, 0] == -output[:, 1]).all())
+
+    def test_state_is_carried_across_blocks(self):
+        frames = self.sine(5000)
+        resampler = spotifyconnect.Resampler()
+        resampler.negotiate(self.audio_format)
+        expected = self.resample(resampler, frames, 5000)
+
+        for block_size in [1, 7, 441, 1024]:
+            resampler = spotifyconnect.Resampler()
+            resampler.negotiate(self.audio_format)
+
+            output = self.resample(resampler, frames, block_size)
+
+            self.assertTrue(numpy.array_equal(output, expected))
+
+    def test_reset_clears_history(self):
+        frames = self.sine(1000)
+        resampler = spotifyconnect.Resampler()
+        resampler.negotiate(self.audio_format)
+        expected = self.resample(resampler, frames, 1000)
+        self.resample(resampler, self.sine(333, 3000), 333)
+
+        resampler.reset()
+
+        output = self.resample(resampler, frames, 1000)
+        self.assertTrue(numpy.array_equal(output, expected))
+
+    def test_latency_is_bounded_by_preset(self):
+        for quality, latency in [
+                (spotifyconnect.ResampleQuality.LOW, 8),
+                (spotifyconnect.ResampleQuality.MEDIUM, 16),
+                (spotifyconnect.ResampleQuality.HIGH, 32)]:
+            resampler = spotifyconnect.Resampler(quality=quality)
+            resampler.negotiate(self.audio_format)
+
+            self.assertEqual(resampler.latency, latency)
+
+    def test_same_rate_passes_audio_through(self):
+        resampler = spotifyconnect.Resampler(44100)
+        resampler.negotiate(self.audio_format)
+        frames = self.sine(100)
+
+        output = self.resample(resampler, frames, 100)
+
+        self.assertTrue(numpy.array_equal(output, frames))
+        self.assertEqual(resampler.latency, 0)
+
+    def test_full_scale_is_clipped(self):
+        resampler = spotifyconnect.Resampler()
+        resampler.negotiate(self.audio_format)
+        frames = numpy.zeros((1000, 2), dtype='int16')
+        frames[::2] = 32767
+        frames[1::2] = -32768
+
+        output = self.resample(resampler, frames, 1000)
+
+        self.assertLessEqual(output.max(), 32767)
+        self.assertGreaterEqual(output.min(), -32768)
@@ -0,0 +1,227 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import spotifyconnect
+
+
+class RingBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = spotifyconnect.RingBuffer(8)
+
+    def test_size(self):
+        self.assertEqual(self.ring.size, 8)
+
+    def test_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.RingBuffer(0)
+
+    def test_starts_empty(self):
+        self.assertEqual(self.ring.readable, 0)
+        self.assertEqual(self.ring.writable, 8)
+
+    def test_write_and_read(self):
+        buffer = bytearray(8)
+
+        self.assertEqual(self.ring.write(b'abcd'), 4)
+        self.assertEqual(self.ring.readable, 4)
+        self.assertEqual(self.ring.read_into(buffer), 4)
+
+        self.assertEqual(buffer[:4], b'abcd')
+        self.assertEqual(self.ring.readable, 0)
+
+    def test_write_accepts_only_what_fits(self):
+        self.assertEqual(self.ring.write(b'abcdefghij'), 8)
+        self.assertEqual(self.ring.write(b'k'), 0)
+        self.assertEqual(self.ring.writable, 0)
+
+    def test_write_is_aligned(self):
+        self.ring.write(b'abc')
+
+        self.assertEqual(self.ring.write(b'defghi', align=2), 4)
+        self.assertEqual(self.ring.readable, 7)
+
+    def test_read_is_aligned(self):
+        buffer = bytearray(8)
+        self.ring.write(b'abcde')
+
+        self.assertEqual(self.ring.read_into(buffer, align=2), 4)
+        self.assertEqual(self.ring.readable, 1)
+
+    def test_write_and_read_wrap_around(self):
+        buffer = bytearray(6)
+        self.ring.write(b'abcdef')
+        self.ring.read_into(buffer)
+
+        self.assertEqual(self.ring.write(b'ghijkl'), 6)
+        self.assertEqual(self.ring.read_into(buffer), 6)
+
+        self.assertEqual(buffer, b'ghijkl')
+
+    def test_write_accepts_buffers(self):
+        buffer = bytearray(4)
+
+        self.ring.write(memoryview(b'abcd'))
+        self.ring.read_into(memoryview(buffer))
+
+        self.assertEqual(buffer, b'abcd')
+
+    def test_skip(self):
+        self.ring.write(b'abcdef')
+
+        self.assertEqual(self.ring.skip(2), 2)
+        self.assertEqual(self.ring.readable, 4)
+
+    def test_skip_everything(self):
+        self.ring.write(b'abcdef')
+
+        self.assertEqual(self.ring.skip(), 6)
+        self.assertEqual(self.ring.readable, 0)
+
+    def test_skip_to_write_position(self):
+        self.ring.write(b'abcd')
+        position = self.ring.write_position
+        self.ring.write(b'ef')
+        buffer = bytearray(8)
+
+        self.assertEqual(self.ring.skip_to(position), 4)
+        self.assertEqual(self.ring.read_into(buffer), 2)
+        self.assertEqual(buffer[:2], b'ef')
+
+    def test_read_position(self):
+        self.ring.write(b'abcd')
+        self.ring.read_into(bytearray(3))
+
+        self.assertEqual(self.ring.read_position, 3)
+        self.assertEqual(self.ring.write_position, 4)
+
+    def test_skip_to_position_already_read(self):
+        self.ring.write(b'ab')
+        position = self.ring.write_position
+        self.ring.read_into(bytearray(2))
+        self.ring.write(b'cd')
+
+        self.assertEqual(self.ring.skip_to(position), 0)
+        self.assertEqual(self.ring.readable, 2)
+
+
+class NativeRingBufferTest(unittest.TestCase):
+
+    def setUp(self):
+        self.ring = spotifyconnect.NativeRingBuffer(16)
+        self.sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        self.sp_audioformat.sample_type = (
+            spotifyconnect.SampleType.S16NativeEndian)
+        self.sp_audioformat.sample_rate = 44100
+        self.sp_audioformat.channels = 2
+        self.pending = spotifyconnect.ffi.new('uint32_t *')
+
+    def deliver(self, data):
+        return spotifyconnect.lib.spc_audio_data(
+            data, len(data) // 2, self.sp_audioformat, self.pending,
+            spotifyconnect.ffi.NULL)
+
+    def test_size(self):
+        self.assertEqual(self.ring.size, 16)
+
+    def test_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.NativeRingBuffer(0)
+
+    def test_starts_empty(self):
+        self.assertEqual(self.ring.readable, 0)
+        self.assertEqual(self.ring.writable, 16)
+        self.assertEqual(self.ring.overruns, 0)
+
+    def test_no_reset_while_native_audio_is_enabled(self):
+        spotifyconnect.lib.spc_ring_set_enabled(True)
+        self.addCleanup(spotifyconnect.lib.spc_ring_set_enabled, False)
+        self.deliver(b'abcd')
+
+        with self.assertRaises(RuntimeError):
+            spotifyconnect.NativeRingBuffer(32)
+
+        self.assertEqual(self.ring.size, 16)
+        self.assertEqual(self.ring.readable, 4)
+
+    def test_format_change_is_published(self):
+        self.deliver(b'abcd')
+        self.ring.read_into(bytearray(4))
+        self.sp_audioformat.sample_rate = 48000
+        self.deliver(b'efgh')
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+
+        self.assertTrue(self.ring.get_sample_format(sp_audioformat))
+        self.assertEqual(sp_audioformat.sample_rate, 48000)
+
+    def test_audio_data_is_read(self):
+        buffer = bytearray(8)
+
+        self.assertEqual(self.deliver(b'abcdefgh'), 4)
+        self.assertEqual(self.ring.read_into(buffer), 8)
+
+        self.assertEqual(buffer, b'abcdefgh')
+
+    def test_audio_data_reports_pending_samples(self):
+        self.deliver(b'abcdefgh')
+
+        self.assertEqual(self.pending[0], 4)
+
+    def test_audio_data_accepts_only_whole_frames_that_fit(self):
+        self.assertEqual(self.deliver(b'a' * 20), 8)
+        self.assertEqual(self.ring.readable, 16)
+        self.assertEqual(self.ring.overruns, 1)
+
+    def test_read_is_aligned(self):
+        self.deliver(b'abcdefgh')
+
+        self.assertEqual(self.ring.read_into(bytearray(6), align=4), 4)
+
+    def test_get_sample_format(self):
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        self.assertFalse(self.ring.get_sample_format(sp_audioformat))
+
+        self.deliver(b'abcd')
+
+        self.assertTrue(self.ring.get_sample_format(sp_audioformat))
+        self.assertEqual(sp_audioformat.channels, 2)
+        self.assertEqual(sp_audioformat.sample_rate, 44100)
+
+    def test_new_sample_format_waits_for_ring_to_drain(self):
+        self.deliver(b'abcd')
+        self.sp_audioformat.channels = 1
+
+        self.assertEqual(self.deliver(b'abcd'), 0)
+
+    def test_skip(self):
+        self.deliver(b'abcdefgh')
+
+        self.assertEqual(self.ring.skip(), 8)
+        self.assertEqual(self.ring.readable, 0)
+
+    def test_skip_to_write_position(self):
+        self.deliver(b'abcd')
+        position = self.ring.write_position
+        self.deliver(b'efgh')
+        buffer = bytearray(8)
+
+        self.assertEqual(self.ring.skip_to(position), 4)
+        self.assertEqual(self.ring.read_into(buffer), 4)
+        self.assertEqual(buffer[:4], b'efgh')
+
+    def test_read_position(self):
+        self.deliver(b'abcdefgh')
+        self.ring.read_into(bytearray(4))
+
+        self.assertEqual(self.ring.read_position, 4)
+        self.assertEqual(self.ring.write_position, 8)
+
+    def test_skip_to_position_already_read(self):
+        self.deliver(b'abcd')
+        position = self.ring.write_position
+        self.ring.read_into(bytearray(4))
+        self.deliver(b'efgh')
+
+        self.assertEqual(self.ring.skip_to(position), 0)
+        self.assertEqual(self.ring.readable, 4)
@@ -0,0 +1,219 @@
+from __future__ import unicode_literals
+
+import socket
+import struct
+import unittest
+
+import spotifyconnect
+
+from tests import mock
+
+
+@mock.patch('spotifyconnect.rtp._clock')
+class RTPSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.receiver.bind(('127.0.0.1', 0))
+        self.receiver.settimeout(0.1)
+        self.sink = spotifyconnect.RTPSink(
+            '127.0.0.1', self.receiver.getsockname()[1], packet_frames=4)
+        self.sink.on()
+
+    def tearDown(self):
+        self.sink.off()
+        self.receiver.close()
+        spotifyconnect._session_instance = None
+
+    def deliver(self, *samples):
+        return self.sink._on_music_delivery(
+            self.audio_format, struct.pack('=%dh' % len(samples), *samples),
+            len(samples) // 2, None, self.session)
+
+    def receive(self):
+        packets = []
+        while True:
+            try:
+                packet = self.receiver.recv(2048)
+            except socket.timeout:
+                return packets
+            flags, payload_type, sequence, timestamp, ssrc = struct.unpack(
+                '>BBHII', packet[:12])
+            num_samples = (len(packet) - 12) // 2
+            packets.append((
+                flags, payload_type, sequence, timestamp, ssrc,
+                list(struct.unpack('>%dh' % num_samples, packet[12:]))))
+
+    def test_packets(self, clock_mock):
+        clock_mock.return_value = 0
+
+        self.assertEqual(self.deliver(*range(16)), 8)
+
+        packets = self.receive()
+        self.assertEqual(len(packets), 2)
+        first, second = packets
+        self.assertEqual(first[0], 0x80)
+        # Static payload type 10 with the marker bit on the first packet.
+        self.assertEqual(first[1], 0x80 | 10)
+        self.assertEqual(second[1], 10)
+        self.assertEqual(second[2], (first[2] + 1) & 0xFFFF)
+        self.assertEqual(second[3], (first[3] + 4) & 0xFFFFFFFF)
+        self.assertEqual(first[4], self.sink.ssrc)
+        self.assertEqual(second[4], self.sink.ssrc)
+        self.assertEqual(first[5], list(range(8)))
+        self.assertEqual(second[5], list(range(8, 16)))
+        self.assertEqual(self.sink.packets_sent, 2)
+
+    def test_many_packets_are_sent_in_batches(self, clock_mock):
+        clock_mock.return_value = 0
+
+        self.deliver(*range(800))
+
+        packets = self.receive()
+        self.assertEqual(len(packets), 100)
+        self.assertEqual(packets[99][5], list(range(792, 800)))
+        self.assertEqual(
+            [packet[2] for packet in packets],
+            [(packets[0][2] + i) & 0xFFFF for i in range(100)])
+
+    def test_payload_is_big_endian(self, clock_mock):
+        clock_mock.return_value = 0
+
+        self.deliver(1, -2, 256, -32768, 32767, 0, 3, 4)
+
+        packet = self.receive()[0]
+        self.assertEqual(packet[5], [1, -2, 256, -32768, 32767, 0, 3, 4])
+
+    def test_partial_packets_wait_for_the_next_delivery(self, clock_mock):
+        clock_mock.return_value = 0
+
+        self.deliver(*range(6))
+        self.assertEqual(self.receive(), [])
+
+        self.deliver(*range(6, 12))
+        packets = self.receive()
+
+        self.assertEqual(len(packets), 1)
+        self.assertEqual(packets[0][5], list(range(8)))
+        self.assertEqual(self.sink.timestamp, (packets[0][3] + 6) & 0xFFFFFFFF)
+
+    def test_timestamps_count_frames(self, clock_mock):
+        clock_mock.return_value = 0
+        timestamp = self.sink.timestamp
+
+        for i in range(10):
+            self.deliver(*range(6))
+
+        timestamps = [packet[3] for packet in self.receive()]
+        self.assertEqual(timestamps, [
+            (timestamp + 4 * i) & 0xFFFFFFFF for i in range(7)])
+        self.assertEqual(self.sink.timestamp, (timestamp + 30) & 0xFFFFFFFF)
+
+    def test_seek_resets_the_timestamp_base(self, clock_mock):
+        clock_mock.return_value = 0
+        self.deliver(*range(10))
+        self.receive()
+
+        self.sink._on_playback_seek(1000, self.session)
+        self.deliver(*range(8))
+        packets = self.receive()
+
+        self.assertEqual(len(packets), 1)
+        # The partial packet from before the seek is dropped.
+        self.assertEqual(packets[0][5], list(range(8)))
+        self.assertEqual(packets[0][1], 0x80 | 10)
+
+    def test_audio_flush_resets_the_timestamp_base(self, clock_mock):
+        clock_mock.return_value = 0
+        self.deliver(*range(10))
+        self.receive()
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+        self.deliver(*range(8))
+
+        self.assertEqual(self.receive()[0][1], 0x80 | 10)
+
+    def test_pause_keeps_the_timestamp_base(self, clock_mock):
+        clock_mock.return_value = 0
+        timestamp = self.sink.timestamp
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Pause, self.session)
+
+        self.deliver(*range(8))
+
+        self.assertEqual(self.sink.timestamp, (timestamp + 4) & 0xFFFFFFFF)
+
+    def test_gap_is_padded_and_skipped(self, clock_mock):
+        clock_mock.return_value = 0
+        self.deliver(*range(10))
+        timestamp = self.receive()[0][3]
+
+        # 1 s later the audio has run out.
+        clock_mock.return_value = 1
+        self.deliver(*range(8))
+
+        padded, resumed = self.receive()
+        self.assertEqual(padded[5], [8, 9, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(padded[3], (timestamp + 4) & 0xFFFFFFFF)
+        self.assertEqual(resumed[1], 0x80 | 10)
+        self.assertEqual(resumed[3], (timestamp + 44100) & 0xFFFFFFFF)
+
+    def test_takes_audio_at_the_speed_it_plays(self, clock_mock):
+        clock_mock.return_value = 10.0
+        frames = b'\0' * 4 * 44100
+
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 8820)
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 0)
+        self.assertEqual(self.sink.frames_buffered, 8820)
+
+        clock_mock.return_value = 10.0625
+
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 2756)
+
+    def test_seek_takes_new_audio_right_away(self, clock_mock):
+        clock_mock.return_value = 10.0
+        frames = b'\0' * 4 * 44100
+        self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session)
+
+        self.sink._on_playback_seek(1000, self.session)
+
+        self.assertEqual(self.sink._on_music_delivery(
+            self.audio_format, frames, 44100, None, self.session), 8820)
+
+    def test_dynamic_payload_type(self, clock_mock):
+        clock_mock.return_value = 0
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 48000)
+
+        self.deliver(*range(8))
+
+        self.assertEqual(self.receive()[0][1], 0x80 | 96)
+
+    def test_unsupported_sample_type(self, clock_mock):
+        with self.assertRaises(ValueError):
+            self.sink._on_music_delivery(
+                spotifyconnect.SampleFormat(
+                    2, spotifyconnect.SampleType.Float32NativeEndian, 44100),
+                b'\0' * 8, 1, None, self.session)
+
+    def test_on_subscribes_to_seek_and_notify(self, clock_mock):
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.sink._on_playback_seek)
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self.sink._on_playback_notify)
+
+    def test_packet_frames_must_be_positive(self, clock_mock):
+        with self.assertRaises(ValueError):
+            spotifyconnect.RTPSink('127.0.0.1', packet_frames=0)
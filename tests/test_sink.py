@@ -13,6 +13,22 @@ class MockSink(spotifyconnect.Sink):
         self.on()
 
 
+class ZeroCopySink(MockSink):
+    zero_copy = True
+
+
+class NumpySink(MockSink):
+    numpy_frames = True
+
+    def __init__(self):
+        super(NumpySink, self).__init__()
+        self.arrays = []
+
+    def _write(self, audio_format, frames, num_frames):
+        self.arrays.append(frames)
+        return len(frames)
+
+
 class BaseSinkTest(unittest.TestCase):
 
     def setUp(self):
@@ -45,8 +61,764 @@ class BaseSinkTest(unittest.TestCase):
 
         self.assertEqual(self.session.player.on.call_count, 2)
 
+    def test_on_keeps_copying_delivery_by_default(self):
+        self.assertFalse(self.session.player.zero_copy)
+
+    def test_on_enables_zero_copy_delivery(self):
+        self.sink.off()
+
+        ZeroCopySink()
+
+        self.assertTrue(self.session.player.zero_copy)
+
+    def test_off_disables_zero_copy_delivery(self):
+        self.sink.off()
+        sink = ZeroCopySink()
+
+        sink.off()
+
+        self.assertFalse(self.session.player.zero_copy)
+
+    def test_on_uses_zero_copy_delivery_for_numpy_frames(self):
+        self.sink.off()
+
+        NumpySink()
+
+        self.assertTrue(self.session.player.zero_copy)
+
+    def test_numpy_frames_are_delivered_as_array(self):
+        self.sink.off()
+        sink = NumpySink()
+        audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+        result = sink._on_music_delivery(
+            audio_format, b'\x01\x00\x02\x00\x03\x00\x04\x00\x05\x00',
+            2, None, self.session)
+
+        self.assertEqual(result, 2)
+        self.assertEqual(sink.arrays[0].tolist(), [[1, 2], [3, 4]])
+
+    def test_write_gets_a_sample_format(self):
+        self.sink._write = mock.Mock(return_value=0)
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+        sp_audioformat.sample_rate = 44100
+        sp_audioformat.channels = 2
+
+        self.sink._on_music_delivery(
+            spotifyconnect.AudioFormat(sp_audioformat), b'', 0, None,
+            mock.ANY)
+
+        self.assertIs(
+            self.sink._write.call_args[0][0], spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S16NativeEndian, 44100))
+
     def test_raise_error_if_not_implemented(self):
 
         with self.assertRaises(NotImplementedError):
             self.sink._on_music_delivery(
-                mock.ANY, mock.ANY, mock.ANY, mock.ANY, mock.ANY)
+                spotifyconnect.SampleFormat(
+                    2, spotifyconnect.SampleType.S16NativeEndian, 44100),
+                mock.ANY, mock.ANY, mock.ANY, mock.ANY)
+
+
+class BufferingSink(MockSink):
+
+    def __init__(self):
+        super(BufferingSink, self).__init__()
+        self.buffered = 0
+
+    @property
+    def frames_buffered(self):
+        return self.buffered
+
+    def _write(self, audio_format, frames, num_frames):
+        self.buffered += num_frames // 2
+        return num_frames // 2
+
+
+class SinkAccountingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.sink = BufferingSink()
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.pending = spotifyconnect.ffi.new('uint32_t *')
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def deliver(self, num_frames):
+        return self.sink._on_music_delivery(
+            self.audio_format, b'\x00' * num_frames * 4, num_frames,
+            self.pending, self.session)
+
+    def test_returns_frames_consumed(self):
+        self.assertEqual(self.deliver(10), 5)
+
+    def test_counts_frames_accepted(self):
+        self.deliver(10)
+        self.deliver(4)
+
+        self.assertEqual(self.sink.frames_accepted, 7)
+
+    def test_frames_played(self):
+        self.deliver(10)
+        self.sink.buffered = 2
+
+        self.assertEqual(self.sink.frames_played, 3)
+
+    def test_writes_buffered_samples_to_pending(self):
+        self.deliver(10)
+
+        self.assertEqual(self.pending[0], 10)
+
+    def test_ignores_missing_pending(self):
+        result = self.sink._on_music_delivery(
+            self.audio_format, b'\x00' * 16, 4, None, self.session)
+
+        self.assertEqual(result, 2)
+
+    def test_buffer_stats(self):
+        self.deliver(10)
+        self.sink.underruns = 3
+
+        self.assertEqual(
+            self.sink.buffer_stats,
+            spotifyconnect.AudioBufferStats(10, 3))
+
+    def test_frames_buffered_defaults_to_zero(self):
+        self.assertEqual(MockSink().frames_buffered, 0)
+
+
+class MockRingBufferSink(spotifyconnect.RingBufferSink):
+
+    def __init__(self, **kwargs):
+        super(MockRingBufferSink, self).__init__(
+            consumer_thread=False, **kwargs)
+        self.on()
+
+
+class RingBufferSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.sink = MockRingBufferSink(buffer_size=16, period_size=2)
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+        sp_audioformat.sample_rate = 44100
+        sp_audioformat.channels = 2
+        self.audio_format = spotifyconnect.AudioFormat(sp_audioformat)
+
+    def tearDown(self):
+        self.sink.off()
+        spotifyconnect._session_instance = None
+
+    def deliver(self, frames):
+        return self.sink._on_music_delivery(
+            self.audio_format, frames,
+            len(frames) // self.audio_format.frame_size, None, self.session)
+
+    def test_uses_zero_copy_delivery(self):
+        self.assertTrue(self.session.player.zero_copy)
+
+    def test_delivery_is_consumed(self):
+        result = self.deliver(b'abcdefgh')
+
+        self.assertEqual(result, 2)
+        self.assertEqual(self.sink.buffer_stats.samples, 4)
+        self.assertEqual(self.sink.frames_accepted, 2)
+        self.assertEqual(self.sink.frames_played, 0)
+
+    def test_delivery_keeps_sample_format(self):
+        self.deliver(b'abcd')
+
+        self.assertIsInstance(
+            self.sink.audio_format, spotifyconnect.SampleFormat)
+        self.assertEqual(self.sink.audio_format.channels, 2)
+        self.assertEqual(self.sink.audio_format.sample_rate, 44100)
+
+    def test_delivery_is_partially_consumed_when_full(self):
+        result = self.deliver(b'a' * 20)
+
+        self.assertEqual(result, 4)
+        self.assertEqual(self.sink.buffer_stats, (8, 0, 1, 4))
+
+    def test_new_audio_format_waits_for_ring_to_drain(self):
+        self.deliver(b'abcd')
+        self.audio_format._sp_audioformat.channels = 1
+
+        self.assertEqual(self.deliver(b'abcd'), 0)
+
+    def test_new_audio_format_pads_last_partial_period(self):
+        self.deliver(b'abcdefghijkl')
+        periods = self.sink.periods()
+        next(periods)
+        self.audio_format._sp_audioformat.sample_rate = 48000
+
+        self.assertEqual(self.deliver(b'mnop'), 0)
+        audio_format, period = next(periods)
+
+        self.assertEqual(audio_format.sample_rate, 44100)
+        self.assertEqual(period.tobytes(), b'ijkl\0\0\0\0')
+        self.assertEqual(self.sink.frames_played, 3)
+        self.assertEqual(self.deliver(b'mnop'), 1)
+        self.assertEqual(self.sink.audio_format.sample_rate, 48000)
+
+    def test_read_into(self):
+        buffer = bytearray(6)
+        self.deliver(b'abcdefgh')
+
+        self.assertEqual(self.sink.read_into(buffer), 1)
+        self.assertEqual(buffer[:4], b'abcd')
+        self.assertEqual(self.sink.frames_played, 1)
+
+    def test_read_into_before_delivery(self):
+        self.assertEqual(self.sink.read_into(bytearray(4)), 0)
+
+    def test_periods(self):
+        self.deliver(b'abcdefghijkl')
+        periods = self.sink.periods()
+
+        audio_format, period = next(periods)
+
+        self.assertIs(audio_format, self.sink.audio_format)
+        self.assertEqual(period.tobytes(), b'abcdefgh')
+        self.assertEqual(self.sink.buffer_stats.samples, 2)
+        self.assertEqual(self.sink.frames_played, 2)
+
+    @mock.patch('time.sleep')
+    def test_periods_counts_underruns(self, sleep_mock):
+        self.deliver(b'abcdefghijkl')
+        periods = self.sink.periods()
+        next(periods)
+        sleep_mock.side_effect = lambda _: self.sink.off()
+
+        self.assertEqual(list(periods), [])
+        self.assertEqual(self.sink.buffer_stats.stutter, 1)
+
+    def test_subscribes_to_playback_events(self):
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self.sink._on_playback_notify)
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.sink._on_playback_seek)
+
+    def test_seek_drops_buffered_audio(self):
+        self.deliver(b'abcdefgh')
+        self.sink._on_playback_seek(1000, self.session)
+        self.deliver(b'ijklmnop')
+        periods = self.sink.periods()
+
+        audio_format, period = next(periods)
+
+        self.assertEqual(period.tobytes(), b'ijklmnop')
+        self.assertEqual(self.sink.frames_flushed, 2)
+        self.assertEqual(self.sink.frames_buffered, 0)
+
+    def test_audio_flush_drops_buffered_audio(self):
+        buffer = bytearray(16)
+        self.deliver(b'abcdefgh')
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+
+        self.assertEqual(self.sink.read_into(buffer), 0)
+        self.assertEqual(self.sink.frames_flushed, 2)
+
+    def test_other_notifications_keep_buffered_audio(self):
+        buffer = bytearray(16)
+        self.deliver(b'abcdefgh')
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Next, self.session)
+
+        self.assertEqual(self.sink.read_into(buffer), 2)
+        self.assertEqual(self.sink.frames_flushed, 0)
+
+    def test_track_changed_puts_marker_in_stream(self):
+        self.session.player.current_track.track_uri = 'spotify:track:a'
+        self.deliver(b'abcd')
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+        self.deliver(b'efghijkl')
+        periods = self.sink.periods(markers=True)
+
+        audio_format, period, markers = next(periods)
+
+        self.assertEqual(period.tobytes(), b'abcdefgh')
+        self.assertEqual(markers, [spotifyconnect.TrackMarker(
+            1, 'spotify:track:a',
+            spotifyconnect.PlaybackNotify.TrackChanged)])
+        self.deliver(b'mnop')
+        self.assertEqual(next(periods)[2], ())
+
+    def test_marker_at_the_end_of_a_period_starts_the_next(self):
+        self.deliver(b'abcdefgh')
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+        self.deliver(b'ijklmnop')
+        periods = self.sink.periods(markers=True)
+
+        self.assertEqual(next(periods)[2], ())
+        self.assertEqual(next(periods)[2][0].offset, 0)
+
+    def test_seek_marker_starts_the_new_audio(self):
+        self.session.player.current_track.track_uri = 'spotify:track:a'
+        self.deliver(b'abcdefgh')
+        self.sink._on_playback_seek(1000, self.session)
+        self.deliver(b'ijklmnop')
+        periods = self.sink.periods(markers=True)
+
+        audio_format, period, markers = next(periods)
+
+        self.assertEqual(period.tobytes(), b'ijklmnop')
+        self.assertEqual(markers, [spotifyconnect.TrackMarker(
+            0, 'spotify:track:a', spotifyconnect.PlayerEvent.PLAYBACK_SEEK)])
+
+    def test_marker_of_a_later_period_is_kept_when_markers_overflow(self):
+        reason = spotifyconnect.PlaybackNotify.TrackChanged
+        self.sink._markers.append((8, 'spotify:track:a', reason))
+
+        self.assertEqual(self.sink._take_markers(0, 8, 4), ())
+
+        for i in range(64):
+            self.sink._markers.append((8 + i, 'spotify:track:b', reason))
+        markers = self.sink._take_markers(8, 8, 4)
+
+        self.assertEqual(markers[0], spotifyconnect.TrackMarker(
+            0, 'spotify:track:a', reason))
+        self.assertEqual(len(markers), 9)
+
+    def test_marker_for_unknown_track(self):
+        type(self.session.player).current_track = mock.PropertyMock(
+            side_effect=spotifyconnect.Error('No metadata'))
+        self.deliver(b'abcd')
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+        self.deliver(b'efgh')
+
+        markers = next(self.sink.periods(markers=True))[2]
+
+        self.assertIsNone(markers[0].track_uri)
+
+    def test_consumer_thread_calls_on_track_marker(self):
+        self.sink.off()
+        sink = spotifyconnect.RingBufferSink(buffer_size=16, period_size=2)
+        calls = []
+        sink._on_track_marker = lambda *args: calls.append('marker')
+        sink._on_period = mock.Mock(
+            side_effect=lambda *args: (calls.append('period'), sink.off()))
+        sink.on()
+        thread = sink._thread
+        sink._on_music_delivery(
+            self.audio_format, b'abcd', 1, None, self.session)
+        sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+        sink._on_music_delivery(
+            self.audio_format, b'efgh', 1, None, self.session)
+
+        thread.join(1)
+
+        self.assertEqual(calls, ['marker', 'period'])
+
+    def test_consumer_thread_calls_on_period(self):
+        self.sink.off()
+        sink = spotifyconnect.RingBufferSink(buffer_size=16, period_size=2)
+        sink._on_period = mock.Mock(side_effect=lambda *args: sink.off())
+        sink.on()
+        thread = sink._thread
+        sink._on_music_delivery(
+            self.audio_format, b'abcdefgh', 2, None, self.session)
+
+        thread.join(1)
+
+        sink._on_period.assert_called_once_with(sink.audio_format, mock.ANY)
+
+    def test_on_period_not_implemented(self):
+        with self.assertRaises(NotImplementedError):
+            self.sink._on_period(mock.ANY, mock.ANY)
+
+
+@mock.patch('spotifyconnect.sink._clock', return_value=100.0)
+@mock.patch('time.sleep')
+class JitterBufferRingBufferSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        # At 1000 Hz, the 10 ms target is 10 frames of 4 bytes.
+        self.jitter_buffer = spotifyconnect.JitterBuffer(
+            target_ms=10, step_ms=5, decay_rate=0)
+        self.sink = MockRingBufferSink(
+            buffer_size=64, period_size=2, jitter_buffer=self.jitter_buffer)
+        sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        sp_audioformat.sample_type = spotifyconnect.SampleType.S16NativeEndian
+        sp_audioformat.sample_rate = 1000
+        sp_audioformat.channels = 2
+        self.audio_format = spotifyconnect.AudioFormat(sp_audioformat)
+
+    def tearDown(self):
+        self.sink.off()
+        spotifyconnect._session_instance = None
+
+    def deliver(self, num_frames):
+        return self.sink._on_music_delivery(
+            self.audio_format, b'a' * 4 * num_frames, num_frames, None,
+            self.session)
+
+    def test_subscribes_to_playback_events(self, sleep_mock, clock_mock):
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self.sink._on_playback_notify)
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.sink._on_playback_seek)
+
+    def test_buffer_stats_report_target(self, sleep_mock, clock_mock):
+        self.deliver(4)
+
+        self.assertEqual(self.sink.buffer_stats.target, 20)
+        self.assertEqual(self.sink.prebuffer_frames, 10)
+
+    def test_target_is_limited_to_the_ring(self, sleep_mock, clock_mock):
+        self.jitter_buffer._on_underrun()
+        self.jitter_buffer._on_underrun()
+        self.deliver(4)
+
+        self.assertEqual(self.sink.prebuffer_frames, 16)
+
+    def test_waits_for_target(self, sleep_mock, clock_mock):
+        self.deliver(8)
+        periods = self.sink.periods()
+        sleep_mock.side_effect = lambda _: self.deliver(2)
+
+        next(periods)
+
+        self.assertEqual(sleep_mock.call_count, 1)
+        self.assertEqual(self.sink.frames_buffered, 8)
+
+    def test_starts_when_no_more_audio_arrives(self, sleep_mock, clock_mock):
+        self.deliver(4)
+        periods = self.sink.periods()
+        sleep_mock.side_effect = lambda seconds: setattr(
+            clock_mock, 'return_value', clock_mock.return_value + seconds)
+
+        next(periods)
+
+        self.assertEqual(self.sink.frames_buffered, 2)
+        self.assertGreaterEqual(clock_mock.return_value, 100.01)
+
+    def test_underrun_raises_target(self, sleep_mock, clock_mock):
+        self.deliver(10)
+        periods = self.sink.periods()
+        for _ in range(5):
+            next(periods)
+        sleep_mock.side_effect = lambda _: self.sink.off()
+
+        self.assertEqual(list(periods), [])
+        self.assertEqual(self.sink.underruns, 1)
+        self.assertEqual(self.jitter_buffer.target_ms, 15)
+        self.assertEqual(self.sink.buffer_stats.target, 30)
+
+    def test_running_out_while_paused_keeps_target(
+            self, sleep_mock, clock_mock):
+        self.deliver(10)
+        periods = self.sink.periods()
+        next(periods)
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Pause, self.session)
+        for _ in range(4):
+            next(periods)
+        sleep_mock.side_effect = lambda _: self.sink.off()
+
+        self.assertEqual(list(periods), [])
+        self.assertEqual(self.jitter_buffer.target_ms, 10)
+
+    def test_play_waits_for_target_again(self, sleep_mock, clock_mock):
+        self.deliver(10)
+        periods = self.sink.periods()
+        next(periods)
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Play, self.session)
+        sleep_mock.side_effect = lambda _: self.deliver(2)
+
+        next(periods)
+
+        self.assertEqual(sleep_mock.call_count, 1)
+        self.assertEqual(self.sink.underruns, 0)
+
+    def test_seek_waits_for_target_again(self, sleep_mock, clock_mock):
+        self.deliver(10)
+        periods = self.sink.periods()
+        next(periods)
+        self.sink._on_playback_seek(1000, self.session)
+        sleep_mock.side_effect = lambda _: self.deliver(4)
+
+        next(periods)
+
+        self.assertEqual(sleep_mock.call_count, 3)
+        self.assertEqual(self.sink.underruns, 0)
+
+
+class NativeRingBufferSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.sink = spotifyconnect.NativeRingBufferSink(
+            buffer_size=16, period_size=2, consumer_thread=False)
+        self.sink.on()
+        self.sp_audioformat = spotifyconnect.ffi.new('SpSampleFormat *')
+        self.sp_audioformat.sample_type = (
+            spotifyconnect.SampleType.S16NativeEndian)
+        self.sp_audioformat.sample_rate = 44100
+        self.sp_audioformat.channels = 2
+
+    def tearDown(self):
+        self.sink.off()
+        spotifyconnect._session_instance = None
+
+    def deliver(self, data):
+        return spotifyconnect.lib.spc_audio_data(
+            data, len(data) // 2, self.sp_audioformat,
+            spotifyconnect.ffi.NULL, spotifyconnect.ffi.NULL)
+
+    def test_on_enables_native_audio(self):
+        self.session.player.set_native_audio.assert_called_once_with(True)
+
+    def test_off_disables_native_audio(self):
+        self.sink.off()
+
+        self.session.player.set_native_audio.assert_called_with(False)
+
+    def test_audio_format(self):
+        self.assertIsNone(self.sink.audio_format)
+
+        self.deliver(b'abcd')
+
+        self.assertEqual(self.sink.audio_format.channels, 2)
+        self.assertEqual(self.sink.audio_format.sample_rate, 44100)
+        self.assertIs(self.sink.audio_format, self.sink.audio_format)
+
+    def test_buffer_stats(self):
+        self.deliver(b'a' * 20)
+
+        self.assertEqual(self.sink.buffer_stats, (8, 0, 1, 4))
+
+    def test_periods(self):
+        self.deliver(b'abcdefghijkl')
+        periods = self.sink.periods()
+
+        audio_format, period = next(periods)
+
+        self.assertEqual(period.tobytes(), b'abcdefgh')
+        self.assertEqual(self.sink.buffer_stats.samples, 2)
+
+    def test_seek_drops_buffered_audio(self):
+        self.deliver(b'abcdefgh')
+        self.sink._on_playback_seek(1000, self.session)
+        self.deliver(b'ijklmnop')
+        periods = self.sink.periods()
+
+        audio_format, period = next(periods)
+
+        self.assertEqual(period.tobytes(), b'ijklmnop')
+        self.assertEqual(self.sink.frames_flushed, 2)
+        self.assertEqual(self.sink.frames_accepted, 4)
+
+    def test_periods_with_markers(self):
+        self.session.player.current_track.track_uri = 'spotify:track:a'
+        self.deliver(b'abcd')
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+        self.deliver(b'efgh')
+
+        audio_format, period, markers = next(
+            self.sink.periods(markers=True))
+
+        self.assertEqual(period.tobytes(), b'abcdefgh')
+        self.assertEqual(markers, [spotifyconnect.TrackMarker(
+            1, 'spotify:track:a',
+            spotifyconnect.PlaybackNotify.TrackChanged)])
+
+    def test_new_audio_format_pads_last_partial_period(self):
+        self.deliver(b'abcdefghijkl')
+        periods = self.sink.periods()
+        next(periods)
+        self.sp_audioformat.sample_rate = 48000
+
+        self.assertEqual(self.deliver(b'mnop'), 0)
+        audio_format, period = next(periods)
+
+        self.assertEqual(audio_format.sample_rate, 44100)
+        self.assertEqual(period.tobytes(), b'ijkl\0\0\0\0')
+        self.assertEqual(self.deliver(b'mnop'), 2)
+        self.assertEqual(self.sink.audio_format.sample_rate, 48000)
+
+    def test_periods_move_the_playback_clock_on(self):
+        self.deliver(b'abcdefghijkl')
+        periods = self.sink.periods()
+
+        next(periods)
+
+        self.session.player.clock._on_frames.assert_called_once_with(
+            3, 1, 44100)
+
+
+class CoalescingSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.downstream = mock.Mock(spec=spotifyconnect.Sink)
+        self.downstream.frames_buffered = 0
+        self.periods = []
+
+        def on_music_delivery(audio_format, frames, num_frames, *args):
+            self.periods.append(bytes(frames))
+            return num_frames
+
+        self.downstream._on_music_delivery.side_effect = on_music_delivery
+        self.sink = spotifyconnect.CoalescingSink(
+            self.downstream, period_size=2)
+        self.sink.on()
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def deliver(self, frames):
+        return self.sink._on_music_delivery(
+            self.audio_format, frames,
+            len(frames) // self.audio_format.frame_size, None, self.session)
+
+    def test_on_opens_downstream_sink(self):
+        self.downstream._open.assert_called_once_with()
+
+    def test_on_connects_to_playback_events(self):
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_NOTIFY,
+            self.sink._on_playback_notify)
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.sink._on_playback_seek)
+
+    def test_off_closes_downstream_sink(self):
+        self.sink.off()
+
+        self.downstream._close.assert_called_once_with()
+        self.session.player.off.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.sink._on_playback_seek)
+
+    def test_collects_small_deliveries(self):
+        self.assertEqual(self.deliver(b'abcd'), 1)
+        self.assertEqual(self.periods, [])
+        self.assertEqual(self.sink.frames_buffered, 1)
+
+        self.assertEqual(self.deliver(b'efgh'), 1)
+        self.assertEqual(self.periods, [b'abcdefgh'])
+        self.assertEqual(self.sink.frames_buffered, 0)
+
+    def test_splits_large_deliveries(self):
+        self.assertEqual(self.deliver(b'abcdefghijkl'), 3)
+
+        self.assertEqual(self.periods, [b'abcdefgh'])
+        self.assertEqual(self.sink.frames_buffered, 1)
+
+    def test_keeps_what_downstream_does_not_consume(self):
+        self.downstream._on_music_delivery.side_effect = None
+        self.downstream._on_music_delivery.return_value = 1
+
+        # Each period only gets one frame through, the other one is kept and
+        # completed by the next frame delivered.
+        self.assertEqual(self.deliver(b'abcdefghijkl'), 3)
+        self.assertEqual(self.downstream._on_music_delivery.call_count, 2)
+        self.assertEqual(self.sink.frames_buffered, 1)
+
+    def test_period_ms(self):
+        sink = spotifyconnect.CoalescingSink(self.downstream, period_ms=20)
+
+        sink._on_music_delivery(
+            self.audio_format, b'abcd', 1, None, self.session)
+
+        self.assertEqual(sink.period_size, 882)
+
+    def test_flush_on_pause(self):
+        self.deliver(b'abcd')
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Pause, self.session)
+
+        self.assertEqual(self.periods, [b'abcd'])
+
+    def test_drop_on_audio_flush(self):
+        self.deliver(b'abcd')
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+
+        self.assertEqual(self.periods, [])
+        self.assertEqual(self.sink.frames_buffered, 0)
+        self.assertEqual(self.sink.frames_flushed, 1)
+
+    def test_flush_on_track_changed(self):
+        self.deliver(b'abcd')
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.TrackChanged, self.session)
+
+        self.assertEqual(self.periods, [b'abcd'])
+
+    def test_no_flush_on_other_notifications(self):
+        self.deliver(b'abcd')
+
+        self.sink._on_playback_notify(
+            spotifyconnect.PlaybackNotify.Play, self.session)
+
+        self.assertEqual(self.periods, [])
+
+    def test_drop_on_seek(self):
+        self.deliver(b'abcd')
+
+        self.sink._on_playback_seek(1000, self.session)
+        self.deliver(b'efgh')
+        self.deliver(b'ijkl')
+
+        self.assertEqual(self.periods, [b'efghijkl'])
+        self.assertEqual(self.sink.frames_flushed, 1)
+
+    def test_does_not_block_while_flushing(self):
+        self.deliver(b'abcd')
+        self.sink._lock.acquire()
+        self.addCleanup(self.sink._lock.release)
+
+        self.assertEqual(self.deliver(b'efgh'), 0)
+        self.assertEqual(self.sink.frames_buffered, 1)
+
+    def test_flush_when_audio_format_changes(self):
+        self.deliver(b'abcd')
+        self.audio_format = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+        self.deliver(b'efgh')
+
+        self.assertEqual(self.periods, [b'abcd', b'efgh'])
+
+    def test_write_period_not_implemented_without_sink(self):
+        sink = spotifyconnect.CoalescingSink()
+
+        with self.assertRaises(NotImplementedError):
+            sink._write_period(mock.ANY, mock.ANY, mock.ANY)
@@ -0,0 +1,139 @@
+from __future__ import division, unicode_literals
+
+import time
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:
+    shared_memory = None
+
+
+@unittest.skipIf(shared_memory is None, 'Requires Python 3.8')
+class SpectrumAnalyzerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.s16 = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.analyzer = spotifyconnect.SpectrumAnalyzer(bands=8)
+        self.addCleanup(self.analyzer.close)
+        self.analyzer.negotiate(self.s16)
+        self.reader = spotifyconnect.SpectrumReader(self.analyzer.name)
+        self.addCleanup(self.reader.close)
+
+    def tone(self, frequency, seconds=1.0, amplitude=32767):
+        t = numpy.arange(int(seconds * 44100)) / 44100
+        samples = numpy.sin(2 * numpy.pi * frequency * t) * amplitude
+        return numpy.stack([samples, samples], 1).astype('int16')
+
+    def feed(self, frames, block_size=4096):
+        for i in range(0, len(frames), block_size):
+            self.analyzer.process(self.s16, frames[i:i + block_size], None)
+
+    def test_bands_are_log_spaced(self):
+        frequencies = self.reader.frequencies
+
+        self.assertEqual(len(frequencies), 9)
+        self.assertAlmostEqual(frequencies[0], 40)
+        self.assertAlmostEqual(frequencies[4], 800)
+        self.assertAlmostEqual(frequencies[8], 16000)
+        self.assertEqual(frequencies, self.analyzer.frequencies)
+
+    def test_nothing_published_yet(self):
+        self.assertEqual(self.reader.read(), (0, [0.0] * 8))
+
+    def test_publishes_at_the_rate(self):
+        self.feed(self.tone(1000))
+
+        sequence, levels = self.reader.read()
+
+        # Every publication increments the sequence by two.
+        self.assertEqual(sequence, 2 * 30)
+
+    def test_tone_is_in_its_band(self):
+        self.feed(self.tone(1000))
+
+        sequence, levels = self.reader.read()
+
+        self.assertEqual(levels.index(max(levels)), 4)
+        # A full-scale sine peaks at 0 dB, plus the window's leakage into the
+        # neighbouring bins.
+        self.assertAlmostEqual(levels[4], 1.76, places=1)
+        self.assertLess(max(levels[:3] + levels[5:]), -60)
+
+    def test_silence(self):
+        self.feed(numpy.zeros((44100, 2), dtype='int16'))
+
+        sequence, levels = self.reader.read()
+
+        self.assertEqual(levels, [-120.0] * 8)
+
+    def test_bands_without_bins_are_silent(self):
+        # With 64 point FFTs, bins are 689 Hz apart, so the two lowest
+        # bands, and the band above the Nyquist frequency, hold no bins.
+        analyzer = spotifyconnect.SpectrumAnalyzer(
+            bands=8, fft_size=64, max_frequency=100000)
+        self.addCleanup(analyzer.close)
+        analyzer.negotiate(self.s16)
+        reader = spotifyconnect.SpectrumReader(analyzer.name)
+        self.addCleanup(reader.close)
+
+        analyzer.process(self.s16, self.tone(1000, 0.1), None)
+        sequence, levels = reader.read()
+
+        self.assertEqual(levels[:2], [-120.0] * 2)
+        self.assertEqual(levels[-1], -120.0)
+        self.assertGreater(levels[2], -60)
+
+    def test_audio_is_unchanged(self):
+        frames = self.tone(1000, 0.1)
+        expected = frames.copy()
+
+        self.feed(frames)
+
+        self.assertTrue(numpy.array_equal(frames, expected))
+
+    def test_audio_is_passed_through_uncopied(self):
+        session = mock.Mock()
+        session.player.num_listeners.return_value = 0
+        spotifyconnect._session_instance = session
+        self.addCleanup(setattr, spotifyconnect, '_session_instance', None)
+        sink = mock.Mock(spec=spotifyconnect.Sink)
+        sink.zero_copy = True
+        sink.numpy_frames = False
+        sink._on_music_delivery.return_value = 4410
+        pipeline = spotifyconnect.Pipeline([self.analyzer], sink)
+        data = self.tone(1000, 0.1).tobytes()
+
+        pipeline._on_music_delivery(self.s16, data, 4410, None, session)
+
+        output = sink._on_music_delivery.call_args[0][1]
+        self.assertTrue(numpy.shares_memory(
+            numpy.frombuffer(output, dtype='int16'),
+            numpy.frombuffer(data, dtype='int16')))
+
+    def test_skipped_without_readers(self):
+        self.analyzer._heartbeat[0] = time.time() - 10
+
+        self.feed(self.tone(1000))
+
+        self.assertEqual(int(self.analyzer._sequence[0]), 0)
+
+    def test_read_signals_a_reader_is_attached(self):
+        self.analyzer._heartbeat[0] = 0
+
+        self.reader.read()
+
+        self.assertAlmostEqual(
+            self.analyzer._heartbeat[0], time.time(), delta=1)
+
+    def test_negotiate_fails_for_packed_samples(self):
+        with self.assertRaises(ValueError):
+            self.analyzer.negotiate(spotifyconnect.SampleFormat(
+                2, spotifyconnect.SampleType.S24_3LE, 44100))
@@ -0,0 +1,220 @@
+from __future__ import unicode_literals
+
+import struct
+import unittest
+
+import spotifyconnect
+
+from tests import mock
+
+
+class TeeSinkTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.session.player.num_listeners.return_value = 0
+        self.audio_format = spotifyconnect.SampleFormat(
+            1, spotifyconnect.SampleType.S16NativeEndian, 44100)
+        self.dac = self.create_sink()
+        self.stream = self.create_sink()
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def create_sink(self, accept=None):
+        sink = mock.Mock(spec=spotifyconnect.Sink)
+        sink.zero_copy = True
+        sink.numpy_frames = False
+        sink.frames_buffered = 0
+        sink.output = []
+        # The number of frames the sink accepts per delivery, None for all.
+        sink.accept = accept
+
+        def on_music_delivery(audio_format, frames, num_frames, *args):
+            if sink.accept is not None:
+                num_frames = min(num_frames, sink.accept)
+            num_samples = num_frames * audio_format.channels
+            sink.output.extend(
+                struct.unpack('=%dh' % num_samples, frames[:num_samples * 2]))
+            return num_frames
+
+        sink._on_music_delivery.side_effect = on_music_delivery
+        return sink
+
+    def create_tee(self, dac_frames=4, stream_frames=4):
+        self.tee = spotifyconnect.TeeSink([
+            spotifyconnect.TeeBranch(self.dac, dac_frames),
+            spotifyconnect.TeeBranch(
+                self.stream, stream_frames, spotifyconnect.BranchPolicy.DROP),
+        ])
+        self.tee.on()
+        return self.tee
+
+    def deliver(self, *samples):
+        return self.tee._on_music_delivery(
+            self.audio_format, struct.pack('=%dh' % len(samples), *samples),
+            len(samples), None, self.session)
+
+    def test_on_opens_branch_sinks(self):
+        self.create_tee()
+
+        self.dac._open.assert_called_once_with()
+        self.stream._open.assert_called_once_with()
+
+    def test_off_closes_branch_sinks(self):
+        self.create_tee().off()
+
+        self.dac._close.assert_called_once_with()
+        self.stream._close.assert_called_once_with()
+
+    def test_on_connects_to_playback_events(self):
+        self.create_tee()
+
+        self.session.player.on.assert_any_call(
+            spotifyconnect.PlayerEvent.PLAYBACK_SEEK,
+            self.tee._on_playback_seek)
+
+    def test_seek_drops_the_audio_kept_for_branches(self):
+        self.create_tee()
+        self.dac.accept = 0
+        self.deliver(1, 2, 3)
+
+        self.tee._on_playback_seek(1000, self.session)
+        self.dac.accept = None
+        self.deliver(4)
+
+        self.assertEqual(self.dac.output, [4])
+        self.assertEqual(self.tee.frames_buffered, 0)
+
+    def test_audio_flush_drops_the_audio_kept_for_branches(self):
+        self.create_tee()
+        self.stream.accept = 0
+        self.deliver(1, 2, 3)
+
+        self.tee._on_playback_notify(
+            spotifyconnect.PlaybackNotify.AudioFlush, self.session)
+        self.stream.accept = None
+        self.deliver(4)
+
+        self.assertEqual(self.stream.output, [4])
+
+    def test_all_branches_get_the_audio(self):
+        self.create_tee()
+
+        self.assertEqual(self.deliver(1, 2, 3), 3)
+
+        self.assertEqual(self.dac.output, [1, 2, 3])
+        self.assertEqual(self.stream.output, [1, 2, 3])
+
+    def test_caught_up_branches_get_libspotify_memory(self):
+        self.create_tee()
+        frames = memoryview(struct.pack('=3h', 1, 2, 3))
+
+        self.tee._on_music_delivery(
+            self.audio_format, frames, 3, None, self.session)
+
+        delivered = self.dac._on_music_delivery.call_args[0][1]
+        self.assertEqual(delivered.obj, frames.obj)
+        self.assertEqual(self.tee._ring[:6].tobytes(), b'\0' * 6)
+
+    def test_branch_without_zero_copy_gets_bytes(self):
+        self.create_tee()
+        self.stream.zero_copy = False
+
+        self.deliver(1)
+
+        self.assertIsInstance(
+            self.stream._on_music_delivery.call_args[0][1], bytes)
+
+    def test_slow_branch_gets_the_rest_later(self):
+        self.create_tee()
+        self.stream.accept = 1
+
+        self.deliver(1, 2, 3)
+        self.assertEqual(self.stream.output, [1])
+        self.assertEqual(self.tee.branches[1].frames_buffered, 2)
+
+        self.stream.accept = None
+        self.deliver(4)
+
+        self.assertEqual(self.stream.output, [1, 2, 3, 4])
+        self.assertEqual(self.dac.output, [1, 2, 3, 4])
+        self.assertEqual(self.tee.branches[1].frames_buffered, 0)
+
+    def test_drop_branch_never_holds_back_the_others(self):
+        self.create_tee()
+        self.stream.accept = 0
+
+        for i in range(5):
+            self.assertEqual(self.deliver(2 * i, 2 * i + 1), 2)
+
+        self.assertEqual(self.dac.output, list(range(10)))
+        branch = self.tee.branches[1]
+        self.assertEqual(branch.frames_buffered, 4)
+        self.assertEqual(branch.frames_dropped, 6)
+        self.assertEqual(branch.overruns, 3)
+
+    def test_drop_branch_resumes_with_the_newest_audio(self):
+        self.create_tee()
+        self.stream.accept = 0
+        for i in range(5):
+            self.deliver(2 * i, 2 * i + 1)
+
+        self.stream.accept = None
+        self.deliver(10)
+
+        self.assertEqual(self.stream.output, [6, 7, 8, 9, 10])
+
+    def test_backpressure_branch_limits_what_is_accepted(self):
+        self.create_tee()
+        self.dac.accept = 0
+
+        self.assertEqual(self.deliver(1, 2, 3), 3)
+        self.assertEqual(self.deliver(4, 5, 6), 1)
+        self.assertEqual(self.deliver(6), 0)
+
+        self.assertEqual(self.tee.overruns, 2)
+        self.assertEqual(self.stream.output, [1, 2, 3, 4])
+        self.dac.accept = None
+        self.deliver(5, 6)
+        self.assertEqual(self.dac.output, [1, 2, 3, 4, 5, 6])
+
+    def test_ring_wraps_around(self):
+        self.create_tee(dac_frames=3, stream_frames=3)
+        self.stream.accept = 0
+
+        for i in range(4):
+            self.deliver(2 * i, 2 * i + 1)
+            self.stream.accept = 2 if i % 2 else 0
+
+        self.stream.accept = None
+        self.deliver(8)
+        self.assertEqual(self.dac.output, list(range(9)))
+        self.assertEqual(self.stream.output, list(range(1, 9)))
+        self.assertEqual(self.tee.branches[1].frames_dropped, 1)
+
+    def test_frames_buffered_counts_backpressure_branches(self):
+        self.create_tee()
+        self.dac.frames_buffered = 10
+        self.stream.frames_buffered = 100
+        self.dac.accept = 1
+
+        self.deliver(1, 2, 3)
+
+        self.assertEqual(self.tee.frames_buffered, 12)
+
+    def test_format_change_waits_for_backpressure_branches(self):
+        self.create_tee()
+        self.dac.accept = 0
+        self.deliver(1, 2)
+        stereo = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 44100)
+
+        self.assertEqual(self.tee._on_music_delivery(
+            stereo, struct.pack('=2h', 3, 4), 1, None, self.session), 0)
+
+        self.dac.accept = None
+        self.assertEqual(self.tee._on_music_delivery(
+            stereo, struct.pack('=2h', 3, 4), 1, None, self.session), 1)
+        self.assertEqual(self.dac.output, [1, 2, 3, 4])
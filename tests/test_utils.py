@@ -10,6 +10,52 @@ from spotifyconnect import utils
 from tests import mock
 
 
+class GetNumpyTest(unittest.TestCase):
+
+    def tearDown(self):
+        utils._numpy = None
+
+    def test_returns_numpy(self):
+        import numpy
+
+        self.assertIs(utils.get_numpy(), numpy)
+
+    def test_fails_without_numpy(self):
+        utils._numpy = None
+
+        with mock.patch.dict('sys.modules', {'numpy': None}):
+            with self.assertRaises(ImportError):
+                utils.get_numpy()
+
+
+class ByteViewTest(unittest.TestCase):
+
+    def test_bytes(self):
+        view = utils.byte_view(b'abcd')
+
+        self.assertEqual(view.tobytes(), b'abcd')
+
+    def test_array(self):
+        import numpy
+        array = numpy.array([[1, 2], [3, 4]], dtype='int16')
+
+        view = utils.byte_view(array)
+
+        self.assertEqual(len(view), 8)
+        self.assertEqual(view.tobytes(), array.tobytes())
+
+    @mock.patch('spotifyconnect.utils.PY2', True)
+    def test_array_without_memoryview_cast(self):
+        import numpy
+        array = numpy.array([[1, 2], [3, 4]], dtype='int16')
+
+        view = utils.byte_view(array)
+
+        self.assertEqual(len(view), 8)
+        self.assertEqual(view.tobytes(), array.tobytes())
+        self.assertEqual(view[2:4].tobytes(), array[0, 1:].tobytes())
+
+
 class EventEmitterTest(unittest.TestCase):
 
     def test_listener_receives_event_args(self):
@@ -0,0 +1,188 @@
+from __future__ import unicode_literals
+
+import unittest
+
+import numpy
+
+import spotifyconnect
+
+from tests import mock
+
+
+class SoftwareVolumeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.session = mock.Mock()
+        spotifyconnect._session_instance = self.session
+        self.audio_format = spotifyconnect.SampleFormat(
+            2, spotifyconnect.SampleType.S16NativeEndian, 1000)
+
+    def tearDown(self):
+        spotifyconnect._session_instance = None
+
+    def frames(self, value=10000, num_frames=100):
+        return numpy.full((num_frames, 2), value, dtype='int16')
+
+    def test_default_curve_is_cubic(self):
+        volume = spotifyconnect.SoftwareVolume()
+
+        self.assertEqual(volume.curve, spotifyconnect.VolumeCurve.CUBIC)
+
+    def test_curves(self):
+        expected = [
+            (spotifyconnect.VolumeCurve.LINEAR, 0.5),
+            (spotifyconnect.VolumeCurve.DB, 10 ** (-30 / 20)),
+            (spotifyconnect.VolumeCurve.CUBIC, 0.125),
+        ]
+        for curve, gain in expected:
+            volume = spotifyconnect.SoftwareVolume(curve=curve, volume=50)
+
+            self.assertAlmostEqual(volume.gain, gain, places=4)
+
+    def test_zero_volume_is_silent_for_all_curves(self):
+        for curve in [
+                spotifyconnect.VolumeCurve.LINEAR,
+                spotifyconnect.VolumeCurve.DB,
+                spotifyconnect.VolumeCurve.CUBIC]:
+            volume = spotifyconnect.SoftwareVolume(curve=curve, volume=0)
+
+            self.assertEqual(volume.gain, 0)
+
+    def test_unknown_curve_fails(self):
+        with self.assertRaises(ValueError):
+            spotifyconnect.SoftwareVolume(curve=666)
+
+    def test_volume_is_clamped(self):
+        volume = spotifyconnect.SoftwareVolume()
+
+        volume.volume = 150
+
+        self.assertEqual(volume.volume, 100)
+
+    def test_full_volume_leaves_audio_untouched(self):
+        volume = spotifyconnect.SoftwareVolume()
+        frames = self.frames(-12345)
+
+        result = volume.process(self.audio_format, frames)
+
+        self.assertIs(result, frames)
+        self.assertTrue((frames == -12345).all())
+
+    def test_gain_is_applied_in_place(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR, volume=50)
+        frames = self.frames(10001)
+        frames[0] = -10001
+
+        volume.process(self.audio_format, frames)
+
+        self.assertEqual(frames[0].tolist(), [-5000, -5000])
+        self.assertTrue((frames[1:] == 5001).all())
+
+    def test_full_scale_does_not_overflow(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR, volume=99.9)
+        frames = self.frames(32767, 2)
+        frames[1] = -32768
+
+        volume.process(self.audio_format, frames)
+
+        self.assertEqual(frames[:, 0].tolist(), [32734, -32735])
+
+    def test_zero_volume_silences_audio(self):
+        volume = spotifyconnect.SoftwareVolume(volume=0)
+        frames = self.frames()
+
+        volume.process(self.audio_format, frames)
+
+        self.assertTrue((frames == 0).all())
+
+    def test_volume_change_ramps_to_new_gain(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR, ramp_ms=10)
+        volume.volume = 0
+        frames = self.frames(10000, 20)
+
+        volume.process(self.audio_format, frames[:5])
+        volume.process(self.audio_format, frames[5:])
+
+        # 10 ms at 1000 Hz is a 10 frame ramp.
+        self.assertEqual(
+            frames[:11, 0].tolist(),
+            [9000, 8000, 7000, 6000, 5000, 4000, 3000, 2000, 1000, 0, 0])
+        self.assertTrue((frames[10:] == 0).all())
+        self.assertEqual(volume.gain, 0)
+
+    def test_volume_change_during_ramp_starts_from_current_gain(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR, ramp_ms=10)
+        volume.volume = 0
+        volume.process(self.audio_format, self.frames(10000, 5))
+
+        volume.volume = 100
+        frames = self.frames(10000, 10)
+        volume.process(self.audio_format, frames)
+
+        self.assertEqual(frames[0, 0], 5500)
+        self.assertEqual(frames[-1, 0], 10000)
+        self.assertEqual(volume.gain, 1)
+
+    def test_zero_ramp_changes_gain_immediately(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR, ramp_ms=0)
+        volume.volume = 50
+        frames = self.frames(10000, 2)
+
+        volume.process(self.audio_format, frames)
+
+        self.assertTrue((frames == 5000).all())
+
+    def test_reset_finishes_ramp(self):
+        volume = spotifyconnect.SoftwareVolume(
+            curve=spotifyconnect.VolumeCurve.LINEAR)
+        volume.volume = 50
+        volume.process(self.audio_format, self.frames(10000, 1))
+
+        volume.reset()
+
+        self.assertEqual(volume.gain, 0.5)
+
+    def test_empty_block(self):
+        volume = spotifyconnect.SoftwareVolume()
+        volume.volume = 50
+
+        volume.process(self.audio_format, self.frames(0, 0))
+
+        self.assertEqual(volume.gain, 1)
+
+    def test_fails_for_unsupported_sample_type(self):
+        volume = spotifyconnect.SoftwareVolume()
+        audio_format = mock.Mock(sample_type=666)
+
+        with self.assertRaises(ValueError):
+            volume.process(audio_format, self.frames())
+
+    def test_on_connects_to_playback_volume_event(self):
+        volume = spotifyconnect.SoftwareVolume()
+
+        volume.on()
+
+        self.session.player.on.assert_called_with(
+            spotifyconnect.PlayerEvent.PLAYBACK_VOLUME,
+            volume._on_playback_volume)
+
+    def test_off_disconnects_from_playback_volume_event(self):
+        volume = spotifyconnect.SoftwareVolume()
+
+        volume.off()
+
+        self.session.player.off.assert_called_with(
+            spotifyconnect.PlayerEvent.PLAYBACK_VOLUME,
+            volume._on_playback_volume)
+
+    def test_playback_volume_event_sets_volume(self):
+        volume = spotifyconnect.SoftwareVolume()
+
+        volume._on_playback_volume(42.0, self.session)
+
+        self.assertEqual(volume.volume, 42.0)